@@ -1,33 +1,113 @@
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from instrumentation import instrument
+
 # Aesthetic settings
 sns.set(style="whitegrid", palette="Set2")
 plt.rcParams["figure.figsize"] = (12, 6)
 
+NUMERIC_COLUMNS = ["Price", "Price/m²", "Area", "Bedrooms", "Bathrooms"]
+
+# From this many rows run_eda switches to precomputed histograms/box stats and hexbin plots
+LARGE_DATA_ROWS = 50_000
+
+
+def _subplots(*args, **kwargs):
+    """
+    plt.subplots for figures that are returned rather than shown: the figure is detached
+    from pyplot right away, so it is freed once the caller drops it instead of piling up
+    in pyplot's registry across Streamlit reruns.
+    """
+    fig, ax = plt.subplots(*args, **kwargs)
+    plt.close(fig)
+    return fig, ax
+
 
-def clean_strings(df: pd.DataFrame) -> pd.DataFrame:
+def clean_strings(df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """
+    Strip tabs and whitespace from column names and from the text `columns`
+    (all object columns by default), once per distinct value.
+    """
     df.columns = [col.replace("\t", "").strip() for col in df.columns]
-    for col in df.select_dtypes(include=["object"]).columns:
-        df[col] = df[col].astype(str).str.replace("\t", "").str.strip()
+    for col in columns if columns is not None else df.select_dtypes(include=["object"]).columns:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        cleaned = pd.Index(uniques).astype(str).str.replace("\t", "").str.strip()
+        df[col] = cleaned.to_numpy(dtype=object)[codes]
     return df
 
 
-def plot_statistical_summary(df: pd.DataFrame):
-    stats = df.describe().T.round(2)
-    fig, ax = plt.subplots()
+def binned_histogram(values, bins: int = 30):
+    """
+    (counts, edges) of the finite values, from one vectorized np.histogram pass.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.histogram(values[np.isfinite(values)], bins=bins)
+
+
+def box_stats(values, label: str = "", max_fliers: int = 200, seed: int = 0) -> dict:
+    """
+    Tukey box statistics in the form Axes.bxp expects: quartiles, 1.5 IQR whiskers
+    clipped to the data, and at most `max_fliers` sampled outliers.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {"label": label, "q1": np.nan, "med": np.nan, "q3": np.nan,
+                "whislo": np.nan, "whishi": np.nan, "fliers": []}
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    fliers = values[(values < low) | (values > high)]
+    if len(fliers) > max_fliers:
+        fliers = np.random.default_rng(seed).choice(fliers, size=max_fliers, replace=False)
+    return {"label": label, "q1": q1, "med": med, "q3": q3,
+            "whislo": inside.min(), "whishi": inside.max(), "fliers": fliers}
+
+
+def summary_stats(df: pd.DataFrame, columns: list = NUMERIC_COLUMNS) -> pd.DataFrame:
+    """
+    The rows of DataFrame.describe() for numeric columns, from one NumPy pass over the block.
+    """
+    rows = []
+    for col in columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            rows.append([0] + [np.nan] * 7)
+            continue
+        quantiles = np.percentile(values, [0, 25, 50, 75, 100])
+        rows.append([len(values), values.mean(), values.std(ddof=1) if len(values) > 1 else np.nan, *quantiles])
+    return pd.DataFrame(rows, index=columns, columns=["count", "mean", "std", "min", "25%", "50%", "75%", "max"])
+
+
+@instrument()
+def plot_statistical_summary(df: pd.DataFrame, large: bool = False, cube=None):
+    if cube is not None:
+        stats = cube.summary().round(2)
+    else:
+        stats = (summary_stats(df) if large else df[NUMERIC_COLUMNS].describe().T).round(2)
+    fig, ax = _subplots()
     sns.heatmap(stats, annot=True, fmt=".2f", cmap="YlGnBu", cbar=True, linewidths=0.5, ax=ax)
     ax.set_title("Statistical Summary of Numerical Features")
     return fig
 
 
-def plot_distributions(df: pd.DataFrame):
-    numeric_cols = ["Price", "Price/m²", "Area", "Bedrooms", "Bathrooms"]
+@instrument()
+def plot_distributions(df: pd.DataFrame, large: bool = False):
     figures = []
-    for col in numeric_cols:
-        fig, ax = plt.subplots()
-        sns.histplot(df[col], bins=30, kde=True, ax=ax)
+    for col in NUMERIC_COLUMNS:
+        fig, ax = _subplots()
+        if large:
+            # Histogram from precomputed bins; the KDE line is a Gaussian smoothing of the bin counts
+            counts, edges = binned_histogram(df[col])
+            ax.stairs(counts, edges, fill=True, alpha=0.6)
+            kernel = np.exp(-0.5 * np.linspace(-3, 3, 7) ** 2)
+            ax.plot((edges[:-1] + edges[1:]) / 2, np.convolve(counts, kernel / kernel.sum(), mode="same"))
+        else:
+            sns.histplot(df[col], bins=30, kde=True, ax=ax)
         ax.set_title(f"Distribution of {col}")
         ax.set_xlabel(col)
         ax.set_ylabel("Frequency")
@@ -35,28 +115,49 @@ def plot_distributions(df: pd.DataFrame):
     return figures
 
 
-def plot_correlation(df: pd.DataFrame):
-    numeric_cols = ["Price", "Price/m²", "Area", "Bedrooms", "Bathrooms"]
-    corr = df[numeric_cols].corr()
-    fig, ax = plt.subplots()
+@instrument()
+def plot_correlation(df: pd.DataFrame, large: bool = False):
+    if large:
+        values = df[NUMERIC_COLUMNS].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values).all(axis=1)]
+        corr = pd.DataFrame(np.corrcoef(values, rowvar=False), index=NUMERIC_COLUMNS, columns=NUMERIC_COLUMNS)
+    else:
+        corr = df[NUMERIC_COLUMNS].corr()
+    fig, ax = _subplots()
     sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5, ax=ax)
     ax.set_title("Correlation Heatmap")
     return fig
 
 
-def scatter_relationships(df: pd.DataFrame):
+def _hexbin(ax, df: pd.DataFrame, x: str, y: str):
+    # Density of all rows instead of one marker per row
+    hb = ax.hexbin(df[x].to_numpy(dtype=np.float64), df[y].to_numpy(dtype=np.float64),
+                   gridsize=60, bins="log", mincnt=1, cmap="viridis")
+    ax.figure.colorbar(hb, ax=ax, label="Listings (log)")
+
+
+@instrument()
+def scatter_relationships(df: pd.DataFrame, large: bool = False):
     figs = []
 
-    fig1, ax1 = plt.subplots()
-    sns.scatterplot(data=df, x="Area", y="Price", hue="Bedrooms", alpha=0.7, ax=ax1)
-    ax1.set_title("Price vs Area (Hue: Bedrooms)")
+    fig1, ax1 = _subplots()
+    if large:
+        _hexbin(ax1, df, "Area", "Price")
+        ax1.set_title("Price vs Area (Density)")
+    else:
+        sns.scatterplot(data=df, x="Area", y="Price", hue="Bedrooms", alpha=0.7, ax=ax1)
+        ax1.set_title("Price vs Area (Hue: Bedrooms)")
     ax1.set_xlabel("Area (m²)")
     ax1.set_ylabel("Price (EGP)")
     figs.append(("Price vs Area", fig1))
 
-    fig2, ax2 = plt.subplots()
-    sns.scatterplot(data=df, x="Area", y="Price/m²", hue="Bathrooms", alpha=0.7, ax=ax2)
-    ax2.set_title("Price/m² vs Area (Hue: Bathrooms)")
+    fig2, ax2 = _subplots()
+    if large:
+        _hexbin(ax2, df, "Area", "Price/m²")
+        ax2.set_title("Price/m² vs Area (Density)")
+    else:
+        sns.scatterplot(data=df, x="Area", y="Price/m²", hue="Bathrooms", alpha=0.7, ax=ax2)
+        ax2.set_title("Price/m² vs Area (Hue: Bathrooms)")
     ax2.set_xlabel("Area (m²)")
     ax2.set_ylabel("Price/m² (EGP)")
     figs.append(("Price/m² vs Area", fig2))
@@ -64,24 +165,47 @@ def scatter_relationships(df: pd.DataFrame):
     return figs
 
 
-def boxplots_by_location(df: pd.DataFrame, top_n=10):
-    top_locations = df["Location"].value_counts().head(top_n).index
-    filtered_df = df[df["Location"].isin(top_locations)]
-
-    fig, ax = plt.subplots(figsize=(14, 7))
-    sns.boxplot(data=filtered_df, x="Location", y="Price/m²", ax=ax)
-    ax.set_title(f"Price/m² by Top {top_n} Locations")
+@instrument()
+def boxplots_by_location(df: pd.DataFrame, top_n=10, large: bool = False, cube=None):
+    fig, ax = _subplots(figsize=(14, 7))
+    title = f"Price/m² by Top {top_n} Locations"
+    if cube is not None:
+        # Quartiles and 10th/90th percentile whiskers straight from the aggregate cube
+        stats = cube.box_stats("Price/m²", top_n)
+        ax.bxp(stats, showfliers=False)
+        ax.set_xticks(range(1, len(stats) + 1), [s["label"] for s in stats], rotation=45)
+        title += " (estimated quartiles, whiskers at the 10th/90th percentiles)"
+    elif large:
+        # Box statistics per location, computed once and drawn without the raw rows
+        codes, locations = pd.factorize(df["Location"])
+        counts = np.bincount(codes[codes >= 0], minlength=len(locations))
+        top_codes = np.argsort(-counts, kind="stable")[:top_n]
+        values = df["Price/m²"].to_numpy(dtype=np.float64)
+        stats = [box_stats(values[codes == code], label=locations[code]) for code in top_codes]
+        ax.bxp(stats, showfliers=True)
+        ax.set_xticks(range(1, len(stats) + 1), [s["label"] for s in stats], rotation=45)
+    else:
+        top_locations = df["Location"].value_counts().head(top_n).index
+        filtered_df = df[df["Location"].isin(top_locations)]
+        sns.boxplot(data=filtered_df, x="Location", y="Price/m²", ax=ax)
+        ax.set_xticklabels(ax.get_xticklabels(), rotation=45)
+    ax.set_title(title)
     ax.set_xlabel("Location")
     ax.set_ylabel("Price per m² (EGP)")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45)
+    fig.tight_layout()
     return fig
 
 
-def count_room_features(df: pd.DataFrame):
+@instrument()
+def count_room_features(df: pd.DataFrame, large: bool = False):
     figs = []
     for col in ["Bedrooms", "Bathrooms"]:
-        fig, ax = plt.subplots()
-        sns.countplot(data=df, x=col, ax=ax)
+        fig, ax = _subplots()
+        if large:
+            counts = df[col].value_counts().sort_index()
+            ax.bar(counts.index.astype(str), counts.to_numpy())
+        else:
+            sns.countplot(data=df, x=col, ax=ax)
         ax.set_title(f"Distribution of {col}")
         ax.set_xlabel(col)
         ax.set_ylabel("Count")
@@ -89,19 +213,29 @@ def count_room_features(df: pd.DataFrame):
     return figs
 
 
-def run_eda(df: pd.DataFrame):
+@instrument()
+def run_eda(df: pd.DataFrame, large: bool = None, cube=None):
     """
     Return all EDA figures as dictionary.
+    With large=None, frames of LARGE_DATA_ROWS or more use the large-data mode:
+    NumPy-binned histograms, precomputed box statistics and hexbin density plots.
+    Given an aggregates.AggregateCube, the large mode reads the summary and location
+    boxplots from it; smaller frames keep the exact statistics and Tukey whiskers.
     """
-    df = clean_strings(df)
+    if large is None:
+        large = len(df) >= LARGE_DATA_ROWS
+    if not large:
+        cube = None
+    # Shallow copy: cleaned columns replace the copy's, leaving the caller's frame untouched
+    df = clean_strings(df.copy(deep=False), columns=["Location"])
 
     eda_figures = {
-        "summary": plot_statistical_summary(df),
-        "distributions": plot_distributions(df),
-        "correlation": plot_correlation(df),
-        "scatter": scatter_relationships(df),
-        "boxplot_location": boxplots_by_location(df),
-        "room_counts": count_room_features(df),
+        "summary": plot_statistical_summary(df, large, cube),
+        "distributions": plot_distributions(df, large),
+        "correlation": plot_correlation(df, large),
+        "scatter": scatter_relationships(df, large),
+        "boxplot_location": boxplots_by_location(df, large=large, cube=cube),
+        "room_counts": count_room_features(df, large),
     }
 
     return eda_figures
@@ -0,0 +1,323 @@
+# aggregates.py
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+AGGREGATES_DIR = "data/aggregates"
+
+# Grouping levels of the cube; "all" is the single whole-snapshot group
+LEVELS = {"all": [], "location": ["Location"], "location_bedrooms": ["Location", "Bedrooms"]}
+
+METRICS = ["Price", "Price/m²", "Area", "Bedrooms", "Bathrooms"]
+
+# Histogram sketch per metric: log-spaced bins over (low, high) for continuous values,
+# one bin per integer for room counts. Quantiles read from these are within half a bin.
+BINS = {
+    "Price": ("log", 1e4, 1e10, 192),
+    "Price/m²": ("log", 1e2, 1e7, 160),
+    "Area": ("log", 1.0, 1e5, 160),
+    "Bedrooms": ("int", 0, 20, 21),
+    "Bathrooms": ("int", 0, 20, 21),
+}
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+# Additive (n, sum, sum of squares) and extreme (min, max) moments kept per metric
+MOMENTS = ["n", "sum", "sumsq", "min", "max"]
+
+
+def _bin_index(metric: str, values: np.ndarray) -> np.ndarray:
+    """
+    Histogram bin of each value (-1 for missing); out-of-range values go to the end bins.
+    """
+    kind, low, high, bins = BINS[metric]
+    index = np.full(len(values), -1, dtype=np.int64)
+    finite = np.isfinite(values)
+    if kind == "log":
+        scaled = (np.log10(np.maximum(values[finite], low)) - np.log10(low)) / (np.log10(high) - np.log10(low))
+        index[finite] = np.clip((scaled * bins).astype(np.int64), 0, bins - 1)
+    else:
+        index[finite] = np.clip(np.rint(values[finite]).astype(np.int64) - int(low), 0, bins - 1)
+    return index
+
+
+def _bin_edges(metric: str):
+    kind, low, high, bins = BINS[metric]
+    if kind == "log":
+        edges = np.logspace(np.log10(low), np.log10(high), bins + 1)
+        return edges[:-1], edges[1:]
+    values = np.arange(low, low + bins, dtype=np.float64)
+    return values, values
+
+
+def _key_frame(df: pd.DataFrame, key_columns: list) -> pd.DataFrame:
+    # Scraped locations can carry stray tabs/spaces; group on the cleaned name
+    keys = df[key_columns].copy()
+    if "Location" in keys:
+        uniques = pd.Series(keys["Location"].dropna().unique())
+        keys["Location"] = keys["Location"].map(dict(zip(uniques, uniques.str.replace("\t", "").str.strip())))
+    return keys
+
+
+def _group_codes(keys: pd.DataFrame, key_columns: list):
+    """
+    Group number of each row of `keys` and the distinct key rows, in sorted key order.
+    """
+    if not key_columns:
+        return np.zeros(len(keys), dtype=np.int64), pd.DataFrame(index=range(1))
+    grouped = keys.groupby(key_columns, sort=True, dropna=False)
+    return grouped.ngroup().to_numpy(), grouped.size().index.to_frame(index=False)
+
+
+class GroupSketch:
+    """
+    Mergeable per-group statistics for one level of the cube: row counts, moments and a
+    fixed-bin histogram per metric. Two sketches merge by adding counts and histograms,
+    so new listings are folded in without touching the rows already summarised.
+    """
+
+    def __init__(self, key_columns: list, keys: pd.DataFrame, count: np.ndarray, moments: dict, hist: dict):
+        self.key_columns = key_columns
+        self.keys = keys
+        self.count = count
+        self.moments = moments  # metric -> (groups, 5) float64 in MOMENTS order
+        self.hist = hist  # metric -> (groups, bins) uint32
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key_columns: list) -> "GroupSketch":
+        codes, keys = _group_codes(_key_frame(df, key_columns), key_columns)
+        n_groups = len(keys)
+        moments, hist = {}, {}
+        for metric in METRICS:
+            values = df[metric].to_numpy(dtype=np.float64)
+            finite = np.isfinite(values)
+            group, value = codes[finite], values[finite]
+            stats = np.empty((n_groups, len(MOMENTS)))
+            stats[:, 0] = np.bincount(group, minlength=n_groups)
+            stats[:, 1] = np.bincount(group, weights=value, minlength=n_groups)
+            stats[:, 2] = np.bincount(group, weights=value * value, minlength=n_groups)
+            extremes = pd.Series(value).groupby(group).agg(["min", "max"]).reindex(range(n_groups))
+            stats[:, 3:] = extremes.to_numpy()
+            moments[metric] = stats
+
+            bins = BINS[metric][3]
+            index = _bin_index(metric, values)
+            valid = index >= 0
+            flat = np.bincount(codes[valid] * bins + index[valid], minlength=n_groups * bins)
+            hist[metric] = flat.reshape(n_groups, bins).astype(np.uint32)
+        count = np.bincount(codes, minlength=n_groups)
+        return cls(key_columns, keys, count, moments, hist)
+
+    def merge(self, other: "GroupSketch") -> "GroupSketch":
+        both = pd.concat([self.keys, other.keys], ignore_index=True)
+        codes, keys = _group_codes(both, self.key_columns)
+        mine, theirs = codes[:len(self)], codes[len(self):]
+        n_groups = len(keys)
+
+        count = np.zeros(n_groups, dtype=np.int64)
+        count[mine] += self.count
+        count[theirs] += other.count
+        moments, hist = {}, {}
+        for metric in METRICS:
+            stats = np.zeros((n_groups, len(MOMENTS)))
+            stats[:, 3], stats[:, 4] = np.inf, -np.inf
+            for rows, source in [(mine, self.moments[metric]), (theirs, other.moments[metric])]:
+                stats[rows, :3] += source[:, :3]
+                stats[rows, 3] = np.fmin(stats[rows, 3], source[:, 3])
+                stats[rows, 4] = np.fmax(stats[rows, 4], source[:, 4])
+            stats[~np.isfinite(stats[:, 3]), 3:] = np.nan
+            moments[metric] = stats
+
+            merged = np.zeros((n_groups, self.hist[metric].shape[1]), dtype=np.uint32)
+            merged[mine] += self.hist[metric]
+            merged[theirs] += other.hist[metric]
+            hist[metric] = merged
+        return GroupSketch(self.key_columns, keys, count, moments, hist)
+
+    def quantiles(self, metric: str, qs: list = QUANTILES) -> np.ndarray:
+        """
+        (groups, len(qs)) quantiles with the same linear interpolation between order
+        statistics as pandas, where each value is represented by the centre of its bin
+        (the exact value for room counts). Clipped to each group's exact min/max.
+        """
+        hist = self.hist[metric]
+        cumulative = hist.cumsum(axis=1, dtype=np.int64)
+        n = cumulative[:, -1]
+        lower, upper = _bin_edges(metric)
+        centres = np.sqrt(lower * upper) if BINS[metric][0] == "log" else lower
+        out = np.full((len(hist), len(qs)), np.nan)
+        for j, q in enumerate(qs):
+            rank = q * np.maximum(n - 1, 0)
+            below, above = np.floor(rank), np.ceil(rank)
+            # Bin holding the order statistic of a given (0-based) rank
+            low_value = centres[np.minimum((cumulative <= below[:, None]).sum(axis=1), hist.shape[1] - 1)]
+            high_value = centres[np.minimum((cumulative <= above[:, None]).sum(axis=1), hist.shape[1] - 1)]
+            out[:, j] = np.where(n > 0, low_value + (rank - below) * (high_value - low_value), np.nan)
+        extremes = self.moments[metric][:, 3:]
+        return np.clip(out, extremes[:, :1], extremes[:, 1:])
+
+    def stats(self, metric: str, qs: list = QUANTILES) -> pd.DataFrame:
+        """
+        One row per group: listing count and count/mean/std/min/quantiles/max of `metric`.
+        """
+        n, total, sumsq, low, high = self.moments[metric].T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / n
+            std = np.sqrt(np.maximum(sumsq - n * mean * mean, 0) / (n - 1))
+        frame = self.keys.copy()
+        frame["Listings"] = self.count
+        frame["count"], frame["mean"], frame["std"], frame["min"] = n, mean, std, low
+        for q, values in zip(qs, self.quantiles(metric, qs).T):
+            frame[f"{q:.0%}"] = values
+        frame["max"] = high
+        return frame
+
+    def to_table(self) -> pa.Table:
+        columns = {col: self.keys[col].to_numpy() for col in self.key_columns}
+        columns["Listings"] = self.count
+        for metric in METRICS:
+            for j, moment in enumerate(MOMENTS):
+                columns[f"{metric} {moment}"] = self.moments[metric][:, j]
+        table = pa.table(columns)
+        for metric in METRICS:
+            bins = self.hist[metric].shape[1]
+            flat = pa.array(self.hist[metric].ravel(), type=pa.uint32())
+            table = table.append_column(f"{metric} hist", pa.FixedSizeListArray.from_arrays(flat, bins))
+        return table
+
+    @classmethod
+    def from_table(cls, table: pa.Table, key_columns: list) -> "GroupSketch":
+        frame = table.select(key_columns + ["Listings"]).to_pandas()
+        keys = frame[key_columns] if key_columns else pd.DataFrame(index=range(len(frame)))
+        moments, hist = {}, {}
+        for metric in METRICS:
+            moments[metric] = np.column_stack([table[f"{metric} {m}"].to_numpy() for m in MOMENTS]).astype(np.float64)
+            column = table[f"{metric} hist"].combine_chunks()
+            hist[metric] = column.flatten().to_numpy().reshape(len(frame), column.type.list_size).astype(np.uint32)
+        return cls(key_columns, keys.reset_index(drop=True), frame["Listings"].to_numpy(), moments, hist)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Content hash of every row, used to tell which listings a cube already covers.
+    """
+    columns = [col for col in ["Listing URL", "Location"] + METRICS if col in df.columns]
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+class AggregateCube:
+    """
+    Per-Location and per-(Location, Bedrooms) statistics of one listings snapshot
+    (plus the whole-snapshot "all" level), built once and refreshed incrementally.
+    """
+
+    def __init__(self, levels: dict, hashes: np.ndarray):
+        self.levels = levels
+        self.hashes = hashes
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "AggregateCube":
+        levels = {name: GroupSketch.from_frame(df, keys) for name, keys in LEVELS.items()}
+        print(f"[AGG] Built aggregates for {len(df)} listings ({len(levels['location'])} locations).")
+        return cls(levels, np.sort(row_hashes(df)))
+
+    def content_hash(self) -> str:
+        """
+        Content hash used by stage_cache to key stages that consume this cube.
+        """
+        return hashlib.blake2b(self.hashes.tobytes(), digest_size=16).hexdigest()
+
+    def refresh(self, df: pd.DataFrame) -> "AggregateCube":
+        """
+        Fold in rows of `df` the cube has not seen. If rows it covers are gone (removed or
+        edited listings), moments cannot be subtracted, so the cube is rebuilt instead.
+        """
+        hashes = row_hashes(df)
+        if not np.isin(self.hashes, hashes).all():
+            print("[AGG] Listings were removed or changed; rebuilding aggregates.")
+            return AggregateCube.build(df)
+        new = ~np.isin(hashes, self.hashes)
+        if not new.any():
+            return self
+        added = df[new]
+        levels = {name: sketch.merge(GroupSketch.from_frame(added, sketch.key_columns))
+                  for name, sketch in self.levels.items()}
+        print(f"[AGG] Added {len(added)} new listings to the aggregates.")
+        return AggregateCube(levels, np.sort(hashes))
+
+    def locations(self) -> list:
+        return self.levels["location"].keys["Location"].tolist()
+
+    def bedrooms(self) -> list:
+        return sorted(self.levels["location_bedrooms"].keys["Bedrooms"].dropna().unique().tolist())
+
+    def stats(self, level: str = "location", metric: str = "Price/m²", locations: list = None,
+              bedrooms: list = None) -> pd.DataFrame:
+        """
+        Statistics of `metric` per group of `level`, optionally sliced by location/bedrooms.
+        Slicing only filters the precomputed groups, so it costs the same at any row count.
+        """
+        frame = self.levels[level].stats(metric)
+        if locations and "Location" in frame:
+            frame = frame[frame["Location"].isin(locations)]
+        if bedrooms and "Bedrooms" in frame:
+            frame = frame[frame["Bedrooms"].isin(bedrooms)]
+        return frame.reset_index(drop=True)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        DataFrame.describe()-style table of every metric over the whole snapshot
+        (quartiles of continuous metrics are histogram estimates).
+        """
+        rows = []
+        for metric in METRICS:
+            row = self.levels["all"].stats(metric, qs=[0.25, 0.5, 0.75]).iloc[0]
+            rows.append(row[["count", "mean", "std", "min", "25%", "50%", "75%", "max"]].rename(metric))
+        return pd.DataFrame(rows).astype(float)
+
+    def box_stats(self, metric: str = "Price/m²", top_n: int = 10) -> list:
+        """
+        Axes.bxp input for the `top_n` locations with the most listings: quartiles and
+        whiskers at the 10th/90th percentiles (no fliers, since rows are not kept).
+        """
+        stats = self.stats("location", metric)
+        stats = stats.sort_values("Listings", ascending=False, kind="stable").head(top_n)
+        return [{"label": row["Location"], "q1": row["25%"], "med": row["50%"], "q3": row["75%"],
+                 "whislo": row["10%"], "whishi": row["90%"], "fliers": []}
+                for _, row in stats.iterrows()]
+
+    def save(self, directory: str = AGGREGATES_DIR):
+        os.makedirs(directory, exist_ok=True)
+        for name, sketch in self.levels.items():
+            pq.write_table(sketch.to_table(), os.path.join(directory, f"{name}.parquet"), compression="zstd")
+        np.save(os.path.join(directory, "row_hashes.npy"), self.hashes)
+
+    @classmethod
+    def load(cls, directory: str = AGGREGATES_DIR) -> "AggregateCube":
+        levels = {name: GroupSketch.from_table(pq.read_table(os.path.join(directory, f"{name}.parquet")), keys)
+                  for name, keys in LEVELS.items()}
+        return cls(levels, np.load(os.path.join(directory, "row_hashes.npy")))
+
+
+def load_cube(df: pd.DataFrame, directory: str = AGGREGATES_DIR) -> AggregateCube:
+    """
+    The cube for this snapshot: the saved cube refreshed with any new listings, or a
+    fresh build on first use. Saved back whenever it changes.
+    """
+    if os.path.exists(os.path.join(directory, "row_hashes.npy")):
+        cube = AggregateCube.load(directory)
+        refreshed = cube.refresh(df)
+        if refreshed is cube:
+            return cube
+    else:
+        refreshed = AggregateCube.build(df)
+    refreshed.save(directory)
+    return refreshed
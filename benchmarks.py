@@ -0,0 +1,882 @@
+# benchmarks.py
+
+"""
+Micro-benchmarks for the Aqarmap pipeline.
+
+Usage:
+    python benchmarks.py parsers tests/fixtures
+    python benchmarks.py preprocess --scale 1000
+    python benchmarks.py imports
+    python benchmarks.py predict
+    python benchmarks.py clustering
+    python benchmarks.py similar
+    python benchmarks.py dedup
+    python benchmarks.py eda
+    python benchmarks.py chunked --scale 1000
+    python benchmarks.py sbert --texts 20000
+    python benchmarks.py pipeline --rows 10000 100000 --json pipeline.json
+    python benchmarks.py incremental --base 40000 --delta 2000
+    python benchmarks.py models --folds 5 --rows 100000
+"""
+
+import argparse
+import gc
+import glob
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import peak_rss_mb, reset_peak_rss
+from preprocessing import preprocess
+from scraper import PARSERS, parse_listings_page
+
+DATA_PATH = "data/aqarmap_listings.csv"
+
+APP_MODULES = ["streamlit", "scraper", "preprocessing", "storage", "nlp_features",
+               "EDA", "model", "clustering"]
+
+
+def load_saved_pages(folder: str) -> list:
+    """
+    Read every saved results page (*.html) in a folder.
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def benchmark_parsers(html_pages: list, backends=None, repeat: int = 3) -> list:
+    """
+    Time each parser backend over the saved pages and report cards parsed per second.
+    Every backend's output is checked against the reference BeautifulSoup parse.
+    """
+    backends = backends or list(PARSERS)
+    reference = [parse_listings_page(html, "soup") for html in html_pages]
+    n_cards = sum(len(cards) for cards in reference)
+
+    results = []
+    for backend in backends:
+        parsed = [parse_listings_page(html, backend) for html in html_pages]
+        identical = parsed == reference
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for html in html_pages:
+                parse_listings_page(html, backend)
+            best = min(best, time.perf_counter() - start)
+
+        results.append({
+            "backend": backend,
+            "cards": n_cards,
+            "seconds": best,
+            "cards_per_sec": n_cards / best if best > 0 else float("inf"),
+            "identical": identical,
+        })
+    return results
+
+
+def tile_listings_csv(scale: int, source: str = DATA_PATH, target: str = None) -> str:
+    """
+    Write a synthetic raw listings CSV made of `scale` copies of the saved data.
+    """
+    raw = pd.read_csv(source, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    big = pd.concat([raw] * scale, ignore_index=True)
+    if target is None:
+        target = os.path.join(tempfile.mkdtemp(prefix="aqarmap_bench_"), f"listings_x{scale}.csv")
+    big.to_csv(target, index=False)
+    return target
+
+
+def legacy_preprocess(filepath: str) -> pd.DataFrame:
+    """
+    The original row-wise preprocessing path, kept here as the benchmark baseline.
+    """
+    df = pd.read_csv(filepath, encoding="utf-8-sig")
+    df.replace(["N/A", ""], np.nan, inplace=True)
+
+    def parse(value):
+        if pd.isna(value):
+            return np.nan
+        value = str(value).replace("\n", " ").replace(",", "").replace("EGP", "").replace("EGP/m", "")
+        value = re.sub(r"[^\d]", "", value)
+        return int(value) if value.isdigit() else np.nan
+
+    def extract(value):
+        if pd.isna(value):
+            return np.nan
+        value = str(value).replace("m²", "").replace("mÂ²", "").replace("Â²", "")
+        match = re.search(r"\d+", value)
+        return int(match.group()) if match else np.nan
+
+    df["Price"] = df["Price"].apply(parse)
+    df["Price/m²"] = df["Price/m²"].apply(parse)
+    df["Area"] = df["Area"].apply(extract)
+    df["Bedrooms"] = pd.to_numeric(df["Bedrooms"], errors="coerce")
+    df["Bathrooms"] = pd.to_numeric(df["Bathrooms"], errors="coerce")
+    df["Location"] = df["Location"].str.replace(r"^Greater Cairo\s*/\s*", "", regex=True)
+
+    for col in df.columns:
+        if df[col].dtype in [np.float64, np.int64]:
+            if col in ["Bedrooms", "Bathrooms"]:
+                df[col] = df[col].fillna(math.ceil(df[col].mean()))
+            else:
+                df[col] = df[col].fillna(df[col].mean())
+        else:
+            df[col] = df[col].fillna(df[col].mode().iloc[0])
+
+    df.reset_index(drop=True, inplace=True)
+    df.drop(columns=[col for col in df.columns if col.startswith("Unnamed:")], inplace=True)
+    return df
+
+
+def benchmark_preprocess(scale: int = 1000, source: str = DATA_PATH) -> list:
+    """
+    Compare the vectorized preprocess against the legacy row-wise path on tiled data.
+    """
+    path = tile_listings_csv(scale, source)
+    results = []
+    try:
+        outputs = {}
+        # Tiled copies are duplicates by construction, so the dedup stage is left out here
+        for name, fn in [("legacy", legacy_preprocess), ("vectorized", partial(preprocess, dedup=False))]:
+            start = time.perf_counter()
+            outputs[name] = fn(path)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "path": name,
+                "rows": len(outputs[name]),
+                "seconds": elapsed,
+                "rows_per_sec": len(outputs[name]) / elapsed if elapsed > 0 else float("inf"),
+            })
+
+        try:
+            pd.testing.assert_frame_equal(outputs["legacy"], outputs["vectorized"], check_dtype=False)
+            same = True
+        except AssertionError:
+            same = False
+        for row in results:
+            row["matches_legacy"] = same
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    return results
+
+
+def profile_import(module: str, top: int = 5) -> dict:
+    """
+    Import a module in a fresh interpreter with -X importtime and summarise the cost.
+    Returns the total import time and the heaviest top-level dependencies it pulled in.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return {"module": module, "seconds": float("nan"), "heaviest": proc.stderr.strip().splitlines()[-1]}
+
+    # Lines look like "import time: self [us] | cumulative | <indent>package"; children
+    # are listed before their parent and indented two more spaces per level.
+    children, total = {}, float("nan")
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        if depth == 1:
+            children[name.strip()] = seconds
+        elif depth == 0:
+            if name.strip() == module:
+                total = seconds
+                break
+            children = {}
+
+    heaviest = sorted(children.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "seconds": total,
+        "heaviest": ", ".join(f"{dep} {sec:.2f}s" for dep, sec in heaviest),
+    }
+
+
+def profile_imports(modules=None) -> list:
+    """
+    Import-time report for the dashboard's modules, each measured from a cold interpreter.
+    """
+    return [profile_import(module) for module in modules or APP_MODULES]
+
+
+def benchmark_prediction(n_single: int = 1000, batch_size: int = 10_000, registry_dir: str = None) -> list:
+    """
+    p50/p99 single-listing latency and batch throughput for every registered model.
+    With no registry_dir, models are trained on the saved data into a temporary registry.
+    """
+    from model import run_models
+    from predict import PricePredictor
+
+    cleanup = registry_dir is None
+    if cleanup:
+        registry_dir = tempfile.mkdtemp(prefix="aqarmap_registry_")
+        run_models(preprocess(DATA_PATH), target="Price", register=True, registry_dir=registry_dir)
+
+    try:
+        predictor = PricePredictor(registry_dir=registry_dir)
+        source = preprocess(DATA_PATH)
+        records = source[["Price/m²", "Area", "Bedrooms", "Bathrooms"]].to_dict(orient="records")
+        batch = pd.DataFrame.from_records([records[i % len(records)] for i in range(batch_size)])
+
+        results = []
+        for name in predictor.models:
+            latencies = []
+            for i in range(n_single):
+                start = time.perf_counter()
+                predictor.predict(records[i % len(records)], model=name)
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            predictor.predict(batch, model=name)
+            batch_seconds = time.perf_counter() - start
+
+            results.append({
+                "model": name,
+                "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+                "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+                "batch_rows_per_sec": batch_size / batch_seconds,
+            })
+        return results
+    finally:
+        if cleanup:
+            import shutil
+
+            shutil.rmtree(registry_dir, ignore_errors=True)
+
+
+def benchmark_clustering(k_min: int = 2, k_max: int = 10, synthetic_rows: int = 0) -> list:
+    """
+    Exact KMeans + full silhouette vs the scalable MiniBatchKMeans sweep.
+    Uses the saved listings' TF-IDF features (no SBERT download needed), or Gaussian
+    blobs with `synthetic_rows` rows. Every selection is rescored with the exact
+    silhouette and compared by adjusted Rand index.
+    """
+    from scipy import sparse
+    from sklearn.datasets import make_blobs
+    from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+    from clustering import optimal_kmeans, scalable_kmeans
+    from nlp_features import tfidf_matrix
+
+    if synthetic_rows:
+        X, _ = make_blobs(synthetic_rows, n_features=64, centers=6, random_state=0)
+        X = X.astype(np.float32)
+    else:
+        df = preprocess(DATA_PATH)
+        X = sparse.hstack([tfidf_matrix(df, "Location", "loc", 30)[0],
+                           tfidf_matrix(df, "Title", "title", 30)[0]], format="csr")
+
+    runs = []
+    start = time.perf_counter()
+    model, k, _ = optimal_kmeans(X, n_min=k_min, n_max=k_max)
+    runs.append(("exact", model, k, time.perf_counter() - start))
+    for criterion in ["silhouette", "calinski_harabasz", "elbow"]:
+        start = time.perf_counter()
+        model, k, _, _ = scalable_kmeans(X, n_min=k_min, n_max=k_max, criterion=criterion)
+        runs.append((f"scalable/{criterion}", model, k, time.perf_counter() - start))
+
+    reference = runs[0][1].predict(X)
+    results = []
+    for name, model, k, seconds in runs:
+        labels = model.predict(X)
+        results.append({
+            "path": name,
+            "rows": X.shape[0],
+            "best_k": k,
+            "exact_silhouette": float(silhouette_score(X, labels, sample_size=min(X.shape[0], 20_000),
+                                                       random_state=0)),
+            "ari_vs_exact": float(adjusted_rand_score(reference, labels)),
+            "seconds": seconds,
+        })
+    return results
+
+
+def benchmark_similar(n_rows: int = 100_000, dim: int = 771, n_queries: int = 200, k: int = 10,
+                      nprobes: tuple = (1, 4, 8, 16, 32)) -> list:
+    """
+    Recall@k and per-query latency of the IVF similar-listings index against the exact
+    brute-force search, on clustered synthetic unit vectors shaped like listing vectors.
+    """
+    from similar_listings import VectorIndex
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(1, n_rows // 500), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n_rows)] + 1.5 * rng.normal(size=(n_rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(n_rows, size=n_queries, replace=False)]
+    keys = [str(i) for i in range(n_rows)]
+
+    start = time.perf_counter()
+    index = VectorIndex(dim)
+    index.add(keys, vectors)
+    build_seconds = time.perf_counter() - start
+
+    def run(search, **kwargs):
+        found, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            result, _ = search(query, k=k, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            found.append(set(result[0]))
+        return found, np.array(latencies) * 1000
+
+    truth, exact_ms = run(index.search_exact)
+    results = [{"search": "exact", "rows": n_rows, "lists": index.n_lists, f"recall@{k}": 1.0,
+                "p50_ms": np.percentile(exact_ms, 50), "p95_ms": np.percentile(exact_ms, 95),
+                "build_s": build_seconds}]
+    for nprobe in nprobes:
+        found, ms = run(index.search, nprobe=nprobe)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        results.append({"search": f"ivf nprobe={nprobe}", "rows": n_rows, "lists": index.n_lists,
+                        f"recall@{k}": recall, "p50_ms": np.percentile(ms, 50),
+                        "p95_ms": np.percentile(ms, 95), "build_s": build_seconds})
+    return results
+
+
+def synthetic_clean_listings(n_rows: int, dup_rate: float = 0.2, seed: int = 0):
+    """
+    Cleaned-listing frame with injected duplicates: a `dup_rate` share of rows are reposts
+    of an earlier row, half verbatim (new image and URL) and half edited (punctuation and
+    case in the title, price nudged by up to 1%). Returns (frame, source row per row).
+    """
+    rng = np.random.default_rng(seed)
+    kinds = np.array(["Apartment", "Villa", "Duplex", "Chalet", "Clinic", "Office", "Studio", "Penthouse"])
+    places = np.array([f"Compound {i} - District {i % 37}" for i in range(2_000)])
+    n_base = int(n_rows * (1 - dup_rate))
+    base = pd.DataFrame({
+        "Title": pd.Series(kinds[rng.integers(len(kinds), size=n_base)]) + " for sale in "
+                 + pd.Series(rng.integers(1, 500, size=n_base)).astype(str) + " street",
+        "Price": rng.integers(50, 5_000, size=n_base).astype(float) * 10_000,
+        "Location": places[rng.integers(len(places), size=n_base)],
+        "Area": rng.integers(40, 600, size=n_base).astype(float),
+        "Bedrooms": rng.integers(1, 6, size=n_base).astype(float),
+        "Bathrooms": rng.integers(1, 5, size=n_base).astype(float),
+    })
+    source = np.concatenate([np.arange(n_base), rng.integers(n_base, size=n_rows - n_base)])
+    df = base.iloc[source].reset_index(drop=True)
+    df["Image URL"] = [f"https://img.example/{i:09x}.jpg" for i in range(n_rows)]
+    df["Listing URL"] = [f"https://example/listing/{i}" for i in range(n_rows)]
+
+    edited = np.arange(n_base, n_rows)[rng.random(n_rows - n_base) < 0.5]
+    df.loc[edited, "Title"] = df.loc[edited, "Title"].str.upper() + "!"
+    df.loc[edited, "Price"] = (df.loc[edited, "Price"] * rng.uniform(0.99, 1.01, size=len(edited))).round()
+    return df, source
+
+
+def benchmark_dedup(n_rows: int = 1_000_000) -> list:
+    """
+    Throughput of find_duplicate_groups on synthetic listings, how many injected
+    duplicates land in the same group as their source row, and how many groups
+    wrongly merge distinct source listings.
+    """
+    from dedup import find_duplicate_groups
+
+    df, source = synthetic_clean_listings(n_rows)
+    start = time.perf_counter()
+    groups = find_duplicate_groups(df)
+    elapsed = time.perf_counter() - start
+
+    injected = np.flatnonzero(source != np.arange(n_rows))
+    found = groups[injected] == groups[source[injected]]
+    expected_groups = len(np.unique(source))
+    return [{
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_sec": n_rows / elapsed,
+        "injected_dups": len(injected),
+        "dup_recall": found.mean(),
+        "groups": len(np.unique(groups)),
+        "expected_groups": expected_groups,
+        "mixed_groups": int((pd.Series(source).groupby(groups).nunique() > 1).sum()),
+    }]
+
+
+def benchmark_eda(n_rows: int = 1_000_000, exact_max_rows: int = 100_000) -> list:
+    """
+    Time to build and render every EDA figure in the large-data mode and, up to
+    `exact_max_rows`, in the seaborn mode, on saved listings resampled to n_rows.
+    """
+    import io
+
+    import matplotlib.pyplot as plt
+
+    from EDA import run_eda
+
+    source = preprocess(DATA_PATH)
+    run_eda(source.copy())  # warm up fonts and styles
+    rng = np.random.default_rng(0)
+    df = source.sample(n_rows, replace=True, random_state=0).reset_index(drop=True)
+    df[["Price", "Price/m²", "Area"]] *= rng.uniform(0.9, 1.1, size=(n_rows, 3))
+
+    results = []
+    for large in [True, False]:
+        if not large and n_rows > exact_max_rows:
+            continue
+        start = time.perf_counter()
+        figures = run_eda(df.copy(), large=large)
+        build = time.perf_counter() - start
+        flat = [figures["summary"], figures["correlation"], figures["boxplot_location"]]
+        flat += [fig for key in ["distributions", "scatter", "room_counts"] for _, fig in figures[key]]
+        start = time.perf_counter()
+        for fig in flat:
+            fig.savefig(io.BytesIO(), format="png")
+        results.append({"mode": "large" if large else "seaborn", "rows": n_rows, "figures": len(flat),
+                        "build_s": build, "render_s": time.perf_counter() - start,
+                        "open_pyplot_figures": len(plt.get_fignums())})
+    return results
+
+
+# Child-process snippets for benchmark_chunked; each prints "<seconds> <peak RSS MB>"
+_CHUNKED_RUNS = {
+    "in-memory": "from preprocessing import preprocess; from storage import save_listings; "
+                 "save_listings(preprocess({path!r}, dedup=False), {output!r})",
+    "chunked": "from chunked import run_chunked; run_chunked({path!r}, {output!r}, chunk_rows={chunk_rows}, embed=False)",
+}
+
+
+def benchmark_chunked(scale: int = 1000, chunk_rows: int = 100_000, source: str = DATA_PATH) -> list:
+    """
+    Time and peak memory of in-memory preprocess + save against the chunked pipeline
+    (embeddings off) on tiled data. Each path runs in a fresh interpreter, so peak RSS is its own.
+    """
+    path = tile_listings_csv(scale, source)
+    folder = os.path.dirname(path)
+    results = []
+    try:
+        for name, snippet in _CHUNKED_RUNS.items():
+            output = os.path.join(folder, f"{name}.parquet")
+            code = ("import resource, time; start = time.perf_counter(); "
+                    + snippet.format(path=path, output=output, chunk_rows=chunk_rows)
+                    + "; print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)")
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+            seconds, peak_mb = map(float, proc.stdout.strip().splitlines()[-1].split())
+            results.append({
+                "path": name,
+                "rows": pd.read_parquet(output, columns=["Price"]).shape[0],
+                "seconds": seconds,
+                "peak_rss_mb": peak_mb,
+            })
+            os.remove(output)
+    finally:
+        os.remove(path)
+        os.rmdir(folder)
+    return results
+
+
+def benchmark_sbert(n_texts: int = 20_000, backends: list = None, workers: int = 1, source: str = DATA_PATH) -> list:
+    """
+    Sentences/sec of each SBERT backend and cosine similarity to the fp32 embeddings,
+    on Title and Location texts of the saved data repeated up to `n_texts`.
+    """
+    from nlp_features import MODEL_NAME
+    from sbert_backends import compare_backends
+
+    raw = pd.read_csv(source, encoding="utf-8-sig", usecols=["Title", "Location"])
+    texts = pd.concat([raw["Title"], raw["Location"]]).dropna().astype(str).tolist()
+    texts = (texts * math.ceil(n_texts / len(texts)))[:n_texts]
+    return compare_backends(texts, MODEL_NAME, backends, workers=workers)
+
+
+PIPELINE_SCALES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+PIPELINE_STAGES = ["preprocess", "nlp", "eda", "models", "clustering"]
+
+_COMPOUNDS = ["Palm Hills", "Mountain View", "Madinaty", "Hyde Park", "Mivida", "Eastown", "Sarai", "Villette",
+              "Makany", "Compass Building", "Stone Residence", "Fifth Square", "Open Air Mall", "Solana East"]
+_DEVELOPERS = ["Emaar", "SODIC", "Ora", "TMG", "El Mansour", "Arab Developers", "PRE", "Al Fedaa", "High Art"]
+_KINDS = {"Apartment": (80, 250), "Villa": (250, 700), "Town House": (200, 350), "Duplex": (150, 350),
+          "Chalet": (60, 160), "Clinic": (25, 80), "Office": (40, 200), "Retail": (30, 150)}
+
+
+def synthetic_raw_listings(n_rows: int, seed: int = 0, start_id: int = 0) -> pd.DataFrame:
+    """
+    Raw listing rows in the scraped format: multi-line 'EGP' prices, '-35,555EGP/m' prices
+    per meter, '225m²' areas, 'Greater Cairo  /  …' locations and 'N/A' room counts
+    (at roughly the saved data's rates). Price per meter depends on the location, so
+    models and EDA see a real signal.
+    """
+    rng = np.random.default_rng(seed)
+    places = np.array([f"{compound} {i // (len(_COMPOUNDS) * len(_DEVELOPERS)) or ''} - {developer}"
+                       .replace("  ", " ")
+                       for i, (compound, developer) in enumerate(
+                           (c, d) for _ in range(20) for c in _COMPOUNDS for d in _DEVELOPERS)])
+    place_ppm = np.random.default_rng(1).lognormal(np.log(60_000), 0.5, size=len(places))
+    kinds = np.array(list(_KINDS))
+    low, high = np.array(list(_KINDS.values())).T
+
+    place = rng.zipf(1.3, size=n_rows) % len(places)
+    kind = rng.integers(len(kinds), size=n_rows)
+    area = rng.integers(low[kind], high[kind] + 1)
+    price = np.round(place_ppm[place] * rng.lognormal(0, 0.2, size=n_rows) * area, -3).astype(np.int64)
+    bedrooms = np.clip(area // 60, 1, 7)
+    bathrooms = np.clip(bedrooms - rng.integers(0, 2, size=n_rows), 1, 7)
+    ids = np.arange(start_id, start_id + n_rows)
+
+    title = pd.Series(kinds[kind], dtype=object) + np.where(rng.random(n_rows) < 0.5, " for sale in ", " For sale in ")
+    title = title + pd.Series(places[place], dtype=object)
+    arabic = rng.random(n_rows) < 0.05
+    title[arabic] = "شقق للبيع في " + pd.Series(places[place[arabic]], dtype=object).to_numpy()
+
+    df = pd.DataFrame({
+        "Title": title,
+        "Price": pd.Series(price).map("{:,}\n    EGP".format),
+        "Price/m²": pd.Series(price // area).map("-{:,}EGP/m".format),
+        "Location": "Greater Cairo  /  " + pd.Series(places[place], dtype=object)
+                    + np.where(rng.random(n_rows) < 0.3, " ", ""),
+        "Area": pd.Series(area).astype(str) + "m²",
+        "Bedrooms": pd.Series(bedrooms).astype(str),
+        "Bathrooms": pd.Series(bathrooms).astype(str),
+        "Image URL": [f"https://img-{i % 5}.aqarmap.com.eg/new-aqarmap-media/search-thumb-webp/2506/{i:024x}.jpg"
+                      for i in ids],
+        "Listing URL": [f"https://aqarmap.com.eg/en/listing/{i}-for-sale-cairo/" for i in ids],
+    })
+    no_rooms = rng.random(n_rows) < 0.115
+    df.loc[no_rooms, ["Bedrooms", "Bathrooms"]] = "N/A"
+    no_price = rng.random(n_rows) < 0.003
+    df.loc[no_price, ["Price", "Area"]] = "N/A"
+    df.loc[no_price, "Price/m²"] = ""
+    return df
+
+
+def write_synthetic_csv(n_rows: int, path: str, chunk_rows: int = 500_000, seed: int = 0) -> str:
+    """
+    Write `n_rows` synthetic raw listings to a CSV, one chunk at a time.
+    """
+    for start in range(0, n_rows, chunk_rows):
+        chunk = synthetic_raw_listings(min(chunk_rows, n_rows - start), seed=seed + start, start_id=start)
+        chunk.to_csv(path, mode="a" if start else "w", header=start == 0, index=False)
+    return path
+
+
+def _run_stage(record, n_rows: int, stage: str, fn, *args, **kwargs):
+    """
+    Run one stage and `record` its wall time and peak RSS; errors are recorded, not raised.
+    """
+    gc.collect()
+    reset_peak_rss()
+    start = time.perf_counter()
+    try:
+        value, error = fn(*args, **kwargs), ""
+    except Exception as e:
+        value, error = None, f"{type(e).__name__}: {e}".splitlines()[0]
+    row = {"rows": n_rows, "stage": stage, "seconds": time.perf_counter() - start,
+           "peak_rss_mb": peak_rss_mb(), "error": error}
+    record(row)
+    print(f"[BENCH] {n_rows} rows, {stage}: {row['seconds']:.2f}s {error}")
+    return value
+
+
+def benchmark_pipeline_scale(n_rows: int, stages: list = None, encoder: str = "stub", log_path: str = None) -> list:
+    """
+    Time and peak RSS of each pipeline stage on `n_rows` synthetic raw listings, in this
+    process. `encoder` is an sbert_backends backend; "stub" skips the model.
+    Stages whose input failed are reported as skipped. Each result is also appended to
+    `log_path` as a JSON line as soon as its stage ends, so a killed run keeps what it measured.
+    """
+    from clustering import reduce_features, run_clustering
+    from EDA import run_eda
+    from embedding_cache import EmbeddingCache
+    from model import run_models
+    from nlp_features import EMBEDDING_DIM, MODEL_NAME, build_nlp_features
+
+    stages = stages or PIPELINE_STAGES
+    folder = tempfile.mkdtemp(prefix="aqarmap_pipeline_")
+    path = os.path.join(folder, "listings.csv")
+    results = []
+
+    def record(row: dict):
+        results.append(row)
+        if log_path:
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row) + "\n")
+
+    def clustering(features):
+        reduction = reduce_features(features, n_components=50)
+        return run_clustering(features, reduction=reduction)
+
+    try:
+        _run_stage(record, n_rows, "generate", write_synthetic_csv, n_rows, path)
+        df = _run_stage(record, n_rows, "preprocess", preprocess, path)
+        cache = EmbeddingCache(MODEL_NAME, dim=EMBEDDING_DIM, directory=os.path.join(folder, "embeddings"))
+        features = None
+        if df is not None and ("nlp" in stages or "models" in stages or "clustering" in stages):
+            features = _run_stage(record, n_rows, "nlp", build_nlp_features, df, cache, backend=encoder)
+        inputs = {"eda": df, "models": features, "clustering": features}
+        for stage, fn in [("eda", run_eda), ("models", partial(run_models, target="Price")),
+                          ("clustering", clustering)]:
+            if stage not in stages:
+                continue
+            if inputs[stage] is None:
+                record({"rows": n_rows, "stage": stage, "seconds": float("nan"),
+                        "peak_rss_mb": float("nan"), "error": "skipped: no input"})
+                continue
+            _run_stage(record, n_rows, stage, fn, inputs[stage])
+    finally:
+        for root, dirs, files in os.walk(folder, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+            for name in dirs:
+                os.rmdir(os.path.join(root, name))
+        os.rmdir(folder)
+    return results
+
+
+def benchmark_pipeline(scales: list = None, stages: list = None, encoder: str = "stub") -> dict:
+    """
+    Run benchmark_pipeline_scale for each scale in a fresh interpreter, so peak memory of
+    one scale does not carry into the next and an out-of-memory kill ends only that scale.
+    Returns a JSON-ready report with the commit and machine it ran on.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for n_rows in scales or PIPELINE_SCALES:
+        fd, part = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        try:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "pipeline", "--in-process",
+                                   "--rows", str(n_rows), "--encoder", encoder, "--json", part,
+                                   "--stages", *(stages or PIPELINE_STAGES)], cwd=here)
+            with open(part, encoding="utf-8") as f:
+                results.extend(json.loads(line) for line in f if line.strip())
+            if proc.returncode != 0:
+                results.append({"rows": n_rows, "stage": "process", "seconds": float("nan"),
+                                "peak_rss_mb": float("nan"), "error": f"exit code {proc.returncode}"})
+        finally:
+            os.remove(part)
+    return pipeline_report(results, encoder)
+
+
+def pipeline_report(results: list, encoder: str) -> dict:
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    return {
+        "commit": commit or None,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "encoder": encoder,
+        "results": results,
+    }
+
+
+def compare_pipeline_reports(baseline: dict, current: dict) -> list:
+    """
+    Per (rows, stage) time and peak-memory ratios of `current` against `baseline`.
+    """
+    before = {(row["rows"], row["stage"]): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        old = before.get((row["rows"], row["stage"]))
+        if old is None:
+            continue
+        rows.append({"rows": row["rows"], "stage": row["stage"],
+                     "seconds": row["seconds"], "time_ratio": row["seconds"] / old["seconds"] if old["seconds"] else float("nan"),
+                     "peak_rss_mb": row["peak_rss_mb"],
+                     "memory_ratio": row["peak_rss_mb"] / old["peak_rss_mb"] if old["peak_rss_mb"] else float("nan")})
+    return rows
+
+
+def benchmark_incremental(base_rows: int = 40_000, delta_rows: int = 2_000, days: int = 5) -> list:
+    """
+    Daily model updates on synthetic listings: a full fit on `base_rows`, then `days`
+    incremental updates of `delta_rows` each, against a full refit of the same data.
+    Reports seconds and holdout MAE per model for both paths.
+    """
+    from incremental import update_models
+
+    folder = tempfile.mkdtemp(prefix="aqarmap_incremental_")
+    try:
+        path = write_synthetic_csv(base_rows + days * delta_rows, os.path.join(folder, "listings.csv"))
+        df = preprocess(path, dedup=False)
+        registries = {mode: os.path.join(folder, mode) for mode in ["incremental", "full"]}
+        results = []
+        for day in range(days + 1):
+            rows = df.iloc[:base_rows + day * delta_rows]
+            for mode, registry_dir in registries.items():
+                start = time.perf_counter()
+                # A full refit every update is the same call with full_refit_every=1
+                fitted, _ = update_models(rows, "Price", registry_dir=registry_dir,
+                                          full_refit_every=1 if mode == "full" else days + 1)
+                row = {"day": day, "rows": len(rows), "mode": mode, "seconds": time.perf_counter() - start,
+                       "update": ",".join(sorted({metrics["Update"] for _, metrics in fitted}))}
+                row.update({f"MAE {metrics['Model']}": metrics["MAE"] for _, metrics in fitted})
+                results.append(row)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def benchmark_models(n_rows: int = 0, n_splits: int = 5, n_jobs: int = None) -> list:
+    """
+    Wall time of k-fold cross-validation with the (model, fold) fits run one at a time
+    against the process pool, with the mean and spread of each model's fold MAE.
+    n_rows=0 uses the saved listings, otherwise synthetic ones.
+    """
+    from joblib import cpu_count
+
+    from model import cross_validate_models
+
+    folder = None
+    if n_rows:
+        folder = tempfile.mkdtemp(prefix="aqarmap_models_")
+        df = preprocess(write_synthetic_csv(n_rows, os.path.join(folder, "listings.csv")), dedup=False)
+    else:
+        df = preprocess(DATA_PATH)
+    try:
+        results = []
+        for jobs in sorted({1, n_jobs or cpu_count()}):
+            start = time.perf_counter()
+            folds = cross_validate_models(df, "Price", n_splits=n_splits, n_jobs=jobs)
+            row = {"rows": len(df), "folds": n_splits, "jobs": jobs, "seconds": time.perf_counter() - start}
+            for name, scores in folds.groupby("Model", sort=False)["MAE"]:
+                row[f"MAE {name}"] = scores.mean()
+                row[f"MAE sd {name}"] = scores.std()
+            results.append(row)
+    finally:
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def _print_table(rows: list):
+    if not rows:
+        print("[BENCH] Nothing to report.")
+        return
+    keys = list(rows[0])
+    print(" | ".join(keys))
+    for row in rows:
+        print(" | ".join(f"{row[k]:.4g}" if isinstance(row[k], float) else str(row[k]) for k in keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aqarmap pipeline micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_parsers = sub.add_parser("parsers", help="HTML parser backends over saved pages")
+    p_parsers.add_argument("folder", nargs="?", default="tests/fixtures",
+                           help="Folder of saved Aqarmap result pages (*.html)")
+    p_parsers.add_argument("--repeat", type=int, default=3)
+
+    p_pre = sub.add_parser("preprocess", help="Vectorized vs legacy preprocessing on tiled data")
+    p_pre.add_argument("--scale", type=int, default=1000, help="Copies of the saved CSV to stack")
+
+    p_imp = sub.add_parser("imports", help="Import-time profile of the dashboard modules")
+    p_imp.add_argument("modules", nargs="*", help="Modules to profile (default: all app modules)")
+
+    p_pred = sub.add_parser("predict", help="Single-row latency and batch throughput of the prediction API")
+    p_pred.add_argument("--single", type=int, default=1000, help="Number of single-listing calls")
+    p_pred.add_argument("--batch", type=int, default=10_000, help="Rows in the batch call")
+    p_pred.add_argument("--registry", default=None, help="Registry to load (default: train a temporary one)")
+
+    p_clu = sub.add_parser("clustering", help="Exact vs scalable k selection for KMeans")
+    p_clu.add_argument("--k-max", type=int, default=10)
+    p_clu.add_argument("--synthetic-rows", type=int, default=0, help="Use Gaussian blobs instead of saved data")
+
+    p_sim = sub.add_parser("similar", help="Recall/latency of the similar-listings index vs exact search")
+    p_sim.add_argument("--rows", type=int, default=100_000)
+    p_sim.add_argument("--queries", type=int, default=200)
+
+    p_dup = sub.add_parser("dedup", help="Duplicate detection throughput on synthetic listings")
+    p_dup.add_argument("--rows", type=int, default=1_000_000)
+
+    p_eda = sub.add_parser("eda", help="EDA figure build/render time on resampled listings")
+    p_eda.add_argument("--rows", type=int, default=1_000_000)
+
+    p_chunk = sub.add_parser("chunked", help="Peak memory of in-memory vs chunked preprocessing on tiled data")
+    p_chunk.add_argument("--scale", type=int, default=1000, help="Copies of the saved CSV to stack")
+    p_chunk.add_argument("--chunk-rows", type=int, default=100_000)
+
+    p_sbert = sub.add_parser("sbert", help="Throughput and fp32 agreement of the SBERT encoding backends")
+    p_sbert.add_argument("--texts", type=int, default=20_000)
+    p_sbert.add_argument("--workers", type=int, default=1, help="Encoding processes per backend")
+    p_sbert.add_argument("backends", nargs="*", help="Backends to compare (default: all)")
+
+    p_pipe = sub.add_parser("pipeline", help="Per-stage time and memory of the pipeline on synthetic raw listings")
+    p_pipe.add_argument("--rows", type=int, nargs="+", default=PIPELINE_SCALES)
+    p_pipe.add_argument("--stages", nargs="+", default=PIPELINE_STAGES, choices=PIPELINE_STAGES)
+    p_pipe.add_argument("--encoder", default="stub", help="SBERT backend, or 'stub' for hashed vectors")
+    p_pipe.add_argument("--json", default=None, help="Write the report to this JSON file")
+    p_pipe.add_argument("--compare", default=None, help="Baseline JSON report to compare against")
+    p_pipe.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+
+    p_inc = sub.add_parser("incremental", help="Incremental vs full model updates over synthetic daily deltas")
+    p_inc.add_argument("--base", type=int, default=40_000)
+    p_inc.add_argument("--delta", type=int, default=2_000)
+    p_inc.add_argument("--days", type=int, default=5)
+
+    p_models = sub.add_parser("models", help="Sequential vs process-pool k-fold cross-validation of the models")
+    p_models.add_argument("--folds", type=int, default=5)
+    p_models.add_argument("--rows", type=int, default=0, help="Synthetic rows (default: the saved listings)")
+    p_models.add_argument("--jobs", type=int, default=None, help="Pool size (default: all cores)")
+
+    args = parser.parse_args()
+
+    if args.command == "parsers":
+        pages = load_saved_pages(args.folder)
+        print(f"[BENCH] Parsing {len(pages)} saved pages...")
+        _print_table(benchmark_parsers(pages, repeat=args.repeat))
+    elif args.command == "preprocess":
+        print(f"[BENCH] Preprocessing {args.scale}x the saved listings...")
+        _print_table(benchmark_preprocess(scale=args.scale))
+    elif args.command == "imports":
+        _print_table(profile_imports(args.modules))
+    elif args.command == "predict":
+        _print_table(benchmark_prediction(args.single, args.batch, args.registry))
+    elif args.command == "clustering":
+        _print_table(benchmark_clustering(k_max=args.k_max, synthetic_rows=args.synthetic_rows))
+    elif args.command == "similar":
+        _print_table(benchmark_similar(args.rows, n_queries=args.queries))
+    elif args.command == "dedup":
+        _print_table(benchmark_dedup(args.rows))
+    elif args.command == "eda":
+        _print_table(benchmark_eda(args.rows))
+    elif args.command == "chunked":
+        print(f"[BENCH] Preprocessing {args.scale}x the saved listings in memory and in chunks...")
+        _print_table(benchmark_chunked(args.scale, args.chunk_rows))
+    elif args.command == "sbert":
+        print(f"[BENCH] Encoding {args.texts} texts per backend...")
+        _print_table(benchmark_sbert(args.texts, args.backends or None, args.workers))
+    elif args.command == "incremental":
+        _print_table(benchmark_incremental(args.base, args.delta, args.days))
+    elif args.command == "models":
+        print(f"[BENCH] {args.folds}-fold cross-validation of the price models...")
+        _print_table(benchmark_models(args.rows, args.folds, args.jobs))
+    elif args.command == "pipeline":
+        if args.in_process:
+            # Child of benchmark_pipeline: results stream to the --json file as JSON lines
+            for n_rows in args.rows:
+                benchmark_pipeline_scale(n_rows, args.stages, args.encoder, log_path=args.json)
+            return
+        report = benchmark_pipeline(args.rows, args.stages, args.encoder)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        _print_table(report["results"])
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                _print_table(compare_pipeline_reports(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
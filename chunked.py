@@ -0,0 +1,203 @@
+# chunked.py
+
+"""
+Out-of-core preprocessing for listing files too large for memory.
+
+Usage:
+    python chunked.py --data data/aqarmap_listings.csv --chunk-rows 100000
+    python chunked.py --no-embed --out data/clean_only.parquet
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from preprocessing import NA_VALUES, ROOM_COLUMNS, clean_columns, fill_missing_values
+from sbert_backends import DEFAULT_BACKEND, available_backends
+from storage import CLEAN_SCHEMA, _ensure_parent
+
+CHUNKED_PATH = "data/aqarmap_listings_chunked.parquet"
+
+CHUNK_ROWS = 100_000
+
+# Text columns keep counts for at most this many distinct values between prunes
+MAX_TRACKED_VALUES = 100_000
+
+# Cleaned columns of a chunked run; dedup needs the whole dataset, so there is no 'Duplicate Group'
+CHUNK_SCHEMA = pa.schema([field for field in CLEAN_SCHEMA if field.name != "Duplicate Group"])
+
+EMBEDDING_GROUPS = [("Location", "loc_emb"), ("Title", "title_emb")]
+
+# Read as strings even when a chunk holds none of them, which would otherwise give float64 columns
+TEXT_COLUMNS = {"Title": str, "Location": str, "Image URL": str, "Listing URL": str}
+
+
+def read_raw_chunks(filepath: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Yield cleaned (not yet filled) chunks of the raw listings CSV.
+    """
+    reader = pd.read_csv(filepath, encoding="utf-8-sig", na_values=NA_VALUES, chunksize=chunk_rows,
+                         dtype=TEXT_COLUMNS)
+    for chunk in reader:
+        chunk = chunk[[name for name in CHUNK_SCHEMA.names if name in chunk.columns]]
+        yield clean_columns(chunk)
+
+
+class FillStatistics:
+    """
+    Running totals for the fill values of fill_missing_values: sum/count per numeric
+    column and value counts per text column. Text counts are pruned back to the
+    MAX_TRACKED_VALUES most frequent, so the mode of a column with more distinct
+    values than that (the URLs) is approximate; for those almost every value is unique anyway.
+    """
+
+    def __init__(self, max_tracked: int = MAX_TRACKED_VALUES):
+        self.max_tracked = max_tracked
+        self.sums = {}
+        self.counts = {}
+        self.values = {}
+
+    def update(self, chunk: pd.DataFrame):
+        for col in chunk.columns:
+            if pd.api.types.is_numeric_dtype(chunk[col]):
+                values = chunk[col].to_numpy(dtype=np.float64)
+                found = ~np.isnan(values)
+                self.sums[col] = self.sums.get(col, 0.0) + values[found].sum()
+                self.counts[col] = self.counts.get(col, 0) + int(found.sum())
+            else:
+                counts = chunk[col].value_counts()
+                if col in self.values:
+                    counts = self.values[col].add(counts, fill_value=0)
+                if len(counts) > 2 * self.max_tracked:
+                    counts = counts.nlargest(self.max_tracked)
+                self.values[col] = counts
+
+    def fills(self) -> dict:
+        fills = {}
+        for col, total in self.sums.items():
+            if self.counts[col]:
+                mean = total / self.counts[col]
+                fills[col] = math.ceil(mean) if col in ROOM_COLUMNS else mean
+        for col, counts in self.values.items():
+            if len(counts):
+                # Ties resolve to the smallest value, as Series.mode() does
+                top = counts[counts == counts.max()]
+                fills[col] = sorted(top.index)[0]
+        return fills
+
+
+def compute_fill_values(filepath: str, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """
+    First pass: the whole-dataset mean / mode fill value of every column.
+    """
+    stats = FillStatistics()
+    for chunk in read_raw_chunks(filepath, chunk_rows):
+        stats.update(chunk)
+    return stats.fills()
+
+
+def _embedding_columns(chunk: pd.DataFrame, cache, backend: str) -> dict:
+    # Title and Location go through one encode call, so texts shared by both are encoded once
+    from nlp_features import embed_texts
+
+    texts = pd.concat([chunk[column] for column, _ in EMBEDDING_GROUPS], ignore_index=True)
+    embeddings = embed_texts(texts, cache, backend).astype(np.float32, copy=False)
+    columns = {}
+    for i, (_, name) in enumerate(EMBEDDING_GROUPS):
+        block = np.ascontiguousarray(embeddings[i * len(chunk):(i + 1) * len(chunk)])
+        columns[name] = pa.FixedSizeListArray.from_arrays(pa.array(block.ravel()), block.shape[1])
+    return columns
+
+
+def run_chunked(filepath: str, output_path: str = CHUNKED_PATH, chunk_rows: int = CHUNK_ROWS,
+                embed: bool = True, cache=None, backend: str = DEFAULT_BACKEND) -> str:
+    """
+    Out-of-core preprocessing: stream the raw CSV in `chunk_rows` batches through cleaning,
+    filling with whole-dataset statistics from a first pass, and (with `embed`) SBERT
+    encoding of Title and Location with an sbert_backends `backend`. Each chunk is
+    appended to one Parquet file as a row group, so peak memory follows the chunk size
+    rather than the dataset size.
+    Unlike preprocess, no deduplication is done.
+    """
+    fills = compute_fill_values(filepath, chunk_rows)
+    print(f"[INFO] Computed fill values for {len(fills)} columns.")
+
+    if embed and cache is None:
+        from nlp_features import get_embedding_cache
+        cache = get_embedding_cache(backend)
+
+    _ensure_parent(output_path)
+    tmp_path = output_path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for chunk in read_raw_chunks(filepath, chunk_rows):
+            chunk = fill_missing_values(chunk, fills)
+            schema = pa.schema([field for field in CHUNK_SCHEMA if field.name in chunk.columns])
+            table = pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False)
+            if embed:
+                for name, column in _embedding_columns(chunk, cache, backend).items():
+                    table = table.append_column(name, column)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+            writer.write_table(table)
+            rows += len(chunk)
+            print(f"[INFO] Wrote {rows} rows.")
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        print(f"[ERROR] No rows read from {filepath}")
+        return None
+    os.replace(tmp_path, output_path)
+    print(f"[INFO] Chunked preprocessing complete: {rows} rows in {output_path}.")
+    return output_path
+
+
+def iter_chunked(path: str = CHUNKED_PATH, columns: list = None, batch_rows: int = CHUNK_ROWS):
+    """
+    Yield the chunked output back as DataFrames of at most `batch_rows` rows.
+    """
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def load_chunked_features(path: str = CHUNKED_PATH, columns: list = None):
+    """
+    Load the chunked output as a FeatureStore, with the stored embeddings as
+    loc_emb / title_emb groups (no copy through a wide DataFrame).
+    """
+    from feature_store import FeatureStore
+
+    table = pq.read_table(path, columns=columns)
+    groups = [name for _, name in EMBEDDING_GROUPS if name in table.column_names]
+    store = FeatureStore(table.drop_columns(groups).to_pandas())
+    for name in groups:
+        column = table.column(name).combine_chunks()
+        dim = column.type.list_size
+        matrix = column.flatten().to_numpy().reshape(-1, dim)
+        store.add_group(name, matrix, [f"{name}_{i}" for i in range(dim)])
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked preprocessing and SBERT encoding of a large listings CSV")
+    parser.add_argument("--data", default="data/aqarmap_listings.csv")
+    parser.add_argument("--out", default=CHUNKED_PATH, help="Parquet file with one row group per chunk")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--no-embed", action="store_true", help="Only clean and fill; skip the SBERT columns")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=available_backends())
+    args = parser.parse_args()
+
+    output = run_chunked(args.data, args.out, args.chunk_rows, embed=not args.no_embed, backend=args.backend)
+    raise SystemExit(0 if output else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,92 @@
+import hashlib
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-from sklearn.decomposition import PCA
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score
+from sklearn.decomposition import PCA, IncrementalPCA, TruncatedSVD
+from scipy import sparse
 import matplotlib.pyplot as plt
+from feature_store import FeatureStore
+from instrumentation import instrument
 
+# Above this many rows run_clustering switches to the scalable MiniBatchKMeans sweep
+SCALABLE_MIN_ROWS = 20_000
 
+CRITERIA = ["silhouette", "calinski_harabasz", "elbow"]
+
+# Dense inputs this large are reduced with IncrementalPCA in batches instead of one randomized PCA
+INCREMENTAL_PCA_MIN_ROWS = 200_000
+
+
+class Reduction:
+    """
+    A fitted projection (`model`) and the reduced feature matrix (`embedding`, float32,
+    components ordered by explained variance). Clustering and plotting share one instance.
+    """
+
+    def __init__(self, model, embedding: np.ndarray, groups: list = None):
+        self.model = model
+        self.embedding = embedding
+        self.groups = groups
+
+    @property
+    def explained_variance(self) -> float:
+        return float(self.model.explained_variance_ratio_.sum())
+
+    @property
+    def method(self) -> str:
+        return _method(self.model)
+
+    def content_hash(self) -> str:
+        """
+        Content hash used by stage_cache to key stages that consume this reduction.
+        """
+        digest = hashlib.blake2b(np.ascontiguousarray(self.embedding).tobytes(), digest_size=16)
+        digest.update(type(self.model).__name__.encode("utf-8"))
+        return digest.hexdigest()
+
+
+def _method(model) -> str:
+    # IncrementalPCA computes the same centred projection as PCA
+    return "TruncatedSVD" if isinstance(model, TruncatedSVD) else "PCA"
+
+
+@instrument()
+def reduce_features(features, groups: list = None, n_components: int = 50, batch_size: int = 10_000,
+                    random_state: int = 42) -> Reduction:
+    """
+    Project features onto their top `n_components` directions: TruncatedSVD for sparse
+    input, randomized PCA for dense input (IncrementalPCA above INCREMENTAL_PCA_MIN_ROWS).
+    Accepts a FeatureStore (with explicit `groups`), a DataFrame or a matrix.
+    Store groups stay sparse only when every selected group is sparse. Next to a dense
+    embedding block the narrow TF-IDF groups are densified, so the whole selection gets a
+    centred PCA instead of an uncentred SVD over dense data stored as CSR.
+    """
+    if isinstance(features, FeatureStore):
+        selected = list(features.groups) if groups is None else groups
+        features = features.matrix(groups, dense=any(not features.groups[name].is_sparse for name in selected))
+    elif isinstance(features, pd.DataFrame):
+        features = features.to_numpy(dtype=np.float32)
+
+    n_rows, n_cols = features.shape
+    n_components = max(2, min(n_components, n_cols - 1, n_rows - 1))
+    if sparse.issparse(features):
+        model = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=random_state)
+    elif n_rows >= INCREMENTAL_PCA_MIN_ROWS:
+        model = IncrementalPCA(n_components=n_components, batch_size=max(batch_size, n_components))
+    else:
+        model = PCA(n_components=n_components, svd_solver="randomized", random_state=random_state)
+
+    print(f"[CLUSTER] Reducing {n_rows}x{n_cols} features to {n_components} components "
+          f"with {type(model).__name__}...")
+    embedding = model.fit_transform(features).astype(np.float32, copy=False)
+    reduction = Reduction(model, embedding, groups)
+    print(f"[CLUSTER] Kept {reduction.explained_variance:.1%} of the variance.")
+    return reduction
+
+
+@instrument()
 def optimal_kmeans(df: pd.DataFrame, n_min=2, n_max=10):
     """
     Automatically determine the optimal number of clusters using silhouette score.
@@ -28,38 +109,148 @@ def optimal_kmeans(df: pd.DataFrame, n_min=2, n_max=10):
     return best_model, best_k, best_score
 
 
-def run_clustering(df: pd.DataFrame, nlp_cols: list, k_min: int = 2, k_max: int = 5):
+def _elbow_index(inertias: list) -> int:
     """
-    Run clustering on the given DataFrame using NLP columns.
-    Returns the updated DataFrame with 'Cluster', the model, and cluster stats.
+    Index of the point furthest below the straight line joining the first and last inertia.
+    """
+    if len(inertias) < 3:
+        return int(np.argmin(inertias))
+    y = np.asarray(inertias, dtype=float)
+    x = np.arange(len(y), dtype=float)
+    line = y[0] + (y[-1] - y[0]) * x / x[-1]
+    return int(np.argmax(line - y))
+
+
+def _fit_minibatch(X, k, sample_idx, batch_size, random_state):
+    model = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=3, random_state=random_state)
+    labels = model.fit_predict(X)
+
+    sample = X[sample_idx]
+    sample_labels = labels[sample_idx]
+    if len(np.unique(sample_labels)) < 2:
+        silhouette = calinski = np.nan
+    else:
+        silhouette = silhouette_score(sample, sample_labels)
+        dense_sample = sample.toarray() if sparse.issparse(sample) else sample
+        calinski = calinski_harabasz_score(dense_sample, sample_labels)
+    return model, {"k": k, "silhouette": silhouette, "calinski_harabasz": calinski, "inertia": model.inertia_}
+
+
+@instrument()
+def scalable_kmeans(X, n_min=2, n_max=10, criterion="silhouette", sample_size=5_000,
+                    batch_size=4_096, n_jobs=None, random_state=42):
+    """
+    Near-linear k selection: MiniBatchKMeans for each k (swept in parallel threads),
+    scored with silhouette and Calinski–Harabasz on one shared random sample of rows,
+    plus the inertia elbow. Returns (best_model, best_k, best_score, scores DataFrame).
     """
-    if not nlp_cols or not all(col in df.columns for col in nlp_cols):
-        raise ValueError("⚠️ NLP features not found. Please run the modeling step first.")
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion '{criterion}'. Choose one of: {', '.join(CRITERIA)}")
+    if isinstance(X, pd.DataFrame):
+        X = X.to_numpy(dtype=np.float32)
+
+    rng = np.random.default_rng(random_state)
+    n = X.shape[0]
+    sample_idx = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+
+    fits = Parallel(n_jobs=n_jobs or -1, prefer="threads")(
+        delayed(_fit_minibatch)(X, k, sample_idx, batch_size, random_state) for k in range(n_min, n_max + 1)
+    )
+    models = [model for model, _ in fits]
+    scores = pd.DataFrame([row for _, row in fits])
 
-    features = df[nlp_cols]
+    if criterion == "elbow":
+        best_index = _elbow_index(scores["inertia"].tolist())
+    else:
+        best_index = int(scores[criterion].fillna(-np.inf).to_numpy().argmax())
+    best_k = int(scores.loc[best_index, "k"])
+    # Report the (sampled) silhouette regardless of criterion so results stay comparable
+    return models[best_index], best_k, float(scores.loc[best_index, "silhouette"]), scores
 
-    if features.empty:
+
+@instrument()
+def run_clustering(df, nlp_cols: list = None, k_min: int = 2, k_max: int = 5, groups: list = None,
+                   scalable: bool = None, criterion: str = "silhouette", reduction: Reduction = None):
+    """
+    Run clustering on the given DataFrame using NLP columns, or on a FeatureStore
+    using its named feature groups (kept sparse/float32, never densified).
+    Pass a `reduction` from reduce_features to cluster in the reduced space instead.
+    With scalable=None, inputs above SCALABLE_MIN_ROWS use scalable_kmeans.
+    Returns the updated DataFrame with 'Cluster', the model, and cluster stats.
+    """
+    if reduction is not None:
+        features = reduction.embedding
+        if isinstance(df, FeatureStore):
+            df = df.frame
+    elif isinstance(df, FeatureStore):
+        try:
+            features = df.matrix(groups)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"⚠️ NLP features not found: {e}")
+        df = df.frame
+    else:
+        if not nlp_cols or not all(col in df.columns for col in nlp_cols):
+            raise ValueError("⚠️ NLP features not found. Please run the modeling step first.")
+        features = df[nlp_cols]
+
+    if features.shape[0] == 0 or features.shape[1] == 0:
         raise ValueError("❌ Provided NLP features are empty or invalid.")
 
-    model, best_k, best_score = optimal_kmeans(features, n_min=k_min, n_max=k_max)
+    if scalable is None:
+        scalable = features.shape[0] >= SCALABLE_MIN_ROWS
+    if scalable:
+        model, best_k, best_score, _ = scalable_kmeans(features, n_min=k_min, n_max=k_max, criterion=criterion)
+    else:
+        model, best_k, best_score = optimal_kmeans(features, n_min=k_min, n_max=k_max)
 
     df = df.copy()
     df["Cluster"] = model.predict(features)
     return df, model, best_k, best_score
 
 
-def plot_clusters(df: pd.DataFrame, nlp_cols: list):
+@instrument()
+def plot_clusters(df: pd.DataFrame, nlp_cols: list = None, features=None, reduction: Reduction = None):
     """
-    Create a 2D PCA visualization of the clusters.
+    Create a 2D visualization of the clusters, labelled with the projection used.
+    Pass the `reduction` used for clustering to plot its first two components without
+    refitting, or `features` (e.g. FeatureStore.matrix(groups)) instead of `nlp_cols`
+    to plot from a feature matrix; sparse input is projected with TruncatedSVD.
     """
-    pca = PCA(n_components=2)
-    reduced = pca.fit_transform(df[nlp_cols])
+    if reduction is not None:
+        reduced = reduction.embedding[:, :2]
+        method = reduction.method
+    else:
+        if features is None:
+            features = df[nlp_cols]
+        reducer = TruncatedSVD(n_components=2, random_state=42) if sparse.issparse(features) else PCA(n_components=2)
+        reduced = reducer.fit_transform(features)
+        method = _method(reducer)
 
+    prefix = "SVD" if method == "TruncatedSVD" else "PC"
     fig, ax = plt.subplots(figsize=(8, 6))
     scatter = ax.scatter(reduced[:, 0], reduced[:, 1], c=df["Cluster"], cmap="tab10", alpha=0.7)
-    ax.set_title("Cluster Visualization (PCA)")
-    ax.set_xlabel("PC1")
-    ax.set_ylabel("PC2")
+    ax.set_title(f"Cluster Visualization ({method})")
+    ax.set_xlabel(f"{prefix}1")
+    ax.set_ylabel(f"{prefix}2")
     fig.colorbar(scatter, ax=ax, label="Cluster")
     fig.tight_layout()
     return fig
+
+
+@instrument()
+def cluster_listings(features: FeatureStore, groups: list = None, n_components: int = 50) -> dict:
+    """
+    Reduce, cluster and plot a FeatureStore in one step: the result the dashboard shows.
+    Returns a dict with the clustered frame, best k, silhouette score, figure and reduction summary.
+    """
+    reduction = reduce_features(features, groups=groups, n_components=n_components)
+    clustered_df, _, best_k, best_score = run_clustering(features, reduction=reduction)
+    return {
+        "clustered": clustered_df,
+        "best_k": best_k,
+        "score": best_score,
+        "figure": plot_clusters(clustered_df, reduction=reduction),
+        "components": reduction.embedding.shape[1],
+        "method": reduction.method,
+        "explained_variance": reduction.explained_variance,
+    }
@@ -0,0 +1,203 @@
+# dedup.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from instrumentation import instrument
+
+# Rows with identical normalized values in all of these are exact duplicates
+KEY_COLUMNS = ["Title", "Price", "Location", "Area", "Bedrooms", "Bathrooms"]
+
+NUM_PERM = 32
+BANDS = 8  # 8 bands of 4 rows: pairs with Jaccard ~0.6+ usually share a bucket
+
+# A bucketed pair is a near duplicate only if it also passes these checks
+MIN_JACCARD = 0.7
+PRICE_TOLERANCE = 0.02
+AREA_TOLERANCE = 0.02
+
+# Rows in a band bucket are compared with this many neighbours in (Bedrooms, Area, Price) order
+NEIGHBOURS = 3
+
+_PERM_SEEDS = np.random.default_rng(1).integers(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64)
+_EMPTY = np.uint64(np.iinfo(np.uint64).max)
+
+
+def normalize_text(series: pd.Series) -> pd.Series:
+    """
+    Lowercase, drop punctuation and collapse whitespace (per distinct value).
+    """
+    uniques = pd.Series(series.dropna().unique(), dtype="string[pyarrow]")
+    cleaned = (uniques.str.lower()
+               .str.replace(r"[^\w\s]+", " ", regex=True)
+               .str.replace(r"\s+", " ", regex=True)
+               .str.strip())
+    return series.map(dict(zip(uniques.tolist(), cleaned.tolist())))
+
+
+def normalize_image_url(series: pd.Series) -> pd.Series:
+    """
+    Image file name without directory or extension, so thumbnail and full-size URLs match.
+    """
+    urls = series.astype("string[pyarrow]").str.lower()
+    name = urls.str.replace(r"[?#].*$", "", regex=True).str.replace(r"^.*/", "", regex=True)
+    return name.str.replace(r"\.[a-z0-9]+$", "", regex=True).astype(object)
+
+
+def _permuted(hashes: np.ndarray) -> np.ndarray:
+    # One splitmix64 finalizer per seed; uint64 arithmetic wraps, which the mix relies on
+    z = hashes[:, None] ^ _PERM_SEEDS
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _field_signatures(values: pd.Series, single_token: bool = False):
+    """
+    MinHash signature per distinct value of a field: (codes per row, signatures per unique).
+    Missing values get the empty signature, which never lowers a row's minimum.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    signatures = np.full((len(uniques) + 1, NUM_PERM), _EMPTY, dtype=np.uint64)
+    if len(uniques):
+        if single_token:
+            tokens = pd.Series(np.asarray(uniques, dtype=object))
+            owners = np.arange(len(uniques))
+        else:
+            exploded = pd.Series(np.asarray(uniques, dtype=object)).str.split().explode().dropna()
+            tokens, owners = exploded.reset_index(drop=True), exploded.index.to_numpy()
+        if len(tokens):
+            permuted = _permuted(pd.util.hash_array(tokens.to_numpy(dtype=object)))
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            signatures[owners[starts]] = np.minimum.reduceat(permuted, starts, axis=0)
+    # Missing values (code -1) index the trailing empty row
+    return np.where(codes < 0, len(uniques), codes), signatures
+
+
+def minhash_signatures(df: pd.DataFrame, chunk_size: int = 200_000) -> np.ndarray:
+    """
+    One uint32 MinHash signature per row over the tokens of Title, Location and the image
+    file name. Each field is hashed once per distinct value; a row's signature is the
+    elementwise minimum of its fields' signatures (the MinHash of the union).
+    """
+    fields = [
+        _field_signatures(normalize_text(df["Title"])),
+        _field_signatures(normalize_text(df["Location"])),
+        _field_signatures(normalize_image_url(df["Image URL"]), single_token=True),
+    ]
+    out = np.empty((len(df), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(df), chunk_size):
+        rows = slice(start, start + chunk_size)
+        combined = np.minimum.reduce([signatures[codes[rows]] for codes, signatures in fields])
+        out[rows] = combined.astype(np.uint32)  # low 32 bits of the minimum keep the collision odds
+    return out
+
+
+def _close(a: np.ndarray, b: np.ndarray, tolerance: float) -> np.ndarray:
+    both_missing = np.isnan(a) & np.isnan(b)
+    with np.errstate(invalid="ignore"):
+        return both_missing | (np.abs(a - b) <= tolerance * np.maximum(np.abs(a), np.abs(b)))
+
+
+def _bucket_pairs(keys: np.ndarray, sort_columns: tuple = (), window: int = 1):
+    """
+    Candidate pairs from rows sharing a bucket key. Rows are sorted by bucket, then by
+    `sort_columns`, and each row is paired with the `window` rows before it in the same
+    bucket (sorted neighbourhood), so even very large buckets cost linear time.
+    """
+    order = np.lexsort(tuple(reversed(sort_columns)) + (keys,)) if sort_columns else np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    left, right = [], []
+    for offset in range(1, window + 1):
+        same = sorted_keys[offset:] == sorted_keys[:-offset]
+        left.append(order[:-offset][same])
+        right.append(order[offset:][same])
+    return np.concatenate(left), np.concatenate(right)
+
+
+def _exact_keys(df: pd.DataFrame) -> np.ndarray:
+    normalized = pd.DataFrame({
+        col: df[col] if pd.api.types.is_numeric_dtype(df[col]) else normalize_text(df[col])
+        for col in KEY_COLUMNS
+    })
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+def _band_keys(signatures: np.ndarray, band: int) -> np.ndarray:
+    rows = NUM_PERM // BANDS
+    block = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+    key = np.full(len(signatures), band, dtype=np.uint64)
+    for column in block.T:
+        key = key * np.uint64(1_000_003) ^ column
+    return key
+
+
+def _verified(signatures, left, right, price, area, bedrooms, chunk_size: int = 200_000) -> np.ndarray:
+    keep = np.empty(len(left), dtype=bool)
+    for start in range(0, len(left), chunk_size):
+        l, r = left[start:start + chunk_size], right[start:start + chunk_size]
+        jaccard = (signatures[l] == signatures[r]).mean(axis=1)
+        keep[start:start + chunk_size] = ((jaccard >= MIN_JACCARD)
+                                          & _close(price[l], price[r], PRICE_TOLERANCE)
+                                          & _close(area[l], area[r], AREA_TOLERANCE)
+                                          & _close(bedrooms[l], bedrooms[r], 0))
+    return keep
+
+
+@instrument()
+def find_duplicate_groups(df: pd.DataFrame) -> np.ndarray:
+    """
+    Duplicate-group id per row (rows without duplicates get a group of their own).
+
+    Exact duplicates share a hash of their normalized KEY_COLUMNS. Near duplicates are
+    found with MinHash/LSH over Title, Location and image tokens: rows sharing a band
+    bucket are compared with their NEIGHBOURS nearest rows by (Bedrooms, Area, Price)
+    and linked if their estimated Jaccard similarity is at least MIN_JACCARD and
+    Price/Area/Bedrooms agree within tolerance. Groups are the connected components of
+    all links, so cost stays near-linear in rows.
+    """
+    n = len(df)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    left, right = [], []
+    exact_left, exact_right = _bucket_pairs(_exact_keys(df))
+    left.append(exact_left)
+    right.append(exact_right)
+
+    signatures = minhash_signatures(df)
+    price = df["Price"].to_numpy(dtype=np.float64)
+    area = df["Area"].to_numpy(dtype=np.float64)
+    bedrooms = df["Bedrooms"].to_numpy(dtype=np.float64)
+    for band in range(BANDS):
+        band_left, band_right = _bucket_pairs(_band_keys(signatures, band), (bedrooms, area, price), NEIGHBOURS)
+        keep = _verified(signatures, band_left, band_right, price, area, bedrooms)
+        left.append(band_left[keep])
+        right.append(band_right[keep])
+
+    left, right = np.concatenate(left), np.concatenate(right)
+    graph = sparse.coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n)).tocsr()
+    _, labels = connected_components(graph, directed=False)
+    return labels.astype(np.int64)
+
+
+def mark_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a 'Duplicate Group' column; rows in the same group are (near) duplicates.
+    """
+    groups = find_duplicate_groups(df)
+    df["Duplicate Group"] = groups
+    n_groups = len(np.unique(groups))
+    print(f"[INFO] Found {len(df) - n_groups} duplicate rows in {len(df)} ({n_groups} unique listings).")
+    return df
+
+
+def deduplicate(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deduped view: the first row of each duplicate group.
+    """
+    if "Duplicate Group" not in df.columns:
+        df = mark_duplicates(df)
+    return df[~df["Duplicate Group"].duplicated()].reset_index(drop=True)
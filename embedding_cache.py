@@ -0,0 +1,169 @@
+# embedding_cache.py
+
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = "data/embedding_cache"
+
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """
+    16-byte digest identifying a text string inside one model's cache.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """
+    Size-bounded on-disk cache of sentence embeddings for one model.
+
+    Vectors live in a memory-mapped float16/float32 matrix (vectors.bin); row keys and
+    last-use ticks live in keys.npy / ticks.npy, where a zero tick marks a free row.
+    When full, the least recently used rows are reused for new strings.
+    Safe across threads of one process only.
+    """
+
+    def __init__(self, model_name: str, dim: int, directory: str = EMBEDDING_CACHE_DIR,
+                 dtype: str = "float16", max_entries: int = 200_000):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(directory, slug)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        keys_path = os.path.join(self.path, "keys.npy")
+        if os.path.exists(keys_path) and self._meta_matches():
+            self.keys = np.load(keys_path)
+            self.ticks = np.load(os.path.join(self.path, "ticks.npy"))
+        else:
+            self.keys = np.zeros((0, KEY_BYTES), dtype=np.uint8)
+            self.ticks = np.zeros(0, dtype=np.int64)
+            self._write_meta()
+
+        self.capacity = len(self.keys)
+        self.vectors = self._open_vectors(self.capacity) if self.capacity else None
+        self.index = {self.keys[row].tobytes(): int(row) for row in np.flatnonzero(self.ticks > 0)}
+        self.tick = int(self.ticks.max()) if len(self.ticks) else 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, texts: list):
+        """
+        Return (vectors, missing) where missing lists the positions of texts not in the cache.
+        Rows for missing texts are left as zeros.
+        """
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock:
+            self.tick += 1
+            hit_rows, hit_pos = [], []
+            for pos, text in enumerate(texts):
+                row = self.index.get(text_key(text))
+                if row is None:
+                    missing.append(pos)
+                else:
+                    hit_rows.append(row)
+                    hit_pos.append(pos)
+            if hit_rows:
+                out[hit_pos] = self.vectors[hit_rows]
+                self.ticks[hit_rows] = self.tick
+        return out, missing
+
+    def store(self, texts: list, vectors: np.ndarray):
+        """
+        Add vectors for texts, evicting least recently used rows once the cache is full.
+        """
+        if not texts:
+            return
+        with self._lock:
+            self.tick += 1
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key not in self.index:
+                    new[key] = vector
+            if not new:
+                return
+            if len(new) > self.max_entries:
+                new = dict(list(new.items())[-self.max_entries:])
+            rows = self._allocate_rows(len(new))
+            for row, key in zip(rows, new):
+                if self.ticks[row] > 0:
+                    self.index.pop(self.keys[row].tobytes(), None)
+                self.keys[row] = np.frombuffer(key, dtype=np.uint8)
+                self.index[key] = int(row)
+            self.vectors[rows] = np.asarray(list(new.values()), dtype=self.dtype)
+            self.ticks[rows] = self.tick
+            self._flush()
+
+    def _allocate_rows(self, n: int) -> np.ndarray:
+        free = np.flatnonzero(self.ticks == 0)
+        if len(free) < n and self.capacity < self.max_entries:
+            self._grow(min(self.max_entries, max(2 * self.capacity, self.capacity + n, 1024)))
+            free = np.flatnonzero(self.ticks == 0)
+        if len(free) >= n:
+            return free[:n]
+
+        # Cache is at its size bound: reuse free slots first, then the least recently used rows
+        used = np.flatnonzero(self.ticks > 0)
+        n_evict = min(n - len(free), len(used))
+        evict = used[np.argsort(self.ticks[used], kind="stable")[:n_evict]]
+        rows = np.concatenate([free, evict])
+        if len(rows) < n:
+            raise ValueError(f"Cannot cache {n} vectors with max_entries={self.max_entries}.")
+        return rows
+
+    def _grow(self, capacity: int):
+        old = self.vectors
+        vectors_path = os.path.join(self.path, "vectors.bin")
+        tmp_path = vectors_path + ".tmp"
+        grown = np.memmap(tmp_path, dtype=self.dtype, mode="w+", shape=(capacity, self.dim))
+        if old is not None:
+            grown[:self.capacity] = old
+            del old
+        grown.flush()
+        del grown
+        os.replace(tmp_path, vectors_path)
+
+        self.keys = np.concatenate([self.keys, np.zeros((capacity - self.capacity, KEY_BYTES), dtype=np.uint8)])
+        self.ticks = np.concatenate([self.ticks, np.zeros(capacity - self.capacity, dtype=np.int64)])
+        self.capacity = capacity
+        self.vectors = self._open_vectors(capacity)
+
+    def _open_vectors(self, capacity: int) -> np.memmap:
+        return np.memmap(os.path.join(self.path, "vectors.bin"), dtype=self.dtype, mode="r+",
+                         shape=(capacity, self.dim))
+
+    def _flush(self):
+        self.vectors.flush()
+        for name, array in (("keys", self.keys), ("ticks", self.ticks)):
+            target = os.path.join(self.path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(target + ".tmp", target)
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.txt")
+
+    def _meta_matches(self) -> bool:
+        if not os.path.exists(self._meta_path()):
+            return False
+        with open(self._meta_path(), encoding="utf-8") as f:
+            return f.read().strip() == f"{self.dim} {self.dtype.name}"
+
+    def _write_meta(self):
+        for name in ("keys.npy", "ticks.npy", "vectors.bin"):
+            stale = os.path.join(self.path, name)
+            if os.path.exists(stale):
+                os.remove(stale)
+        with open(self._meta_path(), "w", encoding="utf-8") as f:
+            f.write(f"{self.dim} {self.dtype.name}")
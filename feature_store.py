@@ -0,0 +1,114 @@
+# feature_store.py
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class FeatureGroup:
+    """
+    One named block of features: a dense contiguous array or a CSR sparse matrix.
+    """
+
+    def __init__(self, matrix, columns: list):
+        if sparse.issparse(matrix):
+            matrix = matrix.tocsr()
+        else:
+            matrix = np.ascontiguousarray(matrix)
+        if matrix.shape[1] != len(columns):
+            raise ValueError(f"Feature group has {matrix.shape[1]} columns but {len(columns)} names.")
+        self.matrix = matrix
+        self.columns = list(columns)
+
+    @property
+    def is_sparse(self) -> bool:
+        return sparse.issparse(self.matrix)
+
+    @property
+    def nbytes(self) -> int:
+        if self.is_sparse:
+            return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+        return self.matrix.nbytes
+
+
+class FeatureStore:
+    """
+    Listing rows plus named feature groups kept in their compact native form
+    (CSR for TF-IDF, float32/float16 arrays for embeddings) instead of one wide DataFrame.
+    """
+
+    def __init__(self, frame: pd.DataFrame, groups: dict = None):
+        self.frame = frame.reset_index(drop=True)
+        self.groups = {}
+        for name, group in (groups or {}).items():
+            self.add_group(name, group.matrix, group.columns)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def add_group(self, name: str, matrix, columns: list):
+        if matrix.shape[0] != len(self.frame):
+            raise ValueError(f"Group '{name}' has {matrix.shape[0]} rows, expected {len(self.frame)}.")
+        self.groups[name] = FeatureGroup(matrix, columns)
+
+    def columns(self, groups: list = None) -> list:
+        names = []
+        for name in self._select(groups):
+            names.extend(self.groups[name].columns)
+        return names
+
+    def matrix(self, groups: list = None, dense: bool = False, dtype=np.float32):
+        """
+        Stack the selected groups column-wise. The result stays CSR when any group
+        is sparse, unless `dense` is requested.
+        """
+        blocks = [self.groups[name].matrix for name in self._select(groups)]
+        if not blocks:
+            raise ValueError("No feature groups selected.")
+        if any(sparse.issparse(block) for block in blocks) and not dense:
+            return sparse.hstack(blocks, format="csr", dtype=dtype)
+        if len(blocks) == 1:
+            block = blocks[0]
+            return block.toarray().astype(dtype, copy=False) if sparse.issparse(block) else block.astype(dtype, copy=False)
+        return np.hstack([block.toarray() if sparse.issparse(block) else block for block in blocks]).astype(dtype, copy=False)
+
+    def to_frame(self, groups: list = None) -> pd.DataFrame:
+        """
+        Dense DataFrame of the listing columns plus the selected groups (the old enrich_with_nlp layout).
+        """
+        parts = [self.frame]
+        for name in self._select(groups):
+            group = self.groups[name]
+            values = group.matrix.toarray() if group.is_sparse else group.matrix
+            parts.append(pd.DataFrame(values, columns=group.columns))
+        return pd.concat(parts, axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.frame.memory_usage(deep=True).sum()) + sum(g.nbytes for g in self.groups.values())
+
+    def content_hash(self) -> str:
+        """
+        Content hash used by stage_cache to key stages that consume this store.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(pd.util.hash_pandas_object(self.frame, index=True).to_numpy().tobytes())
+        for name, group in self.groups.items():
+            digest.update(name.encode("utf-8"))
+            digest.update("\x1f".join(group.columns).encode("utf-8"))
+            if group.is_sparse:
+                for part in (group.matrix.data, group.matrix.indices, group.matrix.indptr):
+                    digest.update(np.ascontiguousarray(part).tobytes())
+            else:
+                digest.update(group.matrix.tobytes())
+        return digest.hexdigest()
+
+    def _select(self, groups: list = None) -> list:
+        if groups is None:
+            return list(self.groups)
+        unknown = [name for name in groups if name not in self.groups]
+        if unknown:
+            raise KeyError(f"Unknown feature groups: {', '.join(unknown)}")
+        return list(groups)
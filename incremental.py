@@ -0,0 +1,224 @@
+# incremental.py
+
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from feature_store import FeatureStore
+from instrumentation import instrument, peak_rss_mb, reset_peak_rss
+from model import EARLY_STOPPING_ROUNDS, FEATURES, evaluate_model, feature_engineering, train_models
+from registry import REGISTRY_DIR, load_models, save_models
+
+# Rows whose hash falls in this percentage are never trained on; every version is scored on them
+HOLDOUT_PERCENT = 10
+
+# A full refit replaces incremental updates after this many of them
+FULL_REFIT_EVERY = 7
+
+# MAE on the last full refit's holdout rows this much worse than the refit's own MAE
+# on those rows triggers a full retrain
+DRIFT_TOLERANCE = 0.10
+
+# Boosting rounds / forest trees added per update scale with the share of new rows, within these bounds
+MIN_ROUNDS_PER_UPDATE = 10
+MAX_ROUNDS_PER_UPDATE = 200
+MIN_TREES_PER_UPDATE = 5
+MAX_TREES_PER_UPDATE = 50
+
+SEEN_ROWS_FILE = "seen_rows.npy"
+
+# Holdout row hashes, targets and predictions of the last full refit, kept fixed for drift checks
+BASELINE_FILE = "baseline_holdout.npz"
+
+
+def training_row_hashes(df: pd.DataFrame, target: str) -> np.ndarray:
+    """
+    Content hash of every row over the listing URL, model inputs and target,
+    so an edited listing counts as a new row.
+    """
+    columns = [col for col in ["Listing URL", "Price/m²", "Area", "Bedrooms", "Bathrooms", target] if col in df.columns]
+    return pd.util.hash_pandas_object(df[list(dict.fromkeys(columns))], index=False).to_numpy()
+
+
+def holdout_mask(hashes: np.ndarray) -> np.ndarray:
+    """
+    Fixed holdout by row hash: a row stays in (or out of) the holdout across every update.
+    """
+    return hashes % np.uint64(100) < np.uint64(HOLDOUT_PERCENT)
+
+
+def _scaled(current: int, n_new: int, n_seen: int, minimum: int, maximum: int) -> int:
+    return int(min(maximum, max(minimum, math.ceil(current * n_new / max(n_seen, 1)))))
+
+
+def continue_model(name: str, model, X_new, y_new, n_seen: int, val_size: float = 0.15):
+    """
+    Extend a fitted model with the new rows only: boosted models keep boosting from their
+    booster, early-stopping on a validation fold of the new rows, and keep the previous
+    booster if the extra rounds do not lower that fold's MAE; the forest warm-starts
+    extra trees. Work scales with len(X_new), not with the history.
+    """
+    if name == "Random Forest":
+        extra = _scaled(model.n_estimators, len(X_new), n_seen, MIN_TREES_PER_UPDATE, MAX_TREES_PER_UPDATE)
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + extra)
+        model.fit(X_new, y_new)
+        return model
+
+    X_fit, X_val, y_fit, y_val = train_test_split(X_new, y_new, test_size=val_size, random_state=42)
+    if name == "XGBoost":
+        from xgboost import XGBRegressor
+
+        booster = model.get_booster()
+        best = getattr(model, "best_iteration", None)
+        if best is not None:
+            booster = booster[:best + 1]  # drop the rounds early stopping rejected
+        rounds = _scaled(booster.num_boosted_rounds(), len(X_new), n_seen, MIN_ROUNDS_PER_UPDATE, MAX_ROUNDS_PER_UPDATE)
+        updated = XGBRegressor(**{**model.get_params(), "n_estimators": rounds,
+                                  "early_stopping_rounds": EARLY_STOPPING_ROUNDS})
+        updated.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], xgb_model=booster, verbose=False)
+    elif name == "CatBoost":
+        from catboost import CatBoostRegressor
+
+        rounds = _scaled(model.tree_count_, len(X_new), n_seen, MIN_ROUNDS_PER_UPDATE, MAX_ROUNDS_PER_UPDATE)
+        updated = CatBoostRegressor(**{**model.get_params(), "iterations": rounds})
+        updated.fit(X_fit, y_fit, init_model=model, eval_set=(X_val, y_val),
+                    early_stopping_rounds=EARLY_STOPPING_ROUNDS, use_best_model=True)
+    else:
+        raise ValueError(f"Model '{name}' has no incremental update.")
+
+    # Early stopping only chooses among the new rounds, so compare against adding none
+    if mean_absolute_error(y_val, updated.predict(X_val)) >= mean_absolute_error(y_val, model.predict(X_val)):
+        print(f"[INFO] {name}: extra rounds did not lower validation MAE; keeping the previous model.")
+        return model
+    return updated
+
+
+def _holdout_metrics(model, X_holdout, y_holdout) -> dict:
+    if len(X_holdout) == 0:
+        return {"MAE": float("nan"), "RMSE": float("nan"), "R2": float("nan")}
+    return evaluate_model(y_holdout, model.predict(X_holdout))
+
+
+def _threads(model) -> int:
+    params = model.get_params()
+    return params.get("n_jobs") or params.get("thread_count") or 1
+
+
+def _load_state(registry_dir: str, target: str):
+    try:
+        manifest, models = load_models(registry_dir=registry_dir)
+    except FileNotFoundError:
+        return None
+    version_dir = os.path.join(registry_dir, manifest["version"])
+    seen_path = os.path.join(version_dir, SEEN_ROWS_FILE)
+    baseline_path = os.path.join(version_dir, BASELINE_FILE)
+    if ("incremental" not in manifest or manifest["target"] != target or manifest["features"] != FEATURES
+            or not os.path.exists(seen_path) or not os.path.exists(baseline_path)):
+        return None
+    with np.load(baseline_path) as baseline:
+        return manifest, models, np.load(seen_path), dict(baseline)
+
+
+def _register(fitted: list, frame: pd.DataFrame, target: str, X_train, seen: np.ndarray, state: dict,
+              baseline: dict, registry_dir: str) -> str:
+    version = save_models(fitted, frame, target, FEATURES, fill_values=X_train.mean().to_dict(),
+                          registry_dir=registry_dir, extra={"incremental": state})
+    np.save(os.path.join(registry_dir, version, SEEN_ROWS_FILE), np.sort(seen))
+    np.savez(os.path.join(registry_dir, version, BASELINE_FILE), **baseline)
+    for _, metrics in fitted:
+        metrics["Version"] = version
+    return version
+
+
+def _baseline_drift(model, name: str, baseline: dict, hashes: np.ndarray, X_all, y_all) -> float:
+    """
+    Relative MAE increase over the last full refit, both scored on the refit's holdout
+    rows that are still in the data; row hashes cover inputs and target, so those rows are unchanged.
+    """
+    present = np.isin(hashes, baseline["hashes"])
+    if not present.any():
+        return 0.0
+    positions = np.searchsorted(baseline["hashes"], hashes[present])
+    y_fixed = y_all[present]
+    baseline_mae = mean_absolute_error(y_fixed, baseline[f"pred:{name}"][positions])
+    current_mae = mean_absolute_error(y_fixed, model.predict(X_all[present]))
+    return current_mae / baseline_mae - 1 if baseline_mae > 0 else 0.0
+
+
+def _full_refit(frame, target, hashes, holdout, X_all, y_all, reason: str, registry_dir: str, parallel=None):
+    print(f"[INFO] Full model refit ({reason}).")
+    fitted, X_train = train_models(frame[~holdout], target, parallel=parallel)
+    order = np.argsort(hashes[holdout], kind="stable")
+    baseline = {"hashes": hashes[holdout][order]}
+    for model, metrics in fitted:
+        # Score on the shared holdout, so full and incremental versions compare like for like
+        metrics.update(_holdout_metrics(model, X_all[holdout], y_all[holdout]))
+        metrics.update({"Update": "full", "Reason": reason, "New rows": int((~holdout).sum())})
+        if holdout.any():
+            baseline[f"pred:{metrics['Model']}"] = model.predict(X_all[holdout])[order]
+        else:
+            baseline[f"pred:{metrics['Model']}"] = np.zeros(0)
+    state = {"updates_since_full": 0, "baseline_rows": int(holdout.sum()), "last_reason": reason}
+    _register(fitted, frame, target, X_train, hashes[~holdout], state, baseline, registry_dir)
+    return fitted, X_train
+
+
+@instrument()
+def update_models(df, target: str, registry_dir: str = REGISTRY_DIR, full_refit_every: int = FULL_REFIT_EVERY,
+                  drift_tolerance: float = DRIFT_TOLERANCE, parallel: bool = None):
+    """
+    Bring the registered models up to date with `df` and register the result.
+    Rows the latest version has not trained on are folded in with continue_model; a full
+    refit runs instead when there is no incremental state yet, every `full_refit_every`
+    updates, or when any model's holdout MAE drifts more than `drift_tolerance` above its
+    value after the last full refit, both measured on that refit's holdout rows. Returns ([(model, metrics), ...], X) like train_models.
+    """
+    frame = df.frame if isinstance(df, FeatureStore) else df
+    hashes = training_row_hashes(frame, target)
+    holdout = holdout_mask(hashes)
+    X_all, y_all = feature_engineering(frame)[FEATURES], frame[target]
+
+    loaded = _load_state(registry_dir, target)
+    if loaded is None:
+        return _full_refit(frame, target, hashes, holdout, X_all, y_all, "no incremental state", registry_dir, parallel)
+    manifest, models, seen, baseline = loaded
+    state = manifest["incremental"]
+    new = ~holdout & ~np.isin(hashes, seen)
+    X_train = X_all[~holdout]
+    if not new.any():
+        print("[INFO] No new listings since the registered models; nothing to update.")
+        fitted = [(model, {**manifest["models"][name]["metrics"], "Version": manifest["version"]})
+                  for name, model in models.items()]
+        return fitted, X_train
+    if state["updates_since_full"] + 1 >= full_refit_every:
+        return _full_refit(frame, target, hashes, holdout, X_all, y_all, "scheduled full refit", registry_dir, parallel)
+
+    print(f"[INFO] Incremental update with {int(new.sum())} new listings ({len(seen)} already trained on).")
+    fitted, drifted = [], []
+    for name, model in models.items():
+        reset_peak_rss()
+        start = time.perf_counter()
+        model = continue_model(name, model, X_all[new], y_all[new], len(seen))
+        fit_seconds = time.perf_counter() - start
+        metrics = _holdout_metrics(model, X_all[holdout], y_all[holdout])
+        metrics.update({"Model": name, "Fit time (s)": fit_seconds, "Peak memory (MB)": peak_rss_mb(),
+                        "Best iteration": None, "Threads": _threads(model), "Update": "incremental",
+                        "New rows": int(new.sum())})
+        if f"pred:{name}" in baseline:
+            metrics["Drift"] = _baseline_drift(model, name, baseline, hashes, X_all, y_all)
+            if metrics["Drift"] > drift_tolerance:
+                drifted.append(name)
+        fitted.append((model, metrics))
+
+    if drifted:
+        reason = f"holdout MAE drift on {', '.join(drifted)}"
+        return _full_refit(frame, target, hashes, holdout, X_all, y_all, reason, registry_dir, parallel)
+
+    state = {**state, "updates_since_full": state["updates_since_full"] + 1, "last_reason": "incremental"}
+    _register(fitted, frame, target, X_train, np.concatenate([seen, hashes[new]]), state, baseline, registry_dir)
+    return fitted, X_train
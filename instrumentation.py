@@ -0,0 +1,321 @@
+# instrumentation.py
+
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# Profilers a recording can attach to each outermost span of a thread
+PROFILERS = ["cprofile", "sample"]
+
+SAMPLE_INTERVAL = 0.005
+
+MAX_SPANS = 10_000
+
+_enabled = False
+_profiler = None
+_spans = []
+_open_spans = set()
+_lock = threading.Lock()
+_local = threading.local()
+_next_id = iter(range(1, sys.maxsize))
+
+
+def reset_peak_rss():
+    """
+    Reset the process-wide peak RSS. The peak so far is first folded into every open
+    span, so spans (in any thread) keep the peak they saw before the reset.
+    """
+    with _lock:
+        _reset_peak_locked()
+
+
+def _reset_peak_locked():
+    current = peak_rss_mb()
+    for open_span in _open_spans:
+        open_span.child_peak = max(open_span.child_peak, current)
+    # Linux: writing 5 to clear_refs resets the VmHWM high-water mark
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of this process in MB since the last reset_peak_rss (Linux),
+    or since start where the high-water mark cannot be reset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def enable(profiler: str = None):
+    """
+    Start recording spans; `profiler` ("cprofile" or "sample") also profiles each outermost span.
+    """
+    global _enabled, _profiler
+    if profiler is not None and profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}'. Choose one of: {', '.join(PROFILERS)}")
+    _profiler = profiler
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def clear():
+    with _lock:
+        _spans.clear()
+
+
+def spans() -> list:
+    """
+    Finished spans, oldest first, as dicts (name, id, parent, thread, start, seconds,
+    cpu_seconds, rows_in, rows_out, peak_rss_mb, error and any attributes).
+    """
+    with _lock:
+        return list(_spans)
+
+
+def row_count(value):
+    """
+    Rows in a frame, array, matrix, store or list (the first item of a tuple); None otherwise.
+    """
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (str, bytes, dict)) or value is None:
+        return None
+    shape = getattr(value, "shape", None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class _Sampler:
+    """
+    Sampling profiler: a daemon thread records one thread's call stack every SAMPLE_INTERVAL.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        # Collapsed-stack format, readable by flamegraph.pl and speedscope
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class Span:
+    """
+    One timed region. Use through span(); set `rows` (output row count) or `attrs` on it while it runs.
+    """
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.rows = None
+        # Highest peak RSS seen by nested spans or before a reset_peak_rss while this span was open
+        self.child_peak = 0.0
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        self.id = next(_next_id)
+        self.profile = None
+        if self.parent is None and _profiler == "cprofile":
+            self.profile = cProfile.Profile()
+        elif self.parent is None and _profiler == "sample":
+            self.profile = _Sampler(threading.get_ident())
+        stack.append(self)
+        # VmHWM is process-wide: every span resets it, in whichever thread (Streamlit runs the
+        # script outside the main thread), and the reset folds the peak so far into open spans
+        with _lock:
+            _reset_peak_locked()
+            _open_spans.add(self)
+        self.start = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        if isinstance(self.profile, cProfile.Profile):
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(self.profile, cProfile.Profile):
+            self.profile.disable()
+        seconds = time.perf_counter() - self._wall
+        cpu_seconds = time.thread_time() - self._cpu
+        with _lock:
+            _open_spans.discard(self)
+            peak = max(peak_rss_mb(), self.child_peak)
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        _local.stack.pop()
+
+        record = {"name": self.name, "id": self.id, "parent": self.parent.id if self.parent else None,
+                  "thread": threading.get_ident(), "start": self.start, "seconds": seconds,
+                  "cpu_seconds": cpu_seconds, "rows_in": self.attrs.pop("rows_in", None),
+                  "rows_out": self.rows, "peak_rss_mb": peak,
+                  "error": f"{exc_type.__name__}: {exc}" if exc_type else None, **self.attrs}
+        if isinstance(self.profile, cProfile.Profile):
+            out = io.StringIO()
+            pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(30)
+            record["profile"] = out.getvalue()
+        elif self.profile is not None:
+            record["profile"] = self.profile.stop()
+        with _lock:
+            _spans.append(record)
+            del _spans[:-MAX_SPANS]
+        return False
+
+
+class _NullSpan:
+    rows = None
+
+    @property
+    def attrs(self) -> dict:
+        # A fresh dict each time, so writes while recording is off go nowhere
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs):
+    """
+    Context manager timing a region while recording is enabled; a shared no-op otherwise.
+    """
+    return Span(name, attrs) if _enabled else _NULL_SPAN
+
+
+def instrument(name: str = None):
+    """
+    Decorator recording a span per call: wall and CPU time, rows of the first argument
+    and of the result, and peak RSS. When recording is off it costs one flag check.
+    Generator functions are rejected: a span would only time creating the generator,
+    so instrument the function that consumes it instead.
+    """
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            raise TypeError(f"{fn.__qualname__} is a generator function; instrument its consumer instead.")
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {"rows_in": row_count(args[0]) if args else None}) as current:
+                result = fn(*args, **kwargs)
+                current.rows = row_count(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def span_table(records: list = None):
+    """
+    Spans as a DataFrame with their nesting depth, for display.
+    """
+    import pandas as pd
+
+    records = spans() if records is None else records
+    parents = {record["id"]: record["parent"] for record in records}
+    depth = {}
+    for span_id, parent in parents.items():
+        level = 0
+        while parent is not None:
+            level += 1
+            parent = parents.get(parent)
+        depth[span_id] = level
+    columns = ["name", "depth", "seconds", "cpu_seconds", "rows_in", "rows_out", "peak_rss_mb", "error"]
+    table = pd.DataFrame([{**record, "depth": depth[record["id"]]} for record in records])
+    if table.empty:
+        return pd.DataFrame(columns=columns)
+    return table.sort_values("start")[columns + ["id", "parent"]].reset_index(drop=True)
+
+
+def chrome_trace(records: list = None) -> dict:
+    """
+    Spans in the Chrome trace-event format (chrome://tracing, Perfetto).
+    """
+    records = spans() if records is None else records
+    events = []
+    for record in records:
+        args = {key: value for key, value in record.items()
+                if key not in ("name", "start", "seconds", "thread", "profile") and value is not None}
+        events.append({"name": record["name"], "ph": "X", "pid": os.getpid(), "tid": record["thread"],
+                       "ts": record["start"] * 1e6, "dur": record["seconds"] * 1e6, "args": args})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def span_log(records: list = None) -> str:
+    """
+    Spans as JSON lines, one finished span per line.
+    """
+    records = spans() if records is None else records
+    return "".join(json.dumps(record, default=str) + "\n" for record in records)
+
+
+def export_trace(path: str, records: list = None) -> str:
+    """
+    Write spans to `path`: a Chrome trace for '.json', the span log for '.jsonl'.
+    """
+    records = spans() if records is None else records
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            f.write(span_log(records))
+        else:
+            json.dump(chrome_trace(records), f, default=str)
+    print(f"[INFO] Exported {len(records)} spans to {path}.")
+    return path
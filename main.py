@@ -1,54 +1,116 @@
 import streamlit as st
-import pandas as pd
-from scraper import fetch_listings_from_page
-from preprocessing import preprocess
-from model import run_models
-from clustering import run_clustering, plot_clusters
-from EDA import run_eda
-from nlp_features import enrich_with_nlp
+
+from stage_cache import cached_stage
+
+# Pipeline modules are imported where they are first needed, so the dashboard
+# renders before torch, xgboost, catboost or seaborn are loaded.
 
 st.set_page_config(page_title="Aqarmap Explorer", layout="wide")
 
 st.title("🏡 Aqarmap Real Estate Explorer")
 st.markdown("A smart dashboard for scraping, analyzing, modeling and visualizing real estate data from Aqarmap.")
 
+# --- Instrumentation ---
+import instrumentation
+
+st.sidebar.header("⏱️ Performance")
+if st.sidebar.checkbox("Record stage timings"):
+    profiler = st.sidebar.selectbox("Profiler", ["off"] + instrumentation.PROFILERS,
+                                    help="Profile each top-level stage with cProfile or a stack sampler")
+    instrumentation.enable(None if profiler == "off" else profiler)
+else:
+    instrumentation.disable()
+
 # --- Scraping Section ---
 st.sidebar.header("📥 Data Collection")
+incremental = st.sidebar.checkbox("Only fetch new listings (incremental)")
 if st.sidebar.button("Scrape Latest Listings"):
     with st.spinner("Scraping data from Aqarmap..."):
-        all_listings = []
-        for page in range(1, 20):
-            listings = fetch_listings_from_page(page)
-            all_listings.extend(listings)
+        from scraper import scrape_to_sink, crawl_incremental, upsert_listings, SeenIndex
+        from storage import CrawlCheckpoint, open_sink
 
-        df_raw = pd.DataFrame(all_listings)
-        df_raw.to_csv("data/aqarmap_listings.csv", index=False)
-        st.success("✅ Scraping completed and data saved to 'data/aqarmap_listings.csv'.")
-        st.dataframe(df_raw.head())
+        if incremental:
+            index = SeenIndex()
+            new_listings = crawl_incremental(index, start_page=1, max_pages=19)
+            df_raw = upsert_listings("data/aqarmap_listings.csv", new_listings)
+            # Only now are the listings and page validators safe to remember
+            index.save()
+            st.success(f"✅ {len(new_listings)} new or updated listings merged into 'data/aqarmap_listings.csv'.")
+        else:
+            # Resume an interrupted crawl from its checkpoint instead of starting over
+            checkpoint = CrawlCheckpoint("data/crawl_checkpoint.json")
+            sink = open_sink("data/aqarmap_listings.csv", checkpoint)
+            scrape_to_sink(range(1, 20), sink, checkpoint=checkpoint, index=SeenIndex(),
+                           max_workers=8, rate_limit=4.0)
+            failed = checkpoint.pending(range(1, 20))
+            df_raw = None
+            if failed:
+                st.warning(f"⚠️ {len(failed)} pages failed to load; the previous data is kept. "
+                           "Scrape again to retry them.")
+            else:
+                checkpoint.clear()
+
+                import pandas as pd
+
+                df_raw = pd.read_csv("data/aqarmap_listings.csv", nrows=5)
+                st.success("✅ Scraping completed and data saved to 'data/aqarmap_listings.csv'.")
+        if df_raw is not None:
+            st.dataframe(df_raw.head())
 
 # --- Load & Preprocess Section ---
 df = None
-nlp_df = None  # Holds enriched version
+features = None  # FeatureStore with the listing rows and NLP feature groups
 st.sidebar.header("⚙️ Data Loading & Preprocessing")
+from sbert_backends import available_backends
+
+sbert_backend = st.sidebar.selectbox("SBERT backend", available_backends(),
+                                     help="int8 and ONNX backends encode faster on CPU at a small accuracy cost")
 
-if st.sidebar.checkbox("Load and preprocess saved data"):
+# Artifacts of the headless runner (python pipeline.py), e.g. from a nightly schedule
+from pipeline import latest_run, load_stage_output
+
+pipeline_run = latest_run()
+use_pipeline = pipeline_run is not None and st.sidebar.checkbox(
+    "Use latest pipeline run", value=True,
+    help=f"Read the stage outputs of the pipeline run finished {pipeline_run['finished']}" if pipeline_run else None)
+
+
+def pipeline_output(stage: str):
+    return load_stage_output(pipeline_run, stage) if use_pipeline else None
+
+
+if use_pipeline:
+    df, features = pipeline_output("preprocess"), pipeline_output("nlp")
+    if features is None:
+        st.sidebar.warning("⚠️ The latest pipeline run has no NLP features; rerun `python pipeline.py` or untick to load here.")
+elif st.sidebar.checkbox("Load and preprocess saved data"):
     with st.spinner("Preprocessing data..."):
-        df = preprocess("data/aqarmap_listings.csv")
+        from storage import load_clean_listings
+
+        df = cached_stage("preprocess")(load_clean_listings)("data/aqarmap_listings.csv")
         st.success("✅ Data loaded and preprocessed successfully.")
         st.dataframe(df.head())
 
         with st.spinner("Embedding NLP features..."):
-            nlp_df = enrich_with_nlp(df.copy())
+            from nlp_features import build_nlp_features
+
+            features = cached_stage("nlp")(build_nlp_features)(df, backend=sbert_backend)
             st.success("✅ NLP enrichment complete.")
 
 # --- Main Analysis Tabs ---
-if df is not None and nlp_df is not None:
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 EDA", "🧠 Prediction", "🧩 Clustering", "📁 Raw Data"])
+if df is not None and features is not None:
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 EDA", "🧠 Prediction", "🧩 Clustering", "📁 Raw Data",
+                                             "⏱️ Performance"])
 
     # --- EDA Tab ---
     with tab1:
         st.subheader("📊 Exploratory Data Analysis")
-        eda_figures = run_eda(df)
+        from EDA import run_eda
+        from aggregates import load_cube
+
+        # Per-location aggregates, built once per snapshot and topped up with new listings
+        cube = cached_stage("aggregates")(load_cube)(df)
+        eda_figures = pipeline_output("eda") or cached_stage("eda")(run_eda)(df, cube=cube)
 
         st.subheader("🔹 Summary Statistics")
         st.pyplot(eda_figures["summary"])
@@ -74,41 +136,151 @@ if df is not None and nlp_df is not None:
             st.markdown(f"**{name}**")
             st.pyplot(fig)
 
+        st.subheader("🔹 Location Drilldown")
+        by_count = cube.stats("location").sort_values("Listings", ascending=False)["Location"].tolist()
+        chosen_locations = st.multiselect("Locations", cube.locations(), default=by_count[:5])
+        chosen_bedrooms = st.multiselect("Bedrooms", cube.bedrooms())
+        drilldown = cube.stats("location_bedrooms" if chosen_bedrooms else "location", metric="Price/m²",
+                               locations=chosen_locations, bedrooms=chosen_bedrooms)
+        st.caption("Price/m² (EGP) per group; quantiles are estimated from the aggregate histograms.")
+        st.dataframe(drilldown.round(0))
+
     # --- Modeling Tab ---
     with tab2:
         st.subheader("🧠 Predictive Modeling")
+        incremental = st.checkbox("Incremental update",
+                                  help="Continue the registered models on new listings only; a full refit "
+                                       "still runs periodically or when holdout MAE drifts")
+        tuned = st.checkbox("Use tuned hyperparameters", disabled=incremental,
+                            help="Train with the best parameters saved by `python tuning.py`")
+        results = pipeline_output("models")
+        if results:
+            st.caption("Results of the latest pipeline run; run the models to retrain them here.")
         if st.button("Run Machine Learning Models"):
-            results = run_models(nlp_df, target="Price")
+            from model import run_models
+
+            # Not a cached stage: registering (or updating) the models is the point of the click
+            results = run_models(features, target="Price", register=True, incremental=incremental, tuned=tuned)
+        if results:
             for metrics, fig in results:
                 st.markdown(f"### {metrics['Model']}")
                 st.write(f"**MAE:** {metrics['MAE']:.2f}")
                 st.write(f"**RMSE:** {metrics['RMSE']:.2f}")
                 st.write(f"**R² Score:** {metrics['R2']:.3f}")
+                if metrics.get("Update"):
+                    st.caption(f"{metrics['Update'].capitalize()} update with {metrics['New rows']} rows"
+                               + (f" ({metrics['Reason']})" if metrics.get("Reason") else "")
+                               + " · metrics on the fixed holdout")
+                st.caption(f"Fit {metrics['Fit time (s)']:.2f}s on {metrics['Threads']} thread(s) · "
+                           f"peak RSS {metrics['Peak memory (MB)']:.0f} MB"
+                           + (f" · best iteration {metrics['Best iteration']}" if metrics['Best iteration'] is not None else ""))
                 st.pyplot(fig)
 
+        with st.expander("💰 Estimate a listing price"):
+            from registry import list_versions
+
+            if not list_versions():
+                st.info("Run the models once to register them for prediction.")
+            else:
+                from predict import predict_price
+
+                listing = {
+                    "Price/m²": st.number_input("Price per m² (EGP)", min_value=0.0, value=40000.0, step=1000.0),
+                    "Area": st.number_input("Area (m²)", min_value=1.0, value=150.0),
+                    "Bedrooms": st.number_input("Bedrooms", min_value=0, value=3),
+                    "Bathrooms": st.number_input("Bathrooms", min_value=0, value=2),
+                }
+                for name, price in predict_price(listing).items():
+                    st.write(f"**{name}:** {price:,.0f} EGP")
+
     # --- Clustering Tab ---
     with tab3:
         st.subheader("🧩 Cluster Real Estate Listings")
 
+        from nlp_features import NLP_GROUPS
+
+        nlp_groups = st.multiselect("Feature groups", [name for name in NLP_GROUPS if name in features.groups],
+                                    default=[name for name in NLP_GROUPS if name in features.groups])
+        n_components = st.slider("Reduced dimensions", min_value=2, max_value=100, value=50)
+
+        clusters = pipeline_output("clustering")
+        if clusters:
+            st.caption("Clusters of the latest pipeline run; run the algorithm to recluster with these settings.")
         if st.button("Run Clustering Algorithm"):
-            nlp_cols = [col for col in nlp_df.columns if col.startswith("title_") or col.startswith("location_")]
+            from clustering import cluster_listings
 
-            if not nlp_cols:
-                st.warning("⚠️ NLP features not found. Please run the modeling step first.")
+            if not nlp_groups:
+                st.warning("⚠️ Select at least one NLP feature group.")
             else:
                 try:
-                    clustered_df, model, best_k, best_score = run_clustering(nlp_df.copy(), nlp_cols=nlp_cols)
-                    fig = plot_clusters(clustered_df, nlp_cols)
-                    st.success(f"✅ Clustering complete. Best number of clusters: **{best_k}** (Silhouette Score: {best_score:.2f})")
-                    st.pyplot(fig)
-                    st.dataframe(clustered_df.head())
+                    clusters = cached_stage("clustering")(cluster_listings)(
+                        features, groups=nlp_groups, n_components=n_components)
                 except Exception as e:
                     st.error(f"❌ Clustering failed: {str(e)}")
+        if clusters:
+            st.success(f"✅ Clustering complete. Best number of clusters: **{clusters['best_k']}** "
+                       f"(Silhouette Score: {clusters['score']:.2f})")
+            st.caption(f"Clustered on {clusters['components']} {clusters.get('method', 'PCA')} components "
+                       f"({clusters['explained_variance']:.0%} of the variance).")
+            st.pyplot(clusters["figure"])
+            st.dataframe(clusters["clustered"].head())
 
     # --- Raw Data Tab ---
     with tab4:
         st.subheader("📁 Preview Raw Preprocessed Data")
-        st.dataframe(nlp_df)
+        st.dataframe(features.frame)
+        st.caption(" · ".join(f"{name}: {group.matrix.shape[1]} cols ({'sparse' if group.is_sparse else group.matrix.dtype})"
+                              for name, group in features.groups.items()))
+
+        with st.expander("🔎 Find comparable listings"):
+            row = st.number_input("Row", min_value=0, max_value=len(features.frame) - 1, value=0)
+            exact = st.checkbox("Exact search (brute force)")
+            if st.button("Find similar listings"):
+                from similar_listings import open_similar_index, similar_listings
+
+                index = open_similar_index(features)
+                st.write(features.frame.iloc[[row]])
+                st.dataframe(similar_listings(index, features, row, k=5, exact=exact))
+
+    # --- Performance Tab ---
+    with tab5:
+        st.subheader("⏱️ Performance")
+        if pipeline_run is not None:
+            from pipeline import run_table
+
+            st.markdown(f"**Pipeline run {pipeline_run['run']}** ({pipeline_run['seconds']:.0f}s)")
+            st.dataframe(run_table(pipeline_run).drop(columns=["artifact"]), use_container_width=True)
+
+        records = instrumentation.spans()
+        if not records:
+            st.info("Enable 'Record stage timings' in the sidebar; spans appear here as stages run.")
+        else:
+            import json
+
+            table = instrumentation.span_table(records)
+            top = table[table["depth"] == 0]
+            st.markdown("**Wall time per top-level stage (s)**")
+            st.bar_chart(top.groupby("name")["seconds"].sum().sort_values(ascending=False))
+
+            shown = table.drop(columns=["id", "parent", "depth"])
+            shown["name"] = ["· " * depth + name for depth, name in zip(table["depth"], table["name"])]
+            st.dataframe(shown.round(3), use_container_width=True)
+            st.caption("CPU time is for the calling thread only; work in worker processes shows as wall time.")
+
+            profiled = [record for record in records if record.get("profile")]
+            if profiled:
+                labels = [f"{record['name']} ({record['seconds']:.2f}s, #{record['id']})" for record in profiled]
+                choice = st.selectbox("Profile", range(len(profiled)), format_func=labels.__getitem__)
+                st.code(profiled[choice]["profile"], language="text")
+
+            col1, col2, col3 = st.columns(3)
+            col1.download_button("Download trace (Chrome JSON)", json.dumps(instrumentation.chrome_trace(records)),
+                                 file_name="aqarmap_trace.json", mime="application/json")
+            col2.download_button("Download span log (JSONL)", instrumentation.span_log(records),
+                                 file_name="aqarmap_spans.jsonl", mime="application/x-ndjson")
+            if col3.button("Clear recorded spans"):
+                instrumentation.clear()
+                st.rerun()
 
 else:
     st.info("☝️ Load or scrape data first to continue.")
@@ -1,12 +1,25 @@
+import time
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, cpu_count, delayed
+from sklearn.model_selection import train_test_split, KFold
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
-from xgboost import XGBRegressor
-from catboost import CatBoostRegressor
 from matplotlib import pyplot as plt
+from feature_store import FeatureStore
+from instrumentation import instrument, peak_rss_mb, reset_peak_rss
+
+FEATURES = ["Price/m²", "Area", "Bedrooms", "Bathrooms", "Area_per_Bedroom", "Bathroom_to_Bedroom"]
+
+MODEL_NAMES = ["Random Forest", "XGBoost", "CatBoost"]
+
+# Boosted models train up to this many rounds and stop once the validation fold stops improving
+MAX_BOOSTING_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 50
+
+# Below this many rows, starting worker processes costs more than the fits themselves
+PARALLEL_MIN_ROWS = 20_000
 
 
 def evaluate_model(y_true, y_pred) -> dict:
@@ -20,60 +33,211 @@ def evaluate_model(y_true, y_pred) -> dict:
     }
 
 
+def engineered_features(area, bedrooms, bathrooms):
+    """
+    Ratio features shared by training and prediction; works on Series or NumPy arrays.
+    """
+    return area / (bedrooms + 0.1), bathrooms / (bedrooms + 0.1)
+
+
 def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
     """
     Create new features to enhance model learning.
     """
     df = df.copy()
-    df["Area_per_Bedroom"] = df["Area"] / (df["Bedrooms"] + 0.1)
-    df["Bathroom_to_Bedroom"] = df["Bathrooms"] / (df["Bedrooms"] + 0.1)
+    df["Area_per_Bedroom"], df["Bathroom_to_Bedroom"] = engineered_features(df["Area"], df["Bedrooms"], df["Bathrooms"])
     return df
 
 
-def run_models(df: pd.DataFrame, target: str):
-    df = feature_engineering(df)
+def core_budgets(n_tasks: int, n_cores: int = None) -> list:
+    """
+    Split the machine's cores between concurrently running tasks so their
+    thread pools do not oversubscribe each other. Every task gets at least one core.
+    """
+    n_cores = n_cores or cpu_count()
+    base, extra = divmod(n_cores, n_tasks)
+    return [max(1, base + (1 if i < extra else 0)) for i in range(n_tasks)]
 
-    features = ["Price/m²", "Area", "Bedrooms", "Bathrooms", "Area_per_Bedroom", "Bathroom_to_Bedroom"]
-    X = df[features]
-    y = df[target]
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+def build_model(name: str, n_threads: int = 1, params: dict = None):
+    """
+    Construct one of the supported regressors with an explicit thread budget.
+    """
+    params = dict(params or {})
+    if name == "Random Forest":
+        return RandomForestRegressor(**{"n_estimators": 100, "random_state": 42, **params, "n_jobs": n_threads})
+    if name == "XGBoost":
+        from xgboost import XGBRegressor
 
-    results = []
+        return XGBRegressor(**{"n_estimators": MAX_BOOSTING_ROUNDS, "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+                               "random_state": 42, **params, "n_jobs": n_threads})
+    if name == "CatBoost":
+        from catboost import CatBoostRegressor
+
+        return CatBoostRegressor(**{"iterations": MAX_BOOSTING_ROUNDS, "verbose": 0, "random_state": 42,
+                                    "allow_writing_files": False, **params, "thread_count": n_threads})
+    raise ValueError(f"Unknown model '{name}'. Choose one of: {', '.join(MODEL_NAMES)}")
 
-    # Random Forest
-    rf = RandomForestRegressor(n_estimators=100, random_state=42)
-    rf.fit(X_train, y_train)
-    y_pred_rf = rf.predict(X_test)
-    metrics_rf = evaluate_model(y_test, y_pred_rf)
-    metrics_rf["Model"] = "Random Forest"
-    fig_rf = plot_importance(rf, X, title="Random Forest Feature Importance")
-    results.append((metrics_rf, fig_rf))
-
-    # XGBoost
-    xgb = XGBRegressor(n_estimators=100, random_state=42)
-    xgb.fit(X_train, y_train)
-    y_pred_xgb = xgb.predict(X_test)
-    metrics_xgb = evaluate_model(y_test, y_pred_xgb)
-    metrics_xgb["Model"] = "XGBoost"
-    fig_xgb = plot_importance(xgb, X, title="XGBoost Feature Importance")
-    results.append((metrics_xgb, fig_xgb))
-
-    # CatBoost
-    cat = CatBoostRegressor(verbose=0, random_state=42)
-    cat.fit(X_train, y_train)
-    y_pred_cat = cat.predict(X_test)
-    metrics_cat = evaluate_model(y_test, y_pred_cat)
-    metrics_cat["Model"] = "CatBoost"
-    fig_cat = plot_importance(cat, X, title="CatBoost Feature Importance")
-    results.append((metrics_cat, fig_cat))
 
+def fit_model(name: str, X_train, y_train, X_val=None, y_val=None, n_threads: int = 1, params: dict = None):
+    """
+    Fit one model, early-stopping the boosted ones on (X_val, y_val).
+    Returns the fitted model, fit time in seconds and the fitting process's peak RSS in MB,
+    which includes the boosters' native buffers.
+    """
+    model = build_model(name, n_threads, params)
+    has_val = X_val is not None and len(X_val) > 0
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    if name == "XGBoost":
+        if not has_val:
+            model.set_params(early_stopping_rounds=None)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)] if has_val else None, verbose=False)
+    elif name == "CatBoost" and has_val:
+        model.fit(X_train, y_train, eval_set=(X_val, y_val), early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                  use_best_model=True)
+    else:
+        model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    return model, fit_seconds, peak_rss_mb()
+
+
+def _best_iteration(model):
+    for attr in ("best_iteration", "best_iteration_"):
+        value = getattr(model, attr, None)
+        if value is not None:
+            return int(value)
+    return None
+
+
+def _train_and_score(name, X_train, y_train, X_val, y_val, X_test, y_test, n_threads, params=None):
+    model, fit_seconds, peak_mb = fit_model(name, X_train, y_train, X_val, y_val, n_threads, params)
+    metrics = evaluate_model(y_test, model.predict(X_test))
+    metrics.update({
+        "Model": name,
+        "Fit time (s)": fit_seconds,
+        "Peak memory (MB)": peak_mb,
+        "Best iteration": _best_iteration(model),
+        "Threads": n_threads,
+    })
+    return model, metrics
+
+
+def prepare_training_data(df, target: str):
+    """
+    Feature-engineered X and y; FeatureStore inputs only contribute their listing columns.
+    """
+    # The models only use listing columns, so a FeatureStore's NLP groups are never densified
+    if isinstance(df, FeatureStore):
+        df = df.frame
+    df = feature_engineering(df)
+    return df[FEATURES], df[target]
+
+
+@instrument()
+def train_models(df, target: str, models: list = None, parallel: bool = None, n_cores: int = None,
+                 val_size: float = 0.15, params: dict = None):
+    """
+    Train the regressors side by side on one split, each in its own worker process
+    with a fixed share of the cores. Boosted models early-stop on a validation fold
+    carved from the training data. Returns [(fitted_model, metrics), ...] and X.
+    With parallel=None, worker processes are only used for large inputs on multi-core machines.
+    `params` maps model names to hyperparameters, e.g. from tuning.tuned_params.
+    """
+    models = models or MODEL_NAMES
+    X, y = prepare_training_data(df, target)
+    n_cores = n_cores or cpu_count()
+    if parallel is None:
+        parallel = n_cores > 1 and len(X) >= PARALLEL_MIN_ROWS
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=val_size, random_state=42)
+
+    budgets = core_budgets(len(models), n_cores) if parallel else [n_cores] * len(models)
+    model_params = params or {}
+    jobs = []
+    for name, n_threads in zip(models, budgets):
+        if name == "Random Forest":
+            # Forests do not early-stop, so they train on the whole training split
+            jobs.append(delayed(_train_and_score)(name, X_train, y_train, None, None, X_test, y_test, n_threads,
+                                                  model_params.get(name)))
+        else:
+            jobs.append(delayed(_train_and_score)(name, X_fit, y_fit, X_val, y_val, X_test, y_test, n_threads,
+                                                  model_params.get(name)))
+
+    results = Parallel(n_jobs=len(jobs) if parallel else 1, backend="loky")(jobs)
+    return results, X
+
+
+@instrument()
+def run_models(df, target: str, parallel: bool = None, register: bool = False, registry_dir: str = None,
+               params: dict = None, incremental: bool = False, tuned: bool = False):
+    """
+    Train (or, with `incremental`, update the registered models via incremental.update_models,
+    which always registers) and return [(metrics, importance figure), ...].
+    `tuned` trains with the parameters saved by tuning.py instead of the defaults.
+    """
+    results = []
+    if tuned and params is None and not incremental:
+        from tuning import load_tuned_params
+
+        params = load_tuned_params(df, target)
+    if incremental:
+        from incremental import update_models
+        from registry import REGISTRY_DIR
+
+        fitted, X = update_models(df, target, registry_dir=registry_dir or REGISTRY_DIR, parallel=parallel)
+    else:
+        fitted, X = train_models(df, target, parallel=parallel, params=params)
+    if register and not incremental:
+        from registry import REGISTRY_DIR, save_models
+
+        train_df = df.frame if isinstance(df, FeatureStore) else df
+        version = save_models(fitted, train_df, target, FEATURES, fill_values=X.mean().to_dict(),
+                              registry_dir=registry_dir or REGISTRY_DIR)
+        for _, metrics in fitted:
+            metrics["Version"] = version
+    for model, metrics in fitted:
+        fig = plot_importance(model, X, title=f"{metrics['Model']} Feature Importance")
+        results.append((metrics, fig))
     return results
 
 
+@instrument()
+def cross_validate_models(df, target: str, n_splits: int = 5, models: list = None, n_jobs: int = None,
+                          val_size: float = 0.15) -> pd.DataFrame:
+    """
+    K-fold cross-validation of every model, running (model, fold) fits across a process pool.
+    Returns one row per model and fold with MAE/RMSE/R², fit time and peak memory.
+    """
+    models = models or MODEL_NAMES
+    X, y = prepare_training_data(df, target)
+    n_jobs = n_jobs or min(cpu_count(), len(models) * n_splits)
+    n_threads = core_budgets(n_jobs)[-1]
+
+    jobs = []
+    folds = KFold(n_splits=n_splits, shuffle=True, random_state=42).split(X)
+    for fold, (train_idx, test_idx) in enumerate(folds):
+        X_train, y_train = X.iloc[train_idx], y.iloc[train_idx]
+        X_test, y_test = X.iloc[test_idx], y.iloc[test_idx]
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=val_size, random_state=42)
+        for name in models:
+            if name == "Random Forest":
+                args = (name, X_train, y_train, None, None, X_test, y_test, n_threads)
+            else:
+                args = (name, X_fit, y_fit, X_val, y_val, X_test, y_test, n_threads)
+            jobs.append((fold, delayed(_train_and_score)(*args)))
+
+    outputs = Parallel(n_jobs=n_jobs, backend="loky")(job for _, job in jobs)
+    rows = []
+    for (fold, _), (_, metrics) in zip(jobs, outputs):
+        rows.append({"Fold": fold, **metrics})
+    return pd.DataFrame(rows)
+
+
+@instrument()
 def plot_importance(model, X, title="Feature Importances"):
     importances = model.feature_importances_
     features = X.columns
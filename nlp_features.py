@@ -3,54 +3,133 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from feature_store import FeatureStore
+from instrumentation import instrument
+from sbert_backends import DEFAULT_BACKEND, encode, load_encoder
 
-# Load transformer model once (fast and efficient)
-sbert_model = SentenceTransformer("all-MiniLM-L6-v2")
+MODEL_NAME = "all-MiniLM-L6-v2"
 
+# all-MiniLM-L6-v2 output size, known without loading the model
+EMBEDDING_DIM = 384
 
-def embed_text_column(df: pd.DataFrame, column: str, prefix: str) -> pd.DataFrame:
+# Every feature group build_nlp_features produces; select from these by name
+NLP_GROUPS = ["loc_emb", "title_emb", "loc_tfidf", "title_tfidf"]
+
+
+def get_sbert_model(model_name: str = MODEL_NAME, backend: str = DEFAULT_BACKEND):
+    """
+    Load the SentenceTransformer on first use and keep it for the life of the process.
+    Importing sentence_transformers pulls in torch, so it is deferred until here.
+    """
+    return load_encoder(model_name, backend)
+
+
+def get_embedding_cache(backend: str = DEFAULT_BACKEND) -> EmbeddingCache:
+    """
+    On-disk embedding cache for the active SBERT model. Quantized backends give slightly
+    different vectors, so each backend other than the fp32 one has a cache of its own.
+    """
+    name = MODEL_NAME if backend == DEFAULT_BACKEND else f"{MODEL_NAME}-{backend}"
+    return EmbeddingCache(name, dim=EMBEDDING_DIM)
+
+
+@instrument()
+def embed_texts(texts: pd.Series, cache: EmbeddingCache = None, backend: str = DEFAULT_BACKEND) -> np.ndarray:
+    """
+    Encode a text Series into a float32 (n_rows, EMBEDDING_DIM) array.
+    Each distinct string is encoded once, and strings already in `cache` are not re-encoded.
+    See sbert_backends for the available encoding backends.
+    """
+    codes, uniques = pd.factorize(texts.fillna("").astype(str))
+    unique_texts = uniques.tolist()
+
+    if cache is not None:
+        unique_embeddings, missing = cache.lookup(unique_texts)
+    else:
+        unique_embeddings = np.zeros((len(unique_texts), EMBEDDING_DIM), dtype=np.float32)
+        missing = list(range(len(unique_texts)))
+
+    print(f"[NLP] {len(unique_texts)} distinct values, {len(missing)} to encode.")
+    if missing:
+        to_encode = [unique_texts[i] for i in missing]
+        encoded = encode(to_encode, MODEL_NAME, backend)
+        if cache is not None:
+            cache.store(to_encode, encoded)
+            # Round fresh vectors as the cache stores them, so a rerun's features are identical
+            encoded = encoded.astype(cache.dtype).astype(np.float32)
+        unique_embeddings[missing] = encoded
+
+    return unique_embeddings[codes]
+
+
+def embed_text_column(df: pd.DataFrame, column: str, prefix: str, cache: EmbeddingCache = None) -> pd.DataFrame:
     """
     Generate sentence embeddings for a given text column using SentenceTransformer.
     """
     print(f"[NLP] Embedding '{column}' with SBERT...")
-    texts = df[column].fillna("").astype(str).tolist()
-    embeddings = sbert_model.encode(texts, show_progress_bar=True)
+    embeddings = embed_texts(df[column], cache)
     embed_df = pd.DataFrame(embeddings, columns=[f"{prefix}_emb_{i}" for i in range(embeddings.shape[1])])
     return embed_df
 
 
-def tfidf_features(df: pd.DataFrame, column: str, prefix: str, max_features=50) -> pd.DataFrame:
+@instrument()
+def tfidf_matrix(df: pd.DataFrame, column: str, prefix: str, max_features=50):
     """
-    Generate TF-IDF vectors for a given text column.
+    Fit TF-IDF on a text column and return the float32 CSR matrix with its column names.
     """
     print(f"[NLP] Generating TF-IDF features for '{column}'...")
     texts = df[column].fillna("").astype(str).tolist()
-    tfidf = TfidfVectorizer(max_features=max_features, stop_words="english")
-    tfidf_matrix = tfidf.fit_transform(texts)
-    tfidf_df = pd.DataFrame(tfidf_matrix.toarray(), columns=[f"{prefix}_tfidf_{w}" for w in tfidf.get_feature_names_out()])
+    tfidf = TfidfVectorizer(max_features=max_features, stop_words="english", dtype=np.float32)
+    matrix = tfidf.fit_transform(texts).tocsr()
+    return matrix, [f"{prefix}_tfidf_{w}" for w in tfidf.get_feature_names_out()]
+
+
+def tfidf_features(df: pd.DataFrame, column: str, prefix: str, max_features=50) -> pd.DataFrame:
+    """
+    Generate TF-IDF vectors for a given text column.
+    """
+    matrix, columns = tfidf_matrix(df, column, prefix, max_features)
+    tfidf_df = pd.DataFrame(matrix.toarray(), columns=columns)
     return tfidf_df
 
 
-def enrich_with_nlp(df: pd.DataFrame) -> pd.DataFrame:
+@instrument()
+def build_nlp_features(df: pd.DataFrame, cache: EmbeddingCache = None, embedding_dtype="float32",
+                       backend: str = DEFAULT_BACKEND) -> FeatureStore:
     """
-    Full pipeline: add both SBERT and TF-IDF for Title and Location columns.
-    Returns a DataFrame with original + new features.
+    SBERT and TF-IDF features for Title and Location, kept compact in a FeatureStore:
+    embeddings as contiguous float32 (or float16) arrays, TF-IDF as CSR sparse matrices.
+    Groups: loc_emb, title_emb, loc_tfidf, title_tfidf.
     """
-    print("[NLP] Enriching DataFrame with NLP features...")
+    print("[NLP] Building NLP feature store...")
+    cache = cache if cache is not None else get_embedding_cache(backend)
+    store = FeatureStore(df)
 
-    # Embeddings
-    location_embed = embed_text_column(df, "Location", "loc")
-    title_embed = embed_text_column(df, "Title", "title")
+    # Location and Title are encoded in one pass, so texts shared by both are encoded once
+    print("[NLP] Embedding 'Location' and 'Title' with SBERT...")
+    n = len(store)
+    embeddings = embed_texts(pd.concat([store.frame["Location"], store.frame["Title"]], ignore_index=True),
+                             cache, backend).astype(embedding_dtype, copy=False)
+    for i, prefix in enumerate(["loc", "title"]):
+        block = embeddings[i * n:(i + 1) * n]
+        store.add_group(f"{prefix}_emb", block, [f"{prefix}_emb_{j}" for j in range(block.shape[1])])
 
     # TF-IDF (optional, but useful for trees)
-    location_tfidf = tfidf_features(df, "Location", "loc", max_features=30)
-    title_tfidf = tfidf_features(df, "Title", "title", max_features=30)
+    for column, prefix in [("Location", "loc"), ("Title", "title")]:
+        matrix, columns = tfidf_matrix(store.frame, column, prefix, max_features=30)
+        store.add_group(f"{prefix}_tfidf", matrix, columns)
+
+    print(f"[NLP] Feature store ready ({store.nbytes / 1e6:.1f} MB).")
+    return store
 
-    # Combine all
-    df = pd.concat([df.reset_index(drop=True),
-                    location_embed, title_embed,
-                    location_tfidf, title_tfidf], axis=1)
 
+def enrich_with_nlp(df: pd.DataFrame, cache: EmbeddingCache = None) -> pd.DataFrame:
+    """
+    Full pipeline: add both SBERT and TF-IDF for Title and Location columns.
+    Returns a DataFrame with original + new features.
+    Prefer build_nlp_features, which avoids densifying everything into one frame.
+    """
+    df = build_nlp_features(df, cache).to_frame()
     print("[NLP] NLP enrichment complete.")
     return df
@@ -0,0 +1,399 @@
+# pipeline.py
+
+"""
+Headless pipeline runner: scrape -> preprocess -> {eda, nlp} -> {models, clustering}.
+
+Stages whose inputs are ready run concurrently in a process pool. Every output is stored
+once under the hash of its content, and a stage is skipped when an earlier run already
+produced its output from the same inputs, parameters and code. The dashboard reads the
+artifacts of the latest run.
+
+Usage:
+    python pipeline.py
+    python pipeline.py --scrape --pages 19 --workers 2
+    python pipeline.py --stages eda nlp --force nlp --backend torch-int8
+"""
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from instrumentation import peak_rss_mb, reset_peak_rss, row_count
+from stage_cache import stage_key, value_hash
+
+PIPELINE_DIR = "data/pipeline"
+DATA_PATH = "data/aqarmap_listings.csv"
+
+# Run manifests kept by prune_runs; artifacts only they reference are deleted with them
+KEEP_RUNS = 14
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _scrape(data: str = DATA_PATH, scrape: bool = False, pages: int = 19) -> str:
+    # Source stage: always runs, and its output is addressed by the listings file's content
+    if scrape:
+        from scraper import SeenIndex, scrape_to_sink
+        from storage import CrawlCheckpoint, open_sink
+
+        checkpoint = CrawlCheckpoint("data/crawl_checkpoint.json")
+        sink = open_sink(data, checkpoint)
+        scrape_to_sink(range(1, pages + 1), sink, checkpoint=checkpoint, index=SeenIndex(),
+                       max_workers=8, rate_limit=4.0)
+        # A partial crawl is not committed: the run continues on the previous listings and
+        # the checkpoint keeps the failed pages for the next night
+        failed = checkpoint.pending(range(1, pages + 1))
+        if failed:
+            print(f"[INFO] {len(failed)} pages failed; continuing with the previous listings.")
+        else:
+            checkpoint.clear()
+    if not os.path.exists(data):
+        raise FileNotFoundError(f"No listings at '{data}'. Run with --scrape first.")
+    return data
+
+
+def _preprocess(path: str) -> pd.DataFrame:
+    from storage import load_clean_listings
+
+    return load_clean_listings(path)
+
+
+def _eda(df: pd.DataFrame) -> dict:
+    from EDA import run_eda
+    from aggregates import load_cube
+
+    return run_eda(df, cube=load_cube(df))
+
+
+def _nlp(df: pd.DataFrame, backend: str = None):
+    from nlp_features import build_nlp_features
+    from sbert_backends import DEFAULT_BACKEND
+
+    return build_nlp_features(df, backend=backend or DEFAULT_BACKEND)
+
+
+def _models(features, target: str = "Price", incremental: bool = False, tuned: bool = False) -> list:
+    from model import run_models
+
+    return run_models(features, target=target, register=True, incremental=incremental, tuned=tuned)
+
+
+def _clustering(features, groups: list = None, n_components: int = 50) -> dict:
+    from clustering import cluster_listings
+
+    return cluster_listings(features, groups=groups, n_components=n_components)
+
+
+def _models_state() -> str:
+    from registry import REGISTRY_DIR, latest_version
+    from tuning import latest_tuned
+
+    try:
+        version = latest_version(REGISTRY_DIR)
+    except FileNotFoundError:
+        version = None
+    tuned = latest_tuned()
+    return f"{version}:{tuned and os.path.getmtime(tuned)}"
+
+
+# name -> (function, upstream stages passed as positional inputs, modules whose code keys the stage)
+STAGES = {
+    "scrape": (_scrape, [], ["scraper.py", "storage.py"]),
+    "preprocess": (_preprocess, ["scrape"], ["storage.py", "preprocessing.py", "dedup.py"]),
+    "eda": (_eda, ["preprocess"], ["EDA.py", "aggregates.py"]),
+    "nlp": (_nlp, ["preprocess"], ["nlp_features.py", "sbert_backends.py", "embedding_cache.py", "feature_store.py"]),
+    "models": (_models, ["nlp"], ["model.py", "incremental.py", "registry.py"]),
+    "clustering": (_clustering, ["nlp"], ["clustering.py"]),
+}
+
+# Stages that read the outside world and therefore never reuse an earlier output
+UNCACHED_STAGES = {"scrape"}
+
+# Stages with side effects outside their artifact: the current external state joins the
+# stage key, so the models stage reruns when the registry moved on (e.g. a dashboard retrain)
+# or a newer search saved tuned parameters
+STAGE_STATE = {"models": _models_state}
+
+
+def stage_order(stages: list = None) -> list:
+    """
+    The requested stages plus everything upstream of them, in dependency order.
+    """
+    needed, todo = set(), list(stages or STAGES)
+    while todo:
+        name = todo.pop()
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage '{name}'. Choose from: {', '.join(STAGES)}")
+        if name not in needed:
+            needed.add(name)
+            todo.extend(STAGES[name][1])
+    return [name for name in STAGES if name in needed]
+
+
+def _artifact_path(address: str, directory: str) -> str:
+    return os.path.join(directory, "artifacts", address + ".pkl")
+
+
+def _index_path(key: str, directory: str) -> str:
+    return os.path.join(directory, "stages", key + ".json")
+
+
+def _write_json(path: str, payload: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def artifact_address(value, key: str) -> str:
+    """
+    Content address of a stage output. Frames, file paths and objects with content_hash()
+    are hashed by content, so an upstream rerun that reproduces the same output leaves its
+    dependents cached; figures and fitted models have no stable hash and use the stage key.
+    """
+    if isinstance(value, (pd.DataFrame, str)) or hasattr(value, "content_hash"):
+        return hashlib.blake2b(value_hash(value).encode("utf-8"), digest_size=20).hexdigest()
+    return key
+
+
+def save_artifact(value, address: str, directory: str = PIPELINE_DIR):
+    path = _artifact_path(address, directory)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + f".{os.getpid()}.tmp", "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + f".{os.getpid()}.tmp", path)
+
+
+@functools.lru_cache(maxsize=8)
+def load_artifact(address: str, directory: str = PIPELINE_DIR):
+    """
+    Unpickle an artifact. Artifacts never change once written, so loads are memoised per process.
+    """
+    with open(_artifact_path(address, directory), "rb") as f:
+        return pickle.load(f)
+
+
+THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@contextlib.contextmanager
+def _worker_thread_limits(n_threads: int):
+    # Spawned workers import numpy while unpickling their first task, before any initializer
+    # could run, so the limits must already be in the environment they inherit
+    saved = {var: os.environ.get(var) for var in THREAD_VARS}
+    os.environ.update({var: str(n_threads) for var in THREAD_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _stage_key(name: str, inputs: list, params: dict) -> str:
+    modules = [os.path.join(MODULE_DIR, m) for m in STAGES[name][2]]
+    state = [f"state:{STAGE_STATE[name]()}"] if name in STAGE_STATE else []
+    return stage_key(name, *modules, *inputs, *state, **params)
+
+
+def _execute(name: str, key: str, inputs: list, params: dict, directory: str) -> dict:
+    reset_peak_rss()
+    start = time.perf_counter()
+    fn = STAGES[name][0]
+    value = fn(*[load_artifact(address, directory) for address in inputs], **params)
+    address = artifact_address(value, key)
+    save_artifact(value, address, directory)
+    return {"artifact": address, "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(),
+            "rows": row_count(value)}
+
+
+def run_pipeline(stages: list = None, params: dict = None, force: list = (), workers: int = None,
+                 directory: str = PIPELINE_DIR) -> dict:
+    """
+    Run `stages` (default: all) and their upstream stages, reusing any stage output already
+    stored for the same code, parameters and input artifacts unless the stage is in `force`.
+    Stages run in a pool of `workers` spawned processes (default: 2, or one per core),
+    each starting as soon as its inputs exist; a failed stage skips its dependents only.
+    `params` maps stage names to keyword arguments. Writes and returns the run manifest.
+    """
+    order = stage_order(stages)
+    params = params or {}
+    workers = workers or max(2, os.cpu_count() or 1)
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    run = {"run": time.strftime("%Y%m%dT%H%M%S"), "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "directory": directory, "stages": {}}
+    results = run["stages"]
+    start = time.perf_counter()
+    print(f"[INFO] Pipeline run {run['run']}: {', '.join(order)} on {workers} workers.")
+
+    pending, running = list(order), {}
+    with _worker_thread_limits(n_threads), ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name in list(pending):
+                    upstream = STAGES[name][1]
+                    if any(results.get(dep, {}).get("status") in ("failed", "skipped") for dep in upstream):
+                        results[name] = {"status": "skipped", "error": "upstream stage failed"}
+                    elif all(results.get(dep, {}).get("status") in ("done", "cached") for dep in upstream):
+                        inputs = [results[dep]["artifact"] for dep in upstream]
+                        stage_params = params.get(name, {})
+                        key = _stage_key(name, inputs, stage_params)
+                        entry = _read_json(_index_path(key, directory))
+                        if (name not in UNCACHED_STAGES and name not in force and entry is not None
+                                and os.path.exists(_artifact_path(entry["artifact"], directory))):
+                            print(f"[CACHE] Reusing '{name}' artifact {entry['artifact'][:12]}.")
+                            results[name] = {**entry, "status": "cached", "seconds": 0.0}
+                        else:
+                            print(f"[INFO] Starting stage '{name}'.")
+                            future = executor.submit(_execute, name, key, inputs, stage_params, directory)
+                            running[future] = (name, key, inputs, stage_params)
+                            results[name] = {"status": "running", "key": key}
+                    else:
+                        continue
+                    pending.remove(name)
+                    progressed = True
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key, inputs, stage_params = running.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"[INFO] Stage '{name}' failed: {type(e).__name__}: {e}")
+                    results[name] = {"status": "failed", "key": key, "error": f"{type(e).__name__}: {e}"}
+                    continue
+                entry = {"stage": name, "key": key, "artifact": outcome["artifact"],
+                         "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "rows": outcome["rows"]}
+                _write_json(_index_path(key, directory), entry)
+                if name in STAGE_STATE:
+                    # The stage changed that state itself; a rerun against it should reuse this output
+                    _write_json(_index_path(_stage_key(name, inputs, stage_params), directory), entry)
+                results[name] = {**entry, **outcome, "status": "done"}
+                print(f"[INFO] Stage '{name}' done in {outcome['seconds']:.1f}s "
+                      f"(peak {outcome['peak_rss_mb']:.0f} MB).")
+
+    run["finished"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    run["seconds"] = time.perf_counter() - start
+    _write_json(os.path.join(directory, "runs", run["run"] + ".json"), run)
+    _write_json(os.path.join(directory, "latest.json"), run)
+    prune_runs(directory)
+    return run
+
+
+def latest_run(directory: str = PIPELINE_DIR):
+    """
+    Manifest of the most recent pipeline run, or None if the pipeline has never run.
+    """
+    return _read_json(os.path.join(directory, "latest.json"))
+
+
+def load_stage_output(run: dict, stage: str):
+    """
+    A stage's output from a run manifest, or None if the stage did not produce one.
+    """
+    result = run["stages"].get(stage, {})
+    if result.get("status") not in ("done", "cached"):
+        return None
+    return load_artifact(result["artifact"], run["directory"])
+
+
+def run_table(run: dict) -> pd.DataFrame:
+    """
+    One row per stage of a run manifest, for display.
+    """
+    columns = ["stage", "status", "seconds", "peak_rss_mb", "rows", "artifact", "error"]
+    rows = [{"stage": name, **result} for name, result in run["stages"].items()]
+    return pd.DataFrame(rows).reindex(columns=columns)
+
+
+def prune_runs(directory: str = PIPELINE_DIR, keep: int = KEEP_RUNS):
+    """
+    Keep the newest `keep` run manifests and delete artifacts and index entries none of them reference.
+    """
+    runs_dir = os.path.join(directory, "runs")
+    names = sorted(os.listdir(runs_dir), reverse=True) if os.path.isdir(runs_dir) else []
+    for name in names[keep:]:
+        os.remove(os.path.join(runs_dir, name))
+    referenced = set()
+    for name in names[:keep]:
+        for result in _read_json(os.path.join(runs_dir, name))["stages"].values():
+            if result.get("artifact"):
+                referenced.add(result["artifact"])
+
+    removed = 0
+    index_dir = os.path.join(directory, "stages")
+    for name in os.listdir(index_dir) if os.path.isdir(index_dir) else []:
+        if _read_json(os.path.join(index_dir, name))["artifact"] not in referenced:
+            os.remove(os.path.join(index_dir, name))
+    artifacts_dir = os.path.join(directory, "artifacts")
+    for name in os.listdir(artifacts_dir) if os.path.isdir(artifacts_dir) else []:
+        if name.endswith(".pkl") and name[:-4] not in referenced:
+            os.remove(os.path.join(artifacts_dir, name))
+            removed += 1
+    if removed:
+        print(f"[CACHE] Pruned {removed} artifacts no longer referenced by the last {keep} runs.")
+
+
+def main():
+    from sbert_backends import available_backends
+
+    parser = argparse.ArgumentParser(description="Run the Aqarmap pipeline headlessly with cached stage artifacts")
+    parser.add_argument("--stages", nargs="*", default=None, choices=list(STAGES),
+                        help="Stages to bring up to date (with everything upstream); default: all")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES), help="Recompute these stages")
+    parser.add_argument("--data", default=DATA_PATH,
+                        help="Raw listings: a .csv or .jsonl file, or a .parquet dataset directory")
+    parser.add_argument("--scrape", action="store_true", help="Crawl Aqarmap into --data before preprocessing")
+    parser.add_argument("--pages", type=int, default=19)
+    parser.add_argument("--backend", default=None, choices=available_backends(),
+                        help="SBERT backend for the nlp stage")
+    parser.add_argument("--incremental-models", action="store_true",
+                        help="Update the registered models instead of retraining them")
+    parser.add_argument("--tuned-models", action="store_true",
+                        help="Train with the parameters saved by tuning.py instead of the defaults")
+    parser.add_argument("--groups", nargs="*", default=None, help="Feature groups to cluster on; default: all")
+    parser.add_argument("--components", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dir", default=PIPELINE_DIR)
+    args = parser.parse_args()
+
+    params = {
+        "scrape": {"data": args.data, "scrape": args.scrape, "pages": args.pages},
+        "nlp": {"backend": args.backend} if args.backend else {},
+        "models": {**({"incremental": True} if args.incremental_models else {}),
+                   **({"tuned": True} if args.tuned_models else {})},
+        "clustering": {"groups": args.groups, "n_components": args.components},
+    }
+    run = run_pipeline(args.stages, params, args.force, args.workers, args.dir)
+    print(run_table(run).drop(columns=["artifact"]).to_string(index=False))
+    failed = [name for name, result in run["stages"].items() if result["status"] in ("failed", "skipped")]
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# predict.py
+
+"""
+Price prediction from registered models.
+
+Usage:
+    python predict.py serve --port 8000
+    curl -X POST localhost:8000/predict -d '{"Price/m²": 40000, "Area": 150, "Bedrooms": 3, "Bathrooms": 2}'
+"""
+
+import argparse
+import json
+import os
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from model import engineered_features
+from registry import REGISTRY_DIR, latest_version, load_models
+
+INPUT_COLUMNS = ["Price/m²", "Area", "Bedrooms", "Bathrooms"]
+
+
+class PricePredictor:
+    """
+    Registered models loaded once, with vectorized feature engineering for single listings or batches.
+    """
+
+    def __init__(self, version: str = None, registry_dir: str = REGISTRY_DIR):
+        self.manifest, self.models = load_models(version, registry_dir)
+        self.version = self.manifest["version"]
+        self.features = self.manifest["features"]
+        self._fill = np.array([self.manifest["fill_values"].get(col, np.nan) for col in INPUT_COLUMNS])
+        for estimator in self.models.values():
+            # One request is too small to benefit from thread fan-out
+            _single_threaded(estimator)
+
+    def prepare(self, listings) -> pd.DataFrame:
+        """
+        Turn a dict, list of dicts or DataFrame into the model's feature matrix.
+        Missing or non-numeric inputs fall back to the training means.
+        """
+        if isinstance(listings, dict):
+            listings = [listings]
+        if isinstance(listings, pd.DataFrame):
+            values = np.column_stack([
+                pd.to_numeric(listings[col], errors="coerce").to_numpy(dtype="float64")
+                if col in listings else np.full(len(listings), np.nan)
+                for col in INPUT_COLUMNS
+            ]) if len(listings) else np.empty((0, len(INPUT_COLUMNS)))
+        else:
+            if not all(isinstance(record, dict) for record in listings):
+                raise ValueError("Each listing must be an object mapping input columns to values.")
+            # Plain records skip DataFrame construction, which dominates single-row latency
+            values = np.array([[_to_float(record.get(col)) for col in INPUT_COLUMNS] for record in listings],
+                              dtype="float64").reshape(-1, len(INPUT_COLUMNS))
+
+        missing = np.isnan(values)
+        if missing.any():
+            values = np.where(missing, self._fill, values)
+
+        columns = dict(zip(INPUT_COLUMNS, values.T))
+        columns["Area_per_Bedroom"], columns["Bathroom_to_Bedroom"] = engineered_features(
+            columns["Area"], columns["Bedrooms"], columns["Bathrooms"])
+        return pd.DataFrame(np.column_stack([columns[name] for name in self.features]), columns=self.features)
+
+    def predict(self, listings, model: str = None):
+        """
+        Predicted prices. A single dict returns {model: price}; batches return a DataFrame
+        with one column per model. Pass `model` to use only that estimator.
+        """
+        X = self.prepare(listings)
+        names = [model] if model else list(self.models)
+        predictions = pd.DataFrame({name: self.models[name].predict(X) for name in names})
+        if isinstance(listings, dict):
+            return {name: float(predictions[name].iloc[0]) for name in names}
+        return predictions
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _single_threaded(estimator):
+    params = estimator.get_params()
+    for key in ("n_jobs", "thread_count"):
+        if key in params:
+            try:
+                estimator.set_params(**{key: 1})
+            except Exception:
+                pass
+
+
+def get_predictor(version: str = None, registry_dir: str = REGISTRY_DIR) -> PricePredictor:
+    """
+    Process-wide predictor per version, so models are deserialised once.
+    version=None resolves the latest version on every call, so newly registered models
+    are served as soon as they exist; a version re-registered in place is reloaded too.
+    """
+    version = version or latest_version(registry_dir)
+    manifest_path = os.path.join(registry_dir, version, "manifest.json")
+    return _load_predictor(version, registry_dir, os.path.getmtime(manifest_path))
+
+
+@lru_cache(maxsize=4)
+def _load_predictor(version: str, registry_dir: str, manifest_mtime: float) -> PricePredictor:
+    return PricePredictor(version, registry_dir)
+
+
+def predict_price(listings, model: str = None, version: str = None):
+    """
+    Convenience wrapper around the cached predictor.
+    """
+    return get_predictor(version).predict(listings, model)
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    Resolves the predictor per request (cached by get_predictor), so a server started with
+    version=None moves to newly registered models without a restart.
+    """
+
+    def _predictor(self) -> PricePredictor:
+        return get_predictor(self.server.version, self.server.registry_dir)
+
+    def do_GET(self):
+        if self.path == "/health":
+            predictor = self._predictor()
+            self._send(200, {"status": "ok", "version": predictor.version, "models": list(predictor.models)})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"null")
+            if not isinstance(payload, (dict, list)):
+                raise ValueError("Body must be a listing object or a list of listings.")
+            predictor = self._predictor()
+            result = predictor.predict(payload)
+            if isinstance(result, pd.DataFrame):
+                result = result.to_dict(orient="records")
+            self._send(200, {"version": predictor.version, "predictions": result})
+        except (ValueError, KeyError) as e:
+            self._send(400, {"error": str(e)})
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8000, version: str = None,
+                registry_dir: str = REGISTRY_DIR) -> ThreadingHTTPServer:
+    """
+    Threaded HTTP server for POST /predict and GET /health; version=None follows the latest registered version.
+    """
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.version, server.registry_dir = version, registry_dir
+    return server
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, version: str = None, registry_dir: str = REGISTRY_DIR):
+    """
+    Serve POST /predict and GET /health on a local threaded HTTP server.
+    """
+    # Loading up front fails fast on an empty registry and warms the cache for the first request
+    predictor = get_predictor(version, registry_dir)
+    server = make_server(host, port, version, registry_dir)
+    following = "" if version else " (following the latest registered version)"
+    print(f"[INFO] Serving model version {predictor.version}{following} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aqarmap price prediction")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Run the local HTTP prediction endpoint")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8000)
+    p_serve.add_argument("--version", default=None)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.host, args.port, args.version)
+
+
+if __name__ == "__main__":
+    main()
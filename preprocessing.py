@@ -1,18 +1,34 @@
 import math
 import pandas as pd
 import numpy as np
-import re
-from sklearn.preprocessing import StandardScaler
 
+from dedup import mark_duplicates, deduplicate
+from instrumentation import instrument
 
+
+# Raw text patterns, applied once per distinct value rather than once per row
+NON_DIGITS = r"[^0-9]+"
+FIRST_NUMBER = r"([0-9]+)"
+
+ROOM_COLUMNS = ["Bedrooms", "Bathrooms"]
+
+NA_VALUES = ["N/A", ""]
+
+
+@instrument()
 def load_data(filepath: str) -> pd.DataFrame:
     """
-    Load the CSV file and handle encoding issues and missing markers.
+    Load the raw listings (CSV, JSON Lines, or a Parquet dataset written by a scrape sink)
+    and handle encoding issues and missing markers.
     """
     try:
-        df = pd.read_csv(filepath, encoding='utf-8-sig')
+        if filepath.endswith(".jsonl"):
+            df = _strings_to_na(pd.read_json(filepath, lines=True, dtype=False))
+        elif filepath.endswith(".parquet"):
+            df = _strings_to_na(pd.read_parquet(filepath))
+        else:
+            df = pd.read_csv(filepath, encoding='utf-8-sig', na_values=NA_VALUES)
         print(f"[INFO] Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
-        df.replace(["N/A", ""], np.nan, inplace=True)
         return df
     except FileNotFoundError:
         print(f"[ERROR] File not found: {filepath}")
@@ -22,34 +38,50 @@ def load_data(filepath: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def clean_price_columns(df: pd.DataFrame) -> pd.DataFrame:
+def _strings_to_na(df: pd.DataFrame) -> pd.DataFrame:
+    # The JSONL and Parquet sinks keep every field as scraped text, 'N/A' included
+    return df.astype(object).replace(NA_VALUES, np.nan)
+
+
+def _map_unique(series: pd.Series, parse) -> pd.Series:
     """
-    Clean and convert 'Price' and 'Price/m²' columns to integers.
+    Parse each distinct raw value once and broadcast the result back to every row.
+    Scraped prices and areas repeat heavily, so this is far cheaper than a per-row pass.
     """
-    def parse(value):
-        if pd.isna(value):
-            return np.nan
-        value = str(value).replace("\n", " ").replace(",", "").replace("EGP", "").replace("EGP/m", "")
-        value = re.sub(r"[^\d]", "", value)
-        return int(value) if value.isdigit() else np.nan
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = parse(pd.Series(uniques, dtype="string[pyarrow]")).to_numpy(dtype="float64", na_value=np.nan)
+    values = np.full(len(codes), np.nan, dtype="float64")
+    found = codes >= 0
+    values[found] = parsed[codes[found]]
+    return pd.Series(values, index=series.index, name=series.name)
 
-    df["Price"] = df["Price"].apply(parse)
-    df["Price/m²"] = df["Price/m²"].apply(parse)
+
+def _digits_to_number(raw: pd.Series) -> pd.Series:
+    digits = raw.str.replace(NON_DIGITS, "", regex=True)
+    return pd.to_numeric(digits.mask(digits == ""), errors="coerce")
+
+
+def _first_number(raw: pd.Series) -> pd.Series:
+    return pd.to_numeric(raw.str.extract(FIRST_NUMBER, expand=False), errors="coerce")
+
+
+def clean_price_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean and convert 'Price' and 'Price/m²' columns to float64.
+    Aqarmap renders price per meter as '-35,555EGP/m'; the leading dash is a
+    separator from the layout, not a sign, so only the digits are kept and the
+    result is always a non-negative magnitude.
+    """
+    df["Price"] = _map_unique(df["Price"], _digits_to_number)
+    df["Price/m²"] = _map_unique(df["Price/m²"], _digits_to_number)
     return df
 
 
 def clean_area_column(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Extract numeric values from the 'Area' column.
+    Extract the first number from the 'Area' column (e.g. '225m²' -> 225).
     """
-    def extract(value):
-        if pd.isna(value):
-            return np.nan
-        value = str(value).replace("m²", "").replace("mÂ²", "").replace("Â²", "")
-        match = re.search(r"\d+", value)
-        return int(match.group()) if match else np.nan
-
-    df["Area"] = df["Area"].apply(extract)
+    df["Area"] = _map_unique(df["Area"], _first_number)
     return df
 
 
@@ -57,18 +89,25 @@ def convert_room_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Convert room counts to numeric.
     """
-    df["Bedrooms"] = pd.to_numeric(df["Bedrooms"], errors="coerce")
-    df["Bathrooms"] = pd.to_numeric(df["Bathrooms"], errors="coerce")
+    for col in ROOM_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
     return df
 
 
-def fill_missing_values(df: pd.DataFrame) -> pd.DataFrame:
+@instrument()
+def fill_missing_values(df: pd.DataFrame, fills: dict = None) -> pd.DataFrame:
     """
     Fill missing values: mean for numeric, mode for categorical.
-    """
-    for col in df.columns:
-        if df[col].dtype in [np.float64, np.int64]:
-            if col in ["Bedrooms", "Bathrooms"]:
+    Only columns that actually contain gaps are touched.
+    Pass precomputed `fills` (column -> value) to fill a chunk with whole-dataset statistics.
+    """
+    missing = df.isna().any()
+    for col in missing[missing].index:
+        if fills is not None:
+            if col in fills:
+                df[col] = df[col].fillna(fills[col])
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            if col in ROOM_COLUMNS:
                 df[col] = df[col].fillna(math.ceil(df[col].mean()))
             else:
                 df[col] = df[col].fillna(df[col].mean())
@@ -81,7 +120,24 @@ def clean_location_column(df: pd.DataFrame) -> pd.DataFrame:
     """
     Remove 'Greater Cairo /' prefix from the Location column.
     """
-    df["Location"] = df["Location"].str.replace(r"^Greater Cairo\s*/\s*", "", regex=True)
+    uniques = pd.Series(df["Location"].dropna().unique())
+    if uniques.empty:
+        # An all-missing column (e.g. in one chunk) is read as float64 and has nothing to clean
+        return df
+    cleaned = uniques.astype(str).str.replace(r"^Greater Cairo\s*/\s*", "", regex=True)
+    df["Location"] = df["Location"].map(dict(zip(uniques, cleaned)))
+    return df
+
+
+@instrument()
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse prices, area and room counts and tidy locations; row-local, so it works per chunk.
+    """
+    df = clean_price_columns(df)
+    df = clean_area_column(df)
+    df = convert_room_columns(df)
+    df = clean_location_column(df)
     return df
 
 
@@ -89,24 +145,31 @@ def scale_numerical_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Standardize continuous numerical features only.
     """
+    from sklearn.preprocessing import StandardScaler
+
     scaler = StandardScaler()
     numeric_cols = ["Price", "Price/m²", "Area"]
     df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
     return df
 
 
-def preprocess(filepath: str) -> pd.DataFrame:
+@instrument()
+def preprocess(filepath: str, dedup: bool = True) -> pd.DataFrame:
     """
     Execute the full preprocessing pipeline.
+    With dedup, exact and near-duplicate listings are grouped ('Duplicate Group')
+    and only the first row of each group is kept.
     """
     df = load_data(filepath)
     if df.empty:
         return df
 
-    df = clean_price_columns(df)
-    df = clean_area_column(df)
-    df = convert_room_columns(df)
-    df = clean_location_column(df)
+    df = clean_columns(df)
+
+    # Before filling gaps, so imputed values cannot make distinct listings look identical
+    if dedup:
+        df = deduplicate(mark_duplicates(df))
+
     df = fill_missing_values(df)
 
     # Standardize numerical features
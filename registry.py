@@ -0,0 +1,98 @@
+# registry.py
+
+import json
+import os
+import re
+import time
+
+import joblib
+
+from stage_cache import frame_hash
+
+REGISTRY_DIR = "models"
+
+TRANSFORM = "model.feature_engineering"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def save_models(fitted: list, train_df, target: str, features: list, fill_values: dict,
+                registry_dir: str = REGISTRY_DIR, extra: dict = None) -> str:
+    """
+    Persist fitted estimators with the feature list and transform they expect.
+    The version is derived from the training data hash, so retraining on identical
+    data overwrites the same version. `extra` adds keys to the manifest. Returns the version id.
+    """
+    data_hash = frame_hash(train_df)
+    version = data_hash[:12]
+    version_dir = os.path.join(registry_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    entries = {}
+    for estimator, metrics in fitted:
+        filename = _slug(metrics["Model"]) + ".joblib"
+        joblib.dump(estimator, os.path.join(version_dir, filename))
+        entries[metrics["Model"]] = {
+            "file": filename,
+            "metrics": {k: v for k, v in metrics.items() if isinstance(v, (int, float, str)) or v is None},
+        }
+
+    manifest = {
+        "version": version,
+        "data_hash": data_hash,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": target,
+        "features": list(features),
+        "transform": TRANSFORM,
+        "fill_values": fill_values,
+        "models": entries,
+        **(extra or {}),
+    }
+    _write_json(os.path.join(version_dir, "manifest.json"), manifest)
+    _write_json(os.path.join(registry_dir, "latest.json"), {"version": version})
+    print(f"[INFO] Registered {len(entries)} models as version {version}.")
+    return version
+
+
+def list_versions(registry_dir: str = REGISTRY_DIR) -> list:
+    """
+    Manifests of every registered version, newest first.
+    """
+    if not os.path.isdir(registry_dir):
+        return []
+    manifests = []
+    for name in os.listdir(registry_dir):
+        path = os.path.join(registry_dir, name, "manifest.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m["created"], reverse=True)
+
+
+def latest_version(registry_dir: str = REGISTRY_DIR) -> str:
+    path = os.path.join(registry_dir, "latest.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No registered models in '{registry_dir}'. Train models first.")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["version"]
+
+
+def load_models(version: str = None, registry_dir: str = REGISTRY_DIR):
+    """
+    Load (manifest, {model name: estimator}) for a version, defaulting to the latest.
+    """
+    version = version or latest_version(registry_dir)
+    version_dir = os.path.join(registry_dir, version)
+    with open(os.path.join(version_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    models = {name: joblib.load(os.path.join(version_dir, entry["file"]))
+              for name, entry in manifest["models"].items()}
+    return manifest, models
+
+
+def _write_json(path: str, payload: dict):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,176 @@
+# sbert_backends.py
+
+import importlib.util
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+# torch: the fp32 reference; torch-int8: dynamic int8 quantization of its Linear layers;
+# onnx / onnx-int8: ONNX Runtime on the exported model / its int8-quantized export
+BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+DEFAULT_BACKEND = "torch"
+
+# Packages a backend needs beyond sentence-transformers (pinned in requirements.txt)
+BACKEND_PACKAGES = {"onnx": ["optimum", "onnxruntime"], "onnx-int8": ["optimum", "onnxruntime"]}
+
+# Model-free stand-in for benchmarks: deterministic hashed unit vectors, no torch involved
+STUB_BACKEND = "stub"
+STUB_DIM = 384
+
+# Dynamically quantized export published alongside the MiniLM ONNX model
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+BATCH_SIZE = 64
+
+# Inputs of at least this many texts are split across a process pool
+POOL_MIN_TEXTS = 20_000
+
+_WORKER = {}
+
+
+def available_backends() -> list:
+    """
+    The BACKENDS whose extra packages are installed.
+    """
+    return [backend for backend in BACKENDS
+            if all(importlib.util.find_spec(package) for package in BACKEND_PACKAGES.get(backend, []))]
+
+
+@lru_cache(maxsize=None)
+def load_encoder(model_name: str, backend: str = DEFAULT_BACKEND):
+    """
+    Load a SentenceTransformer for `backend` once per process.
+    The ONNX backends need the optimum and onnxruntime packages.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SBERT backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    from sentence_transformers import SentenceTransformer
+
+    print(f"[NLP] Loading SBERT model '{model_name}' ({backend})...")
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "torch-int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+
+
+def stub_vectors(texts: list, dim: int = STUB_DIM, chunk_size: int = 10_000) -> np.ndarray:
+    """
+    A fixed pseudo-random unit vector per distinct text, from a splitmix64 hash of the text.
+    """
+    import pandas as pd
+
+    keys = pd.util.hash_array(np.asarray(texts, dtype=object))
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    lanes = np.arange(dim, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    for start in range(0, len(texts), chunk_size):
+        z = keys[start:start + chunk_size, None] + lanes
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+        block = (z >> np.uint64(40)).astype(np.float32) / np.float32(1 << 23) - 1
+        out[start:start + chunk_size] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def _init_worker(model_name: str, backend: str, n_threads: int):
+    import torch
+
+    torch.set_num_threads(n_threads)
+    _WORKER.update(model=load_encoder(model_name, backend))
+
+
+def _encode_shard(texts: list, batch_size: int) -> np.ndarray:
+    return np.asarray(_WORKER["model"].encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def _length_batches(texts: list, batch_size: int) -> list:
+    # Batches of similar-length texts, so each is padded only to its own longest member
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def encode(texts: list, model_name: str, backend: str = DEFAULT_BACKEND, batch_size: int = BATCH_SIZE,
+           workers: int = None) -> np.ndarray:
+    """
+    Encode `texts` into a float32 array with length-sorted batches (STUB_BACKEND skips the model).
+    With `workers` > 1 (default: every core once there are POOL_MIN_TEXTS texts) the
+    batches are dealt round-robin to a spawned process pool, each worker holding its own
+    copy of the model and an equal share of the cores.
+    """
+    if backend == STUB_BACKEND:
+        return stub_vectors(texts)
+    if not texts:
+        return np.zeros((0, load_encoder(model_name, backend).get_sentence_embedding_dimension()), dtype=np.float32)
+    if workers is None:
+        workers = os.cpu_count() if len(texts) >= POOL_MIN_TEXTS else 1
+    batches = _length_batches(texts, batch_size)
+    workers = max(1, min(workers, len(batches)))
+
+    if workers == 1:
+        order = np.concatenate(batches)
+        encoded = load_encoder(model_name, backend).encode([texts[i] for i in order], batch_size=batch_size,
+                                                           show_progress_bar=len(batches) > 1)
+        shards, outputs = [order], [np.asarray(encoded, dtype=np.float32)]
+    else:
+        # Round-robin keeps every shard's mix of short and long texts, and so its run time, alike
+        shards = [np.concatenate(batches[i::workers]) for i in range(workers)]
+        n_threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"[NLP] Encoding {len(texts)} texts in {workers} processes...")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(model_name, backend, n_threads)) as executor:
+            outputs = list(executor.map(_encode_shard, [[texts[i] for i in shard] for shard in shards],
+                                        [batch_size] * workers))
+
+    embeddings = np.empty((len(texts), outputs[0].shape[1]), dtype=np.float32)
+    for shard, output in zip(shards, outputs):
+        embeddings[shard] = output
+    return embeddings
+
+
+def cosine_similarity_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of each row of `a` with the same row of `b`.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.where(norms > 0, norms, 1.0)
+
+
+def compare_backends(texts: list, model_name: str, backends: list = None, reference: str = DEFAULT_BACKEND,
+                     batch_size: int = BATCH_SIZE, workers: int = 1) -> list:
+    """
+    Sentences per second of each backend and the cosine similarity of its embeddings
+    to the `reference` (fp32) ones. Model loading is excluded from the timings;
+    a backend that cannot load is reported with its error.
+    """
+    results, reference_embeddings = [], None
+    for backend in [reference] + [b for b in backends or BACKENDS if b != reference]:
+        row = {"backend": backend, "sentences_per_sec": float("nan"),
+               "mean_cosine": float("nan"), "min_cosine": float("nan"), "error": ""}
+        try:
+            load_encoder(model_name, backend)
+            start = time.perf_counter()
+            embeddings = encode(texts, model_name, backend, batch_size=batch_size, workers=workers)
+            row["sentences_per_sec"] = len(texts) / (time.perf_counter() - start)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}".splitlines()[0]
+            results.append(row)
+            continue
+        if backend == reference:
+            reference_embeddings = embeddings
+        if reference_embeddings is not None:
+            similarity = cosine_similarity_rows(embeddings, reference_embeddings)
+            row["mean_cosine"], row["min_cosine"] = float(similarity.mean()), float(similarity.min())
+        results.append(row)
+    return results
@@ -1,7 +1,20 @@
 # scraper.py
 
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import instrument
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
@@ -9,25 +22,375 @@ HEADERS = {
 
 BASE_URL = "https://aqarmap.com.eg/en/for-sale/property-type/cairo/?page="
 
+REQUEST_TIMEOUT = 15
 
-def fetch_listings_from_page(page: int) -> list:
-    url = BASE_URL + str(page)
-    response = requests.get(url, headers=HEADERS)
+SEEN_INDEX_PATH = "data/seen_listings.json"
 
-    if response.status_code != 200:
-        print(f"Failed to load page {page}")
-        return []
+# The strained bs4 parse matches the reference parse on any markup. lxml is roughly an order
+# of magnitude faster but builds a different tree from malformed markup (e.g. unclosed <p>),
+# so it stays opt-in; tests/test_scraper.py checks the backends agree on well-formed pages.
+DEFAULT_PARSER = "strainer"
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces requests to at most `rate` per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
 
-    soup = BeautifulSoup(response.text, "html.parser")
+
+def make_session(pool_size: int = 8, retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """
+    Build a pooled HTTP session that retries transient failures with exponential backoff.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _parse_with_soup(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
     listings = soup.find_all("div", class_="listing-card")
+    return [extract_listing_data(listing) for listing in listings]
+
+
+def _is_listing_card(value) -> bool:
+    # The strainer sees the raw class string during parsing, not bs4's token list
+    if not value:
+        return False
+    tokens = value.split() if isinstance(value, str) else value
+    return "listing-card" in tokens
+
+
+def _parse_with_strainer(html: str) -> list:
+    # Only build tree nodes for the listing cards, skipping the rest of the page
+    only_cards = SoupStrainer("div", class_=_is_listing_card)
+    soup = BeautifulSoup(html, "html.parser", parse_only=only_cards)
+    listings = soup.find_all("div", class_="listing-card")
+    return [extract_listing_data(listing) for listing in listings]
+
+
+def _parse_with_lxml(html: str) -> list:
+    from lxml import html as lxml_html
+
+    xp = _lxml_selectors()
+    root = lxml_html.fromstring(html)
+    return [extract_listing_data_lxml(card, xp) for card in xp["cards"](root)]
+
+
+PARSERS = {
+    "soup": _parse_with_soup,
+    "strainer": _parse_with_strainer,
+    "lxml": _parse_with_lxml,
+}
+
+
+@instrument()
+def parse_listings_page(html: str, parser: str = DEFAULT_PARSER) -> list:
+    """
+    Parse a results page into a list of listing dicts using the chosen backend.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser '{parser}'. Choose one of: {', '.join(PARSERS)}")
+    return PARSERS[parser](html)
+
+
+@instrument()
+def fetch_page(page: int, session: requests.Session = None, base_url: str = BASE_URL,
+               timeout: float = REQUEST_TIMEOUT, limiter: RateLimiter = None, validators: dict = None):
+    """
+    Fetch one results page, sending conditional headers when validators are given.
+    Returns (status_code, html, validators); status_code is None on network errors.
+    """
+    url = base_url + str(page)
+    headers = dict(HEADERS)
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    if limiter is not None:
+        limiter.wait()
+
+    try:
+        getter = session.get if session is not None else requests.get
+        response = getter(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"Failed to load page {page}: {e}")
+        return None, "", {}
+
+    new_validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return response.status_code, response.text, new_validators
+
+
+def fetch_listings_from_page(page: int, session: requests.Session = None, base_url: str = BASE_URL,
+                             timeout: float = REQUEST_TIMEOUT, limiter: RateLimiter = None,
+                             parser: str = DEFAULT_PARSER):
+    """
+    Listings on one results page, or None if the page failed to load
+    (an empty list is a page that loaded with no listings).
+    """
+    status, html, _ = fetch_page(page, session, base_url, timeout, limiter)
+
+    if status != 200:
+        print(f"Failed to load page {page}")
+        return None
+
+    return parse_listings_page(html, parser)
+
+
+def crawl_pages(pages, max_workers: int = 8, rate_limit: float = 4.0, base_url: str = BASE_URL,
+                timeout: float = REQUEST_TIMEOUT, retries: int = 3, backoff: float = 0.5,
+                parser: str = DEFAULT_PARSER):
+    """
+    Fetch pages concurrently over one pooled session.
+    Yields (page, listings) tuples in completion order, so callers can consume
+    results while slower pages are still in flight; listings is None for a page
+    that failed to load. `base_url` can point at a local stand-in server for tests.
+    """
+    pages = list(pages)
+    if not pages:
+        return
+
+    workers = max(1, min(max_workers, len(pages)))
+    limiter = RateLimiter(rate_limit)
+
+    with make_session(pool_size=workers, retries=retries, backoff=backoff) as session:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {
+                executor.submit(fetch_listings_from_page, page, session, base_url, timeout, limiter, parser): page
+                for page in pages
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # A consumer that stops early only waits for the pages already in flight
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_listings(pages, **crawl_kwargs):
+    """
+    Stream listing records as their pages complete, without holding the whole crawl in memory.
+    """
+    for _, listings in crawl_pages(pages, **crawl_kwargs):
+        yield from listings or []
+
+
+@instrument()
+def scrape_to_sink(pages, sink, checkpoint=None, chunk_size: int = 500, index=None, **crawl_kwargs) -> int:
+    """
+    Crawl pages and write their listings to `sink` in chunks of about `chunk_size` records.
+    Pages already recorded in `checkpoint` are skipped, and a page is only marked done
+    once its records have been written, so a rerun resumes after the last durable chunk.
+    Pages that fail to load are never marked done, and the sink is only committed when
+    every page loaded, so a partial crawl leaves the previous data in place and a rerun
+    retries the failed pages. The seen `index` learns this run's listings only once the
+    sink is committed. Returns the number of records written.
+    """
+    pages = list(pages)
+    if checkpoint is not None:
+        pages = [page for page in pages if page not in checkpoint.completed]
+
+    buffer, buffered_pages, written = [], [], 0
+    # Fingerprints wait for the commit, or an unpublished listing would count as known
+    seen = {}
+
+    def flush():
+        nonlocal buffer, buffered_pages, written
+        sink.write(buffer)
+        written += len(buffer)
+        if checkpoint is not None:
+            checkpoint.mark_done(buffered_pages)
+        if index is not None:
+            seen.update(index.fingerprints(buffer))
+        buffer, buffered_pages = [], []
+
+    failed = []
+    try:
+        for page, listings in crawl_pages(pages, **crawl_kwargs):
+            if listings is None:
+                failed.append(page)
+                continue
+            buffer.extend(listings)
+            buffered_pages.append(page)
+            if len(buffer) >= chunk_size:
+                flush()
+
+        if buffered_pages:
+            flush()
+    except BaseException:
+        sink.close(commit=False)
+        raise
+
+    if failed:
+        print(f"[INFO] {len(failed)} pages failed to load ({', '.join(map(str, sorted(failed)))}); "
+              f"keeping the previous data until a rerun fetches them.")
+    sink.close(commit=not failed)
+    if index is not None and not failed:
+        index.listings.update(seen)
+        index.save()
+    return written
+
+
+def listing_fingerprint(listing: dict) -> str:
+    """
+    Stable hash of a listing's scraped fields, used to detect changed rows.
+    """
+    payload = json.dumps(listing, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SeenIndex:
+    """
+    Persistent record of scraped listings (Listing URL -> fingerprint) and of
+    the HTTP validators (ETag / Last-Modified) last returned for each page.
+    """
 
-    result = []
+    def __init__(self, path: str = SEEN_INDEX_PATH):
+        self.path = path
+        self.listings = {}
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.listings = state.get("listings", {})
+            self.pages = state.get("pages", {})
 
-    for listing in listings:
-        data = extract_listing_data(listing)
-        result.append(data)
+    def classify(self, listing: dict) -> str:
+        """
+        Return 'new', 'changed' or 'known' for a scraped listing.
+        """
+        url = listing.get("Listing URL", "N/A")
+        if url == "N/A":
+            return "new"
+        seen = self.listings.get(url)
+        if seen is None:
+            return "new"
+        return "known" if seen == listing_fingerprint(listing) else "changed"
 
-    return result
+    def add(self, listing: dict):
+        self.listings.update(self.fingerprints([listing]))
+
+    @staticmethod
+    def fingerprints(listings: list) -> dict:
+        """
+        Listing URL -> fingerprint for the listings that have a URL.
+        """
+        return {listing["Listing URL"]: listing_fingerprint(listing) for listing in listings
+                if listing.get("Listing URL", "N/A") != "N/A"}
+
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"listings": self.listings, "pages": self.pages}, f)
+        os.replace(tmp_path, self.path)
+
+
+@instrument()
+def crawl_incremental(index: SeenIndex, start_page: int = 1, max_pages: int = 1000, max_workers: int = 4,
+                      rate_limit: float = 4.0, base_url: str = BASE_URL, timeout: float = REQUEST_TIMEOUT,
+                      parser: str = DEFAULT_PARSER) -> list:
+    """
+    Crawl pages in order and return only new or changed listings.
+    Paging stops at the first page that is unmodified (HTTP 304), empty, or made
+    up entirely of listings already in the index. Pages are fetched in windows
+    of `max_workers` so the stop check still runs in page order.
+    The index is only updated in memory: save it once the returned listings are stored
+    (e.g. by upsert_listings), or a failed write leaves them marked as seen.
+    """
+    limiter = RateLimiter(rate_limit)
+    fresh = []
+    page = start_page
+    last_page = start_page + max_pages - 1
+
+    with make_session(pool_size=max_workers) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while page <= last_page:
+                window = list(range(page, min(page + max_workers, last_page + 1)))
+                futures = [
+                    executor.submit(fetch_page, p, session, base_url, timeout, limiter, index.pages.get(str(p)))
+                    for p in window
+                ]
+
+                for p, future in zip(window, futures):
+                    status, html, validators = future.result()
+                    if status == 304:
+                        print(f"[INFO] Page {p} not modified; stopping.")
+                        return fresh
+                    if status != 200:
+                        print(f"Failed to load page {p}")
+                        return fresh
+
+                    listings = parse_listings_page(html, parser)
+                    if any(validators.values()):
+                        index.pages[str(p)] = validators
+
+                    page_fresh = [listing for listing in listings if index.classify(listing) != "known"]
+                    for listing in page_fresh:
+                        index.add(listing)
+                    fresh.extend(page_fresh)
+
+                    if not page_fresh:
+                        print(f"[INFO] Page {p} holds no new listings; stopping.")
+                        return fresh
+
+                page = window[-1] + 1
+
+    return fresh
+
+
+@instrument()
+def upsert_listings(filepath: str, listings: list) -> pd.DataFrame:
+    """
+    Insert new listings into the CSV and replace rows whose Listing URL already exists.
+    """
+    new_df = pd.DataFrame(listings)
+    if os.path.exists(filepath):
+        old_df = pd.read_csv(filepath, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+        if not new_df.empty:
+            keyed = new_df["Listing URL"] != "N/A"
+            old_df = old_df[~old_df["Listing URL"].isin(new_df.loc[keyed, "Listing URL"])]
+        df = pd.concat([new_df, old_df], ignore_index=True)
+    else:
+        df = new_df
+
+    tmp_path = filepath + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, filepath)
+    return df
 
 
 def extract_listing_data(listing) -> dict:
@@ -78,3 +441,88 @@ def extract_listing_data(listing) -> dict:
         "Image URL": image_url,
         "Listing URL": listing_url
     }
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+@lru_cache(maxsize=1)
+def _lxml_selectors() -> dict:
+    """
+    Precompiled XPath equivalents of the BeautifulSoup lookups in extract_listing_data.
+    A class test with spaces mirrors bs4's exact match on the whole class string.
+    """
+    from lxml import etree
+
+    return {
+        "cards": etree.XPath(f"//div[{_has_class('listing-card')}]"),
+        "title": etree.XPath(".//h2"),
+        "price": etree.XPath(f".//span[{_has_class('text-title_4')}]"),
+        "price_per_meter": etree.XPath(f".//p[{_has_class('text-gray__dark_1')}]"),
+        "location": etree.XPath(f".//p[{_has_class('text-gray__dark_2')}][@title]"),
+        "size_divs": etree.XPath(".//div[normalize-space(@class)='flex items-center gap-x-x']"),
+        "size_icon": etree.XPath(".//i[normalize-space(@class)='inline-block bg-cover size-icon']"),
+        "details": etree.XPath(".//p[normalize-space(@class)='text-gray__dark_2 text-caption']"),
+        "image": etree.XPath(".//img"),
+        "link": etree.XPath(".//a[@href]"),
+        # bs4's get_text skips script, style and template strings
+        "text": etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]"),
+    }
+
+
+def extract_listing_data_lxml(listing, xp: dict = None) -> dict:
+    """
+    lxml counterpart of extract_listing_data; returns an identical dict.
+    """
+    xp = xp or _lxml_selectors()
+
+    def first(name, node=listing):
+        found = xp[name](node)
+        return found[0] if found else None
+
+    def safe_text(tag, default="N/A"):
+        if tag is None:
+            return default
+        return "".join(text.strip() for text in xp["text"](tag))
+
+    try:
+        title = safe_text(first("title"))
+        price = safe_text(first("price"))
+        price_per_meter = safe_text(first("price_per_meter"))
+
+        location_tag = first("location")
+        location = location_tag.get("title") if location_tag is not None else "N/A"
+
+        area = "N/A"
+        for div in xp["size_divs"](listing):
+            if first("size_icon", div) is not None:
+                area_tag = first("details", div)
+                if area_tag is not None:
+                    area = safe_text(area_tag)
+                break
+
+        details = xp["details"](listing)
+        bedrooms = safe_text(details[1]) if len(details) > 1 else "N/A"
+        bathrooms = safe_text(details[2]) if len(details) > 2 else "N/A"
+
+        image_tag = first("image")
+        image_url = image_tag.attrib["src"] if image_tag is not None else "N/A"
+
+        link_tag = first("link")
+        listing_url = "https://aqarmap.com.eg" + link_tag.get("href") if link_tag is not None else "N/A"
+
+    except Exception:
+        title = price = price_per_meter = location = area = bedrooms = bathrooms = image_url = listing_url = "N/A"
+
+    return {
+        "Title": title,
+        "Price": price,
+        "Price/m²": price_per_meter,
+        "Location": location,
+        "Area": area,
+        "Bedrooms": bedrooms,
+        "Bathrooms": bathrooms,
+        "Image URL": image_url,
+        "Listing URL": listing_url
+    }
@@ -0,0 +1,355 @@
+# similar_listings.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_store import FeatureStore
+
+SIMILAR_INDEX_DIR = "data/similar_index"
+
+NUMERIC_FEATURES = ["Price/m²", "Area", "Bedrooms"]
+
+# Relative weight of each block in the listing vector (cosine similarity over the concatenation)
+BLOCK_WEIGHTS = {"title": 1.0, "location": 1.0, "numeric": 1.0}
+
+# Below this many rows a single inverted list is used, i.e. the index scans everything
+MIN_ROWS_PER_LIST = 256
+
+# Listing fields a row's vector is built from; their hash tells when a vector is stale
+VECTOR_INPUTS = ["Title", "Location"] + NUMERIC_FEATURES
+
+INDEX_FILES = ["vectors.bin", "keys.txt", "fingerprints.txt", "centroids.npy", "assignments.npy", "meta.json"]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def fit_numeric_scaler(df: pd.DataFrame) -> dict:
+    """
+    Mean/std of the log-scaled numeric features, stored with the index so later
+    inserts and queries are scaled exactly like the rows it was built from.
+    """
+    values = np.log1p(df[NUMERIC_FEATURES].to_numpy(dtype=np.float64).clip(min=0))
+    return {"mean": np.nanmean(values, axis=0).tolist(), "std": (np.nanstd(values, axis=0) + 1e-9).tolist()}
+
+
+def listing_vectors(title_emb: np.ndarray, loc_emb: np.ndarray, numeric: pd.DataFrame, scaler: dict) -> np.ndarray:
+    """
+    Unit-length float32 vectors: normalized title and location embeddings plus the
+    standardized numeric features, each block weighted by BLOCK_WEIGHTS.
+    """
+    values = np.log1p(numeric[NUMERIC_FEATURES].to_numpy(dtype=np.float64).clip(min=0))
+    values = np.nan_to_num((values - scaler["mean"]) / scaler["std"])
+    blocks = [
+        BLOCK_WEIGHTS["title"] * _normalize(np.asarray(title_emb, dtype=np.float32)),
+        BLOCK_WEIGHTS["location"] * _normalize(np.asarray(loc_emb, dtype=np.float32)),
+        BLOCK_WEIGHTS["numeric"] * values.astype(np.float32) / np.sqrt(len(NUMERIC_FEATURES)),
+    ]
+    return _normalize(np.hstack(blocks)).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    IVF-style approximate nearest-neighbour index over unit vectors (inner product).
+
+    A k-means coarse quantizer splits rows into inverted lists; a query scans only the
+    `nprobe` lists whose centroids are closest. With a `directory`, rows are appended to
+    vectors.bin on every add() and memory-mapped on load, so opening a large index is cheap.
+    Re-adding an existing key replaces its row; the old row is kept on disk but skipped.
+    Each row may carry a fingerprint of the data its vector came from (`fingerprints`).
+    """
+
+    def __init__(self, dim: int, directory: str = None, n_lists: int = None, extra: dict = None):
+        self.dim = dim
+        self.directory = directory
+        self.n_lists = n_lists
+        self.extra = extra or {}
+        self.centroids = None
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)  # -1 marks a replaced row
+        self.keys = []
+        self.rows = {}
+        self.fingerprints = {}
+        self._lists = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, sample_size: int = 30_000, random_state: int = 42):
+        """
+        Fit the coarse quantizer on (a sample of) vectors. Defaults to about sqrt(n) lists.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        n = len(vectors)
+        n_lists = self.n_lists or int(np.clip(np.sqrt(n), 1, 4096))
+        n_lists = max(1, min(n_lists, n // MIN_ROWS_PER_LIST))
+        if n_lists == 1:
+            self.centroids = _normalize(vectors.mean(axis=0, keepdims=True)).astype(np.float32)
+        else:
+            rng = np.random.default_rng(random_state)
+            sample = vectors[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))]
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=1, random_state=random_state)
+            kmeans.fit(sample)
+            self.centroids = _normalize(kmeans.cluster_centers_).astype(np.float32)
+        self.n_lists = len(self.centroids)
+        print(f"[SIMILAR] Trained {self.n_lists} inverted lists on {min(n, sample_size)} vectors.")
+
+    def add(self, keys: list, vectors: np.ndarray, fingerprints: list = None):
+        """
+        Insert (or replace) rows; trains the quantizer first if the index is empty.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        fingerprints = [""] * len(keys) if fingerprints is None else list(fingerprints)
+        if not len(keys) == len(vectors) == len(fingerprints):
+            raise ValueError("keys, vectors and fingerprints must have the same length.")
+        if not len(keys):
+            return
+        if not self.is_trained:
+            self.train(vectors)
+
+        assignments = self._nearest_lists(vectors, 1)[:, 0].astype(np.int32)
+        start = len(self.keys)
+        for offset, key in enumerate(keys):
+            old = self.rows.get(key)
+            if old is not None and old >= start:
+                assignments[old - start] = -1
+            elif old is not None:
+                self.assignments[old] = -1
+            self.rows[key] = start + offset
+        self.fingerprints.update(zip(keys, fingerprints))
+        self.keys.extend(keys)
+        self.assignments = np.concatenate([self.assignments, assignments])
+        self._lists = None
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, "vectors.bin"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(os.path.join(self.directory, "keys.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in keys)
+            with open(os.path.join(self.directory, "fingerprints.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{fingerprint}\n" for fingerprint in fingerprints)
+            self._write_metadata()
+            self.vectors = self._open_vectors(len(self.keys))
+        else:
+            self.vectors = np.concatenate([self.vectors, vectors])
+
+    def remove(self, keys: list):
+        """
+        Drop rows by key; like replaced rows they stay on disk but are skipped.
+        """
+        rows = [self.rows.pop(key) for key in keys if key in self.rows]
+        for key in keys:
+            self.fingerprints.pop(key, None)
+        if rows:
+            self.assignments[rows] = -1
+            self._lists = None
+            if self.directory:
+                self._write_metadata()
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int = 8):
+        """
+        Approximate top-k by inner product. Returns (keys, scores), one list per query.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        lists = self._inverted_lists()
+        probes = self._nearest_lists(queries, min(nprobe, self.n_lists))
+        results_keys, results_scores = [], []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([lists[i] for i in probe])
+            scores = self.vectors[candidates] @ query
+            top = self._top(scores, k)
+            results_keys.append([self.keys[i] for i in candidates[top]])
+            results_scores.append(scores[top])
+        return results_keys, results_scores
+
+    def search_exact(self, queries: np.ndarray, k: int = 10, chunk_size: int = 65_536):
+        """
+        Brute-force top-k over every live row, in chunks. Returns (keys, scores) like search().
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        live = self.assignments >= 0
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.keys), chunk_size):
+            scores = self.vectors[start:start + chunk_size] @ queries.T
+            scores[~live[start:start + chunk_size]] = -np.inf
+            rows = np.arange(start, start + len(scores))
+            best_rows = np.hstack([best_rows, np.broadcast_to(rows, (len(queries), len(rows)))])
+            best_scores = np.hstack([best_scores, scores.T])
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        results_keys, results_scores = [], []
+        for rows, scores in zip(best_rows, best_scores):
+            order = np.argsort(-scores, kind="stable")
+            order = order[np.isfinite(scores[order])]
+            results_keys.append([self.keys[i] for i in rows[order]])
+            results_scores.append(scores[order])
+        return results_keys, results_scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _nearest_lists(self, vectors: np.ndarray, n: int) -> np.ndarray:
+        scores = vectors @ self.centroids.T
+        if n >= scores.shape[1]:
+            return np.argsort(-scores, axis=1)
+        nearest = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        order = np.argsort(-np.take_along_axis(scores, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def _inverted_lists(self) -> list:
+        if self._lists is None:
+            live = np.flatnonzero(self.assignments >= 0)
+            order = live[np.argsort(self.assignments[live], kind="stable")]
+            bounds = np.cumsum(np.bincount(self.assignments[live], minlength=self.n_lists))
+            self._lists = np.split(order, bounds[:-1])
+        return self._lists
+
+    def _open_vectors(self, n: int) -> np.ndarray:
+        return np.memmap(os.path.join(self.directory, "vectors.bin"), dtype=np.float32, mode="r",
+                         shape=(n, self.dim))
+
+    def _write_metadata(self):
+        np.save(os.path.join(self.directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(self.directory, "assignments.npy"), self.assignments)
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "rows": len(self.keys), "n_lists": self.n_lists, **self.extra}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "VectorIndex":
+        """
+        Open a saved index; vectors stay on disk and are paged in by the memory map.
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        dim, n_rows, n_lists = meta.pop("dim"), meta.pop("rows"), meta.pop("n_lists")
+        index = cls(dim, directory, n_lists, extra=meta)
+        index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        index.assignments = np.load(os.path.join(directory, "assignments.npy"))
+        with open(os.path.join(directory, "keys.txt"), encoding="utf-8") as f:
+            index.keys = f.read().splitlines()[:n_rows]
+        index.rows = {key: row for row, key in enumerate(index.keys) if index.assignments[row] >= 0}
+        fingerprints_path = os.path.join(directory, "fingerprints.txt")
+        if os.path.exists(fingerprints_path):
+            with open(fingerprints_path, encoding="utf-8") as f:
+                fingerprints = f.read().splitlines()[:n_rows]
+            index.fingerprints = {key: fingerprints[row] for key, row in index.rows.items()}
+        index.vectors = index._open_vectors(n_rows) if n_rows else np.zeros((0, dim), dtype=np.float32)
+        return index
+
+
+def listing_fingerprints(frame: pd.DataFrame) -> pd.Series:
+    """
+    Hash of the fields each row's vector is built from.
+    """
+    hashes = pd.util.hash_pandas_object(frame[VECTOR_INPUTS], index=False).to_numpy()
+    return pd.Series([f"{value:016x}" for value in hashes], index=frame.index)
+
+
+def listing_keys(frame: pd.DataFrame, fingerprints: pd.Series = None) -> pd.Series:
+    """
+    Index keys: the Listing URL where it is present and unique. Preprocessing fills missing
+    URLs with the most common one (or 'N/A'), so shared URLs fall back to the row's fingerprint.
+    """
+    fingerprints = listing_fingerprints(frame) if fingerprints is None else fingerprints
+    urls = frame["Listing URL"].astype(str)
+    usable = (urls != "N/A") & ~urls.duplicated(keep=False)
+    return urls.where(usable, "row:" + fingerprints)
+
+
+def _store_vectors(store: FeatureStore, scaler: dict, rows=slice(None)) -> np.ndarray:
+    return listing_vectors(store.groups["title_emb"].matrix[rows], store.groups["loc_emb"].matrix[rows],
+                           store.frame.iloc[rows], scaler)
+
+
+def build_similar_index(store: FeatureStore, directory: str = SIMILAR_INDEX_DIR) -> VectorIndex:
+    """
+    Build a fresh index over every listing in a FeatureStore, keyed by listing_keys.
+    """
+    if directory and os.path.isdir(directory):
+        for name in INDEX_FILES:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+    scaler = fit_numeric_scaler(store.frame)
+    vectors = _store_vectors(store, scaler)
+    fingerprints = listing_fingerprints(store.frame)
+    keys = listing_keys(store.frame, fingerprints)
+    # Rows sharing a key are identical listings and would only replace each other
+    unique = ~keys.duplicated().to_numpy()
+    index = VectorIndex(vectors.shape[1], directory, extra={"scaler": scaler})
+    index.add(keys[unique].tolist(), vectors[unique], fingerprints[unique].tolist())
+    print(f"[SIMILAR] Indexed {len(index)} listings.")
+    return index
+
+
+def update_similar_index(index: VectorIndex, store: FeatureStore) -> int:
+    """
+    Insert listings that are not indexed yet, re-embed those whose content changed since
+    they were indexed and drop those no longer in the store; returns how many rows were written.
+    The quantizer is not retrained, so rebuild once the index has grown several-fold.
+    """
+    fingerprints = listing_fingerprints(store.frame)
+    keys = listing_keys(store.frame, fingerprints)
+    indexed = keys.map(index.fingerprints)
+    new = indexed.isna()
+    changed = ~new & (indexed != fingerprints)
+    stale = np.flatnonzero(((new | changed) & ~keys.duplicated()).to_numpy())
+    if len(stale):
+        index.add(keys.iloc[stale].tolist(), _store_vectors(store, index.extra["scaler"], stale),
+                  fingerprints.iloc[stale].tolist())
+    gone = list(set(index.rows) - set(keys))
+    index.remove(gone)
+    print(f"[SIMILAR] Inserted {int(new.sum())} new, updated {int(changed.sum())} changed "
+          f"and dropped {len(gone)} removed listings.")
+    return len(stale)
+
+
+def open_similar_index(store: FeatureStore, directory: str = SIMILAR_INDEX_DIR) -> VectorIndex:
+    """
+    Load the saved index and insert new or changed listings, or build it on first use
+    (or when it predates row fingerprints).
+    """
+    if all(os.path.exists(os.path.join(directory, name)) for name in ["meta.json", "fingerprints.txt"]):
+        index = VectorIndex.load(directory)
+        update_similar_index(index, store)
+        return index
+    return build_similar_index(store, directory)
+
+
+def similar_listings(index: VectorIndex, store: FeatureStore, row: int, k: int = 5,
+                     exact: bool = False, nprobe: int = 8) -> pd.DataFrame:
+    """
+    The k listings most comparable to row `row` of the store (the listing itself excluded),
+    with their cosine similarity.
+    """
+    query = _store_vectors(store, index.extra["scaler"], [row])
+    search = index.search_exact if exact else index.search
+    kwargs = {} if exact else {"nprobe": nprobe}
+    keys, scores = search(query, k=k + 1, **kwargs)
+    store_keys = listing_keys(store.frame)
+    own_key = store_keys.iloc[row]
+    matches = [(key, score) for key, score in zip(keys[0], scores[0]) if key != own_key][:k]
+
+    result = pd.DataFrame(matches, columns=["_key", "Similarity"])
+    result = result.merge(store.frame.assign(_key=store_keys).drop_duplicates("_key"), on="_key", how="left")
+    return result[["Listing URL", "Similarity"] + [col for col in store.frame if col != "Listing URL"]]
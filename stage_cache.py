@@ -0,0 +1,234 @@
+# stage_cache.py
+
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from instrumentation import row_count, span
+
+CACHE_DIR = ".cache/stages"
+
+_file_hashes = {}
+_default_cache = None
+
+# id(result) -> (weakref to result, stage key); lets a cached result be passed
+# to the next stage without re-hashing its contents. Results are treated as immutable.
+_result_keys = {}
+
+
+def file_hash(path: str) -> str:
+    """
+    Content hash of a file, memoised on (size, mtime) so unchanged files are not re-read.
+    """
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if signature not in _file_hashes:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[signature] = digest.hexdigest()
+    return _file_hashes[signature]
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """
+    Content hash of a DataFrame's values, index, columns and dtypes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def array_hash(array) -> str:
+    """
+    Content hash of a dense array or scipy sparse matrix.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{type(array).__name__}{array.shape}{array.dtype}".encode("utf-8"))
+    if sparse.issparse(array):
+        array = array.tocsr()
+        parts = (array.data, array.indices, array.indptr)
+    else:
+        parts = (array,)
+    for part in parts:
+        digest.update(np.ascontiguousarray(part).tobytes())
+    return digest.hexdigest()
+
+
+def value_hash(value) -> str:
+    """
+    Hash a stage argument: data files and frames by content, everything else by repr.
+    Objects may provide their own content_hash() method, and results returned by a
+    cached stage are identified by that stage's key.
+    """
+    known = _result_keys.get(id(value))
+    if known is not None and known[0]() is value:
+        return "result:" + known[1]
+    if hasattr(value, "content_hash"):
+        return value.content_hash()
+    if isinstance(value, pd.DataFrame):
+        return frame_hash(value)
+    if isinstance(value, pd.Series):
+        return frame_hash(value.to_frame())
+    if isinstance(value, np.ndarray) or sparse.issparse(value):
+        return array_hash(value)
+    if isinstance(value, str) and os.path.isfile(value):
+        return "file:" + file_hash(value)
+    if isinstance(value, str) and os.path.isdir(value):
+        # A dataset directory, e.g. the Parquet parts written by a scrape sink
+        return "dir:" + ",".join(f"{name}={file_hash(os.path.join(value, name))}"
+                                 for name in sorted(os.listdir(value))
+                                 if os.path.isfile(os.path.join(value, name)))
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(value_hash(item) for item in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{k!r}:{value_hash(v)}" for k, v in sorted(value.items(), key=lambda kv: repr(kv[0]))) + "}"
+    return repr(value)
+
+
+def stage_key(stage: str, *args, **kwargs) -> str:
+    parts = [stage] + [value_hash(arg) for arg in args]
+    parts += [f"{name}={value_hash(value)}" for name, value in sorted(kwargs.items())]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=20).hexdigest()
+
+
+class StageCache:
+    """
+    Two-tier LRU cache for pipeline stage results: an in-process tier holding live
+    objects and a pickle-per-entry disk tier that survives restarts.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_memory_items: int = 32,
+                 max_disk_bytes: int = 2 * 1024 ** 3):
+        self.directory = directory
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key: str):
+        """
+        Return (hit, value), promoting disk hits into memory.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return True, self._memory[key]
+
+        path = self._disk_path(key)
+        if self.max_disk_bytes and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except Exception as e:
+                print(f"[CACHE] Dropping unreadable entry {key}: {e}")
+                os.remove(path)
+                return False, None
+            os.utime(path)
+            self._remember(key, value)
+            return True, value
+
+        return False, None
+
+    def put(self, key: str, value):
+        self._remember(key, value)
+        if not self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            # Some results (e.g. open handles) cannot be pickled; keep them in memory only
+            print(f"[CACHE] Not persisting {key}: {e}")
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            return
+        self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+def _remember_result(value, key: str):
+    try:
+        ref = weakref.ref(value, lambda _, obj_id=id(value): _result_keys.pop(obj_id, None))
+    except TypeError:
+        return
+    _result_keys[id(value)] = (ref, key)
+
+
+def get_default_cache() -> StageCache:
+    """
+    Process-wide cache shared by every Streamlit rerun and session.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = StageCache()
+    return _default_cache
+
+
+def cached_stage(name: str, cache: StageCache = None):
+    """
+    Decorator that reuses a stage's result while its inputs (by content) and parameters are unchanged.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"stage.{name}") as current:
+                store = cache or get_default_cache()
+                key = stage_key(name, *args, **kwargs)
+                hit, value = store.get(key)
+                if hit:
+                    print(f"[CACHE] Reusing '{name}' result.")
+                else:
+                    value = fn(*args, **kwargs)
+                    store.put(key, value)
+                _remember_result(value, key)
+                current.attrs["cache_hit"] = hit
+                current.rows = row_count(value)
+                return value
+
+        wrapper.uncached = fn
+        return wrapper
+
+    return decorator
@@ -0,0 +1,268 @@
+# storage.py
+
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from preprocessing import preprocess
+
+LISTING_COLUMNS = ["Title", "Price", "Price/m²", "Location", "Area",
+                   "Bedrooms", "Bathrooms", "Image URL", "Listing URL"]
+
+NUMERIC_COLUMNS = ["Price", "Price/m²", "Area", "Bedrooms", "Bathrooms"]
+
+# Typed schema for cleaned listings, so loads never re-parse strings into numbers
+CLEAN_SCHEMA = pa.schema([
+    ("Title", pa.string()),
+    ("Price", pa.float64()),
+    ("Price/m²", pa.float64()),
+    ("Location", pa.string()),
+    ("Area", pa.float64()),
+    ("Bedrooms", pa.float64()),
+    ("Bathrooms", pa.float64()),
+    ("Image URL", pa.string()),
+    ("Listing URL", pa.string()),
+    ("Duplicate Group", pa.int64()),
+])
+
+SNAPSHOT_PATH = "data/aqarmap_listings.parquet"
+
+ARROW_EXTENSIONS = (".arrow", ".feather")
+
+
+class CsvSink:
+    """
+    Append listing records to a CSV file chunk by chunk.
+    Chunks go to '<path>.partial', which replaces `path` only on close(commit=True) once
+    something was written, so a failed or interrupted crawl never touches the existing file.
+    append=True continues the partial file of an interrupted crawl.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.partial_path = path + ".partial"
+        _ensure_parent(path)
+        _start_partial(self.partial_path, append)
+
+    def write(self, records: list):
+        if not records:
+            return
+        write_header = not os.path.exists(self.partial_path) or os.path.getsize(self.partial_path) == 0
+        chunk = pd.DataFrame(records, columns=LISTING_COLUMNS)
+        with open(self.partial_path, "a", encoding="utf-8", newline="") as f:
+            chunk.to_csv(f, header=write_header, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self, commit: bool = True):
+        """
+        Publish the partial file over `path`; commit=False keeps it for a resumed crawl.
+        """
+        if commit and os.path.exists(self.partial_path) and os.path.getsize(self.partial_path) > 0:
+            os.replace(self.partial_path, self.path)
+
+
+class JsonlSink:
+    """
+    Append listing records to a JSON Lines file, one record per line.
+    Written through '<path>.partial' like CsvSink.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.partial_path = path + ".partial"
+        _ensure_parent(path)
+        _start_partial(self.partial_path, append)
+        self._file = open(self.partial_path, "a", encoding="utf-8")
+
+    def write(self, records: list):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, commit: bool = True):
+        self._file.close()
+        if commit and os.path.getsize(self.partial_path) > 0:
+            os.replace(self.partial_path, self.path)
+        elif commit:
+            os.remove(self.partial_path)
+
+
+class ParquetSink:
+    """
+    Write each chunk as a part file in a Parquet dataset directory.
+    Part files make appends after a resume safe, since Parquet files cannot be reopened for writing.
+    Parts go to '<path>.partial', which replaces the dataset on close(commit=True) like CsvSink.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.partial_path = path + ".partial"
+        if not append and os.path.isdir(self.partial_path):
+            shutil.rmtree(self.partial_path)
+        os.makedirs(self.partial_path, exist_ok=True)
+        self._next_part = len(self._parts())
+
+    def _parts(self) -> list:
+        return sorted(name for name in os.listdir(self.partial_path) if name.endswith(".parquet"))
+
+    def write(self, records: list):
+        if not records:
+            return
+        chunk = pd.DataFrame(records, columns=LISTING_COLUMNS).astype("string")
+        part_path = os.path.join(self.partial_path, f"part-{self._next_part:05d}.parquet")
+        chunk.to_parquet(part_path + ".tmp", index=False)
+        os.replace(part_path + ".tmp", part_path)
+        self._next_part += 1
+
+    def close(self, commit: bool = True):
+        if commit and self._parts():
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.replace(self.partial_path, self.path)
+        elif commit:
+            shutil.rmtree(self.partial_path)
+
+
+SINKS = {
+    ".csv": CsvSink,
+    ".jsonl": JsonlSink,
+    ".parquet": ParquetSink,
+}
+
+
+def open_sink(path: str, checkpoint=None):
+    """
+    Pick a sink from the file extension (.csv, .jsonl or .parquet), resuming the crawl
+    recorded in `checkpoint` when its partial output survived. A checkpoint whose partial
+    output is gone is reset, since the pages it lists were never published.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Unsupported sink '{ext}'. Choose one of: {', '.join(SINKS)}")
+    append = checkpoint is not None and checkpoint.in_progress
+    if append and not os.path.exists(path + ".partial"):
+        print("[INFO] The checkpointed crawl left no partial output; starting over.")
+        checkpoint.clear()
+        append = False
+    return SINKS[ext](path, append=append)
+
+
+class CrawlCheckpoint:
+    """
+    Record which pages have been durably written so an interrupted crawl can resume.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.completed = set(json.load(f).get("completed_pages", []))
+
+    @property
+    def in_progress(self) -> bool:
+        return bool(self.completed)
+
+    def mark_done(self, pages):
+        self.completed.update(pages)
+        _ensure_parent(self.path)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed_pages": sorted(self.completed)}, f)
+        os.replace(tmp_path, self.path)
+
+    def pending(self, pages) -> list:
+        return [page for page in pages if page not in self.completed]
+
+    def clear(self):
+        self.completed = set()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def save_listings(df: pd.DataFrame, path: str = SNAPSHOT_PATH) -> str:
+    """
+    Write cleaned listings with the typed schema.
+    '.parquet' gives a compressed file with row-group statistics for predicate pushdown;
+    '.arrow' / '.feather' gives an uncompressed Arrow IPC file that can be memory-mapped.
+    """
+    # Frames preprocessed with dedup=False carry no 'Duplicate Group' column
+    schema = pa.schema([field for field in CLEAN_SCHEMA if field.name in df.columns])
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+    _ensure_parent(path)
+    tmp_path = path + ".tmp"
+    if path.endswith(ARROW_EXTENSIONS):
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table, max_chunksize=64_000)
+    else:
+        pq.write_table(table, tmp_path, compression="zstd", row_group_size=64_000)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Saved {table.num_rows} listings to {path}.")
+    return path
+
+
+def load_listings(path: str = SNAPSHOT_PATH, columns: list = None, filters=None,
+                  memory_map: bool = True) -> pd.DataFrame:
+    """
+    Load cleaned listings, reading only `columns` and rows matching `filters`.
+    Filters use the pyarrow DNF form, e.g. [("Location", "in", ["Madinaty"]), ("Price", "<", 5e6)].
+    """
+    expression = pq.filters_to_expression(filters) if filters else None
+
+    if path.endswith(ARROW_EXTENSIONS):
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        table = pa.ipc.open_file(source).read_all()
+        if expression is not None:
+            table = table.filter(expression)
+        if columns:
+            table = table.select(columns)
+    else:
+        table = pq.read_table(path, columns=columns, filters=expression, memory_map=memory_map)
+
+    return table.to_pandas()
+
+
+def snapshot_columns(path: str) -> list:
+    """
+    Column names stored in a snapshot, read from its footer/schema only.
+    """
+    if path.endswith(ARROW_EXTENSIONS):
+        with pa.memory_map(path, "r") as source:
+            return pa.ipc.open_file(source).schema.names
+    return pq.read_schema(path).names
+
+
+def load_clean_listings(csv_path: str, snapshot_path: str = SNAPSHOT_PATH, columns: list = None,
+                        filters=None) -> pd.DataFrame:
+    """
+    Return cleaned listings from the typed snapshot, rebuilding it only when the CSV is newer
+    or the snapshot predates a column of CLEAN_SCHEMA.
+    """
+    stale = (not os.path.exists(snapshot_path)
+             or (os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(snapshot_path))
+             or not set(CLEAN_SCHEMA.names) <= set(snapshot_columns(snapshot_path)))
+    if stale:
+        df = preprocess(csv_path)
+        if df.empty:
+            return df
+        save_listings(df, snapshot_path)
+    return load_listings(snapshot_path, columns=columns, filters=filters)
+
+
+def _start_partial(partial_path: str, append: bool):
+    # A fresh crawl drops a stale partial file; a resumed one keeps writing to it
+    if not append and os.path.exists(partial_path):
+        os.remove(partial_path)
+
+
+def _ensure_parent(path: str):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
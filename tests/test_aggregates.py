@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import BINS, LEVELS, METRICS, AggregateCube, GroupSketch, load_cube
+from benchmarks import synthetic_clean_listings
+
+
+def _listings(n_rows: int = 4_000) -> pd.DataFrame:
+    df, _ = synthetic_clean_listings(n_rows, seed=3)
+    # Few locations so groups hold many rows, and some gaps the sketches must skip
+    df["Location"] = "Compound " + (np.arange(n_rows) % 7).astype(str)
+    df["Price/m²"] = df["Price"] / df["Area"]
+    df.loc[::13, "Price"] = np.nan
+    df.loc[::17, "Bathrooms"] = np.nan
+    return df
+
+
+def _assert_same_sketch(actual: GroupSketch, expected: GroupSketch):
+    pd.testing.assert_frame_equal(actual.keys.reset_index(drop=True), expected.keys.reset_index(drop=True),
+                                  check_dtype=False)
+    np.testing.assert_array_equal(actual.count, expected.count)
+    for metric in METRICS:
+        np.testing.assert_array_equal(actual.hist[metric], expected.hist[metric])
+        np.testing.assert_allclose(actual.moments[metric], expected.moments[metric], rtol=1e-9)
+
+
+@pytest.mark.parametrize("level", list(LEVELS))
+def test_merged_sketches_equal_one_sketch_of_all_rows(level):
+    df = _listings()
+    # Uneven split, so some groups exist on one side only
+    first, second = df.iloc[:900], df.iloc[900:]
+    merged = GroupSketch.from_frame(first, LEVELS[level]).merge(GroupSketch.from_frame(second, LEVELS[level]))
+    _assert_same_sketch(merged, GroupSketch.from_frame(df, LEVELS[level]))
+
+
+def test_group_stats_match_pandas():
+    df = _listings()
+    stats = AggregateCube.build(df).stats("location", "Price")
+    expected = df.groupby("Location")["Price"].describe(percentiles=[0.1, 0.25, 0.5, 0.75, 0.9])
+    np.testing.assert_array_equal(stats["Listings"], df.groupby("Location").size())
+    for column in ["count", "min", "max"]:
+        np.testing.assert_array_equal(stats[column], expected[column])
+    for column in ["mean", "std"]:
+        np.testing.assert_allclose(stats[column], expected[column], rtol=1e-9)
+
+    # Quantiles come from log-spaced bins and are within one bin of the exact value
+    _, low, high, bins = BINS["Price"]
+    bin_ratio = (high / low) ** (1 / bins)
+    ratio = stats[["10%", "25%", "50%", "75%", "90%"]].to_numpy() / expected[["10%", "25%", "50%", "75%", "90%"]].to_numpy()
+    assert (ratio < bin_ratio).all() and (ratio > 1 / bin_ratio).all()
+
+
+def test_room_count_quantiles_are_exact():
+    df = _listings()
+    stats = AggregateCube.build(df).stats("location", "Bathrooms")
+    expected = df.groupby("Location")["Bathrooms"].quantile([0.1, 0.25, 0.5, 0.75, 0.9]).unstack()
+    np.testing.assert_allclose(stats[["10%", "25%", "50%", "75%", "90%"]], expected)
+
+
+def test_refresh_folds_in_new_rows_and_rebuilds_after_removals():
+    df = _listings()
+    cube = AggregateCube.build(df.iloc[:3_000])
+    assert cube.refresh(df.iloc[:3_000]) is cube
+
+    grown = cube.refresh(df)
+    whole = AggregateCube.build(df)
+    assert grown.content_hash() == whole.content_hash()
+    for name in LEVELS:
+        _assert_same_sketch(grown.levels[name], whole.levels[name])
+
+    shrunk = grown.refresh(df.iloc[500:])
+    _assert_same_sketch(shrunk.levels["location"], GroupSketch.from_frame(df.iloc[500:], ["Location"]))
+
+
+def test_saved_cube_loads_and_refreshes(tmp_path):
+    df = _listings()
+    directory = str(tmp_path / "aggregates")
+    built = load_cube(df.iloc[:3_000], directory)
+    reloaded = load_cube(df.iloc[:3_000], directory)
+    assert reloaded.content_hash() == built.content_hash()
+    for name in LEVELS:
+        _assert_same_sketch(reloaded.levels[name], built.levels[name])
+
+    load_cube(df, directory)
+    _assert_same_sketch(AggregateCube.load(directory).levels["location_bedrooms"],
+                        GroupSketch.from_frame(df, LEVELS["location_bedrooms"]))
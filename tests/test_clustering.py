@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.datasets import make_blobs
+
+from clustering import CRITERIA, _elbow_index, optimal_kmeans, run_clustering, scalable_kmeans
+from feature_store import FeatureStore
+
+
+def _blobs(n_rows: int = 3_000, centers: int = 4):
+    X, _ = make_blobs(n_samples=n_rows, centers=centers, n_features=8, cluster_std=0.5, random_state=0)
+    return X.astype(np.float32)
+
+
+@pytest.mark.parametrize("criterion", CRITERIA)
+def test_scalable_sweep_finds_the_generating_k(criterion):
+    model, best_k, best_score, scores = scalable_kmeans(_blobs(), 2, 7, criterion=criterion, sample_size=1_000,
+                                                        n_jobs=1)
+    assert best_k == 4 and model.n_clusters == 4
+    assert scores["k"].tolist() == [2, 3, 4, 5, 6, 7]
+    assert best_score == pytest.approx(scores.loc[scores["k"] == 4, "silhouette"].item())
+
+
+def test_scalable_sweep_agrees_with_the_exact_search():
+    X = _blobs(1_000)
+    _, exact_k, exact_score = optimal_kmeans(X, 2, 6)
+    _, scalable_k, scalable_score, _ = scalable_kmeans(X, 2, 6, sample_size=500, n_jobs=1)
+    assert scalable_k == exact_k == 4
+    assert scalable_score == pytest.approx(exact_score, abs=0.05)
+
+
+def test_scalable_sweep_accepts_sparse_features():
+    X = sparse.csr_matrix(np.maximum(_blobs(), 0))
+    _, best_k, _, scores = scalable_kmeans(X, 2, 5, sample_size=1_000, n_jobs=1)
+    assert 2 <= best_k <= 5 and scores["silhouette"].notna().all()
+
+
+def test_elbow_is_the_point_furthest_below_the_chord():
+    assert _elbow_index([100, 40, 15, 12, 10, 9]) == 2
+    assert _elbow_index([5, 3]) == 1
+
+
+def test_unknown_criterion_is_rejected():
+    with pytest.raises(ValueError):
+        scalable_kmeans(_blobs(100), criterion="gap")
+
+
+def test_run_clustering_switches_to_the_scalable_sweep_on_request():
+    X = _blobs(600)
+    store = FeatureStore(pd.DataFrame({"Price": np.arange(len(X), dtype=float)}))
+    store.add_group("loc_emb", X, [f"loc_emb_{i}" for i in range(X.shape[1])])
+    exact, _, exact_k, _ = run_clustering(store, groups=["loc_emb"], k_min=2, k_max=6, scalable=False)
+    scaled, _, scaled_k, _ = run_clustering(store, groups=["loc_emb"], k_min=2, k_max=6, scalable=True)
+    assert exact_k == scaled_k == 4
+    # Same partition up to label names
+    assert pd.crosstab(exact["Cluster"], scaled["Cluster"]).gt(0).sum(axis=1).eq(1).all()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic_clean_listings
+from dedup import deduplicate, find_duplicate_groups, mark_duplicates
+
+
+def _listing(title="Apartment for sale in Mivida", price=3_250_000.0, location="New Cairo, Mivida", area=130.0,
+             bedrooms=3.0, image="https://img.aqarmap.com.eg/search-thumb-webp/4812001.jpg", url="https://aqarmap/1"):
+    return {"Title": title, "Price": price, "Price/m²": price / area, "Location": location, "Area": area,
+            "Bedrooms": bedrooms, "Bathrooms": 2.0, "Image URL": image, "Listing URL": url}
+
+
+def _groups(*listings) -> list:
+    return find_duplicate_groups(pd.DataFrame(list(listings))).tolist()
+
+
+def test_reposts_with_cosmetic_edits_are_exact_duplicates():
+    repost = _listing(title="APARTMENT for sale in  Mivida!", location="new cairo - mivida",
+                      image="https://img.aqarmap.com.eg/other.jpg", url="https://aqarmap/2")
+    assert len(set(_groups(_listing(), repost))) == 1
+
+
+def test_near_duplicates_need_similar_text_and_close_numbers():
+    nudged = _listing(price=3_280_000.0, image="https://img.aqarmap.com.eg/full/4812001.webp", url="https://aqarmap/2")
+    assert len(set(_groups(_listing(), nudged))) == 1
+
+    other_price = _listing(price=3_600_000.0, url="https://aqarmap/3")
+    other_rooms = _listing(bedrooms=4.0, url="https://aqarmap/4")
+    other_place = _listing(title="Villa for sale in Sheikh Zayed", location="Sheikh Zayed, Allegria",
+                           image="https://img.aqarmap.com.eg/9.jpg", url="https://aqarmap/5")
+    assert len(set(_groups(_listing(), other_price, other_rooms, other_place))) == 4
+
+
+def test_missing_values_do_not_link_unrelated_listings():
+    first = _listing(title="Studio", location=None, image=None, price=np.nan)
+    second = _listing(title="Clinic", location=None, image=None, price=np.nan, url="https://aqarmap/2")
+    assert len(set(_groups(first, second))) == 2
+
+
+def test_injected_duplicates_land_with_their_source():
+    df, source = synthetic_clean_listings(20_000)
+    groups = find_duplicate_groups(df)
+    injected = np.flatnonzero(source != np.arange(len(df)))
+    assert (groups[injected] == groups[source[injected]]).mean() > 0.97
+    assert (pd.Series(source).groupby(groups).nunique() > 1).sum() <= 0.001 * len(df)
+
+
+def test_deduplicate_keeps_the_first_row_of_each_group():
+    df = pd.DataFrame([_listing(), _listing(url="https://aqarmap/2"), _listing(bedrooms=4.0, url="https://aqarmap/3")])
+    marked = mark_duplicates(df)
+    assert marked["Duplicate Group"].nunique() == 2
+    deduped = deduplicate(marked)
+    assert deduped["Listing URL"].tolist() == ["https://aqarmap/1", "https://aqarmap/3"]
+    assert deduped.index.tolist() == [0, 1]
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+import nlp_features
+from embedding_cache import EmbeddingCache
+from nlp_features import EMBEDDING_DIM, embed_texts
+from sbert_backends import STUB_BACKEND
+
+
+def _vectors(texts: list, dim: int = 4) -> np.ndarray:
+    return np.array([[len(text) + i for i in range(dim)] for text in texts], dtype=np.float32)
+
+
+def _cached(cache: EmbeddingCache, texts: list) -> list:
+    _, missing = cache.lookup(texts)
+    return [text for pos, text in enumerate(texts) if pos not in missing]
+
+
+def test_full_cache_evicts_the_least_recently_used_strings(tmp_path):
+    cache = EmbeddingCache("model", dim=4, directory=str(tmp_path), dtype="float32", max_entries=3)
+    cache.store(["a", "bb", "ccc"], _vectors(["a", "bb", "ccc"]))
+    cache.lookup(["a"])
+    cache.store(["dddd"], _vectors(["dddd"]))
+    assert len(cache) == 3
+    assert _cached(cache, ["a", "bb", "ccc", "dddd"]) == ["a", "ccc", "dddd"]
+
+    vectors, missing = cache.lookup(["dddd", "a"])
+    assert missing == []
+    np.testing.assert_array_equal(vectors, _vectors(["dddd", "a"]))
+
+
+def test_batch_larger_than_the_cache_keeps_its_last_strings(tmp_path):
+    cache = EmbeddingCache("model", dim=4, directory=str(tmp_path), dtype="float32", max_entries=2)
+    texts = ["a", "bb", "ccc", "dddd"]
+    cache.store(texts, _vectors(texts))
+    assert _cached(cache, texts) == ["ccc", "dddd"]
+
+
+def test_reopened_cache_keeps_vectors_and_recency(tmp_path):
+    cache = EmbeddingCache("model", dim=4, directory=str(tmp_path), max_entries=4)
+    cache.store(["a", "bb", "ccc"], _vectors(["a", "bb", "ccc"]))
+    cache.lookup(["a"])
+    cache.store(["dddd"], _vectors(["dddd"]))
+
+    reopened = EmbeddingCache("model", dim=4, directory=str(tmp_path), max_entries=4)
+    assert len(reopened) == 4
+    np.testing.assert_array_equal(reopened.lookup(["ccc"])[0], _vectors(["ccc"]).astype(np.float16))
+    # 'a' was read after 'bb' was stored, so 'bb' is the oldest use and goes first
+    reopened.store(["eeeee"], _vectors(["eeeee"]))
+    assert _cached(reopened, ["a", "bb", "ccc", "dddd", "eeeee"]) == ["a", "ccc", "dddd", "eeeee"]
+
+
+def test_cache_with_another_dimension_starts_empty(tmp_path):
+    EmbeddingCache("model", dim=4, directory=str(tmp_path)).store(["a"], _vectors(["a"]))
+    assert len(EmbeddingCache("model", dim=8, directory=str(tmp_path))) == 0
+
+
+def test_embed_texts_encodes_each_distinct_string_once(tmp_path, monkeypatch):
+    encoded = []
+    encode = nlp_features.encode
+
+    def counting_encode(texts, model_name, backend):
+        encoded.append(list(texts))
+        return encode(texts, model_name, backend)
+
+    monkeypatch.setattr(nlp_features, "encode", counting_encode)
+    cache = EmbeddingCache("stub", dim=EMBEDDING_DIM, directory=str(tmp_path))
+    texts = pd.Series(["Maadi", "Mivida", None, "Maadi", "Mivida"])
+
+    first = embed_texts(texts, cache, STUB_BACKEND)
+    assert sorted(encoded[0]) == ["", "Maadi", "Mivida"]
+    np.testing.assert_array_equal(first[0], first[3])
+
+    second = embed_texts(texts, cache, STUB_BACKEND)
+    assert len(encoded) == 1
+    np.testing.assert_array_equal(first, second)
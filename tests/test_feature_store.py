@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from feature_store import FeatureStore
+
+
+def _store() -> FeatureStore:
+    frame = pd.DataFrame({"Location": ["Maadi", "Mivida", "Sarai"], "Price": [1.5e6, 3e6, 2.2e6]}, index=[7, 8, 9])
+    store = FeatureStore(frame)
+    store.add_group("loc_emb", np.arange(6, dtype=np.float32).reshape(3, 2), ["loc_emb_0", "loc_emb_1"])
+    store.add_group("loc_tfidf", sparse.csr_matrix(np.array([[0.0, 1.0, 0.0], [0.5, 0.0, 0.0], [0.0, 0.0, 0.0]])),
+                    ["maadi", "mivida", "sarai"])
+    return store
+
+
+def test_content_hash_is_equal_for_equal_stores():
+    assert _store().content_hash() == _store().content_hash()
+
+
+def test_content_hash_changes_with_every_part_of_the_store():
+    base = _store().content_hash()
+
+    edited_frame = _store()
+    edited_frame.frame.loc[0, "Price"] = 1.6e6
+    dense = _store()
+    dense.groups["loc_emb"].matrix[2, 1] = 0.5
+    sparse_value = _store()
+    sparse_value.groups["loc_tfidf"].matrix.data[0] = 0.9
+    sparse_position = _store()
+    sparse_position.add_group("loc_tfidf", sparse.csr_matrix(np.array([[0.0, 0.0, 1.0], [0.5, 0.0, 0.0], [0.0, 0.0, 0.0]])),
+                              ["maadi", "mivida", "sarai"])
+    renamed = _store()
+    renamed.groups["title_emb"] = renamed.groups.pop("loc_emb")
+    relabelled = _store()
+    relabelled.groups["loc_emb"].columns = ["a", "b"]
+
+    hashes = [store.content_hash() for store in (edited_frame, dense, sparse_value, sparse_position, renamed, relabelled)]
+    assert base not in hashes
+    assert len(set(hashes)) == len(hashes)
+
+
+def test_matrix_stays_sparse_unless_dense_is_requested():
+    store = _store()
+    stacked = store.matrix()
+    assert sparse.isspmatrix_csr(stacked) and stacked.dtype == np.float32 and stacked.shape == (3, 5)
+    dense = store.matrix(dense=True)
+    assert isinstance(dense, np.ndarray)
+    np.testing.assert_array_equal(dense, stacked.toarray())
+    assert isinstance(store.matrix(["loc_emb"]), np.ndarray)
+    assert store.columns(["loc_tfidf", "loc_emb"]) == ["maadi", "mivida", "sarai", "loc_emb_0", "loc_emb_1"]
+
+
+def test_to_frame_matches_the_wide_layout():
+    frame = _store().to_frame()
+    assert frame.columns.tolist() == ["Location", "Price", "loc_emb_0", "loc_emb_1", "maadi", "mivida", "sarai"]
+    assert frame.index.tolist() == [0, 1, 2]
+    assert frame.loc[1, "maadi"] == 0.5 and frame.loc[2, "loc_emb_1"] == 5.0
+
+
+def test_groups_must_match_the_rows_and_names():
+    store = _store()
+    with pytest.raises(ValueError):
+        store.add_group("title_emb", np.zeros((2, 2)), ["a", "b"])
+    with pytest.raises(ValueError):
+        store.add_group("title_emb", np.zeros((3, 2)), ["a"])
+    with pytest.raises(KeyError):
+        store.matrix(["title_emb"])
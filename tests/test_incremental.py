@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from incremental import holdout_mask, training_row_hashes, update_models
+from registry import latest_version, list_versions, load_models
+
+
+def _listings(n_rows: int, seed: int, price_scale: float = 1.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Price/m²": rng.uniform(10_000, 60_000, n_rows), "Area": rng.uniform(50, 300, n_rows),
+                       "Bedrooms": rng.integers(1, 5, n_rows).astype(float),
+                       "Bathrooms": rng.integers(1, 4, n_rows).astype(float)})
+    df["Price"] = df["Price/m²"] * df["Area"] * price_scale
+    df["Listing URL"] = [f"https://aqarmap.com.eg/en/listing/{seed}-{i}/" for i in range(n_rows)]
+    return df
+
+
+def _updates(fitted: list) -> set:
+    return {metrics["Update"] for _, metrics in fitted}
+
+
+def _state(registry_dir: str) -> dict:
+    return load_models(registry_dir=registry_dir)[0]["incremental"]
+
+
+def test_holdout_rows_stay_fixed_as_the_data_grows():
+    base, grown = _listings(400, 0), pd.concat([_listings(400, 0), _listings(100, 1)], ignore_index=True)
+    base_holdout = holdout_mask(training_row_hashes(base, "Price"))
+    grown_holdout = holdout_mask(training_row_hashes(grown, "Price"))
+    np.testing.assert_array_equal(grown_holdout[:400], base_holdout)
+    assert 0.05 < grown_holdout.mean() < 0.15
+
+    edited = base.copy()
+    edited.loc[0, "Price"] += 1
+    assert training_row_hashes(edited, "Price")[0] != training_row_hashes(base, "Price")[0]
+
+
+def test_updates_fold_in_new_rows_until_the_scheduled_refit(tmp_path):
+    registry_dir = str(tmp_path / "models")
+    # Forest trees grown on a few dozen rows can trip the drift check; this test is about the schedule
+    schedule_only = {"full_refit_every": 3, "drift_tolerance": float("inf")}
+    days = [pd.concat([_listings(600, 0)] + [_listings(60, day) for day in range(1, n + 1)], ignore_index=True)
+            for n in range(4)]
+
+    fitted, _ = update_models(days[0], "Price", registry_dir=registry_dir, **schedule_only)
+    assert _updates(fitted) == {"full"}
+    assert _state(registry_dir) == {"updates_since_full": 0, "baseline_rows": int(holdout_mask(
+        training_row_hashes(days[0], "Price")).sum()), "last_reason": "no incremental state"}
+    first_version = latest_version(registry_dir)
+
+    # Nothing new: the registered models are returned as they are
+    fitted, _ = update_models(days[0], "Price", registry_dir=registry_dir, **schedule_only)
+    assert {metrics["Version"] for _, metrics in fitted} == {first_version}
+    assert len(list_versions(registry_dir)) == 1
+
+    fitted, _ = update_models(days[1], "Price", registry_dir=registry_dir, **schedule_only)
+    assert _updates(fitted) == {"incremental"}
+    assert all(metrics["New rows"] == int((~holdout_mask(training_row_hashes(_listings(60, 1), "Price"))).sum())
+               for _, metrics in fitted)
+    assert all(np.isfinite(metrics["Drift"]) for _, metrics in fitted)
+    assert _state(registry_dir)["updates_since_full"] == 1
+
+    fitted, _ = update_models(days[2], "Price", registry_dir=registry_dir, **schedule_only)
+    assert _updates(fitted) == {"incremental"}
+    assert _state(registry_dir)["updates_since_full"] == 2
+
+    fitted, _ = update_models(days[3], "Price", registry_dir=registry_dir, **schedule_only)
+    assert _updates(fitted) == {"full"}
+    assert _state(registry_dir) == {**_state(registry_dir), "updates_since_full": 0,
+                                    "last_reason": "scheduled full refit"}
+    assert len(list_versions(registry_dir)) == len(days)
+
+
+def test_drift_on_the_baseline_holdout_forces_a_full_refit(tmp_path):
+    registry_dir = str(tmp_path / "models")
+    base = _listings(600, 0)
+    update_models(base, "Price", registry_dir=registry_dir)
+
+    # Listings arriving at twice the old prices pull the updated models away from the old holdout
+    shifted = pd.concat([base, _listings(600, 1, price_scale=2.0)], ignore_index=True)
+    fitted, _ = update_models(shifted, "Price", registry_dir=registry_dir)
+    assert _updates(fitted) == {"full"}
+    assert _state(registry_dir)["last_reason"].startswith("holdout MAE drift on ")
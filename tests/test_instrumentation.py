@@ -0,0 +1,63 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import instrumentation
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/clear_refs"),
+                                reason="needs a resettable VmHWM (Linux)")
+
+ALLOCATION_MB = 200
+
+
+def _allocate():
+    block = np.ones(ALLOCATION_MB * 2**20 // 8)
+    block[:] = 2.0
+    del block
+
+
+@pytest.fixture
+def recording():
+    instrumentation.clear()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.clear()
+
+
+def _by_name() -> dict:
+    return {record["name"]: record for record in instrumentation.spans()}
+
+
+def test_spans_in_a_worker_thread_reset_the_peak(recording):
+    # Streamlit runs the script in a ScriptRunner thread, not the main thread
+    with instrumentation.span("large"):
+        _allocate()
+
+    def run():
+        with instrumentation.span("outer"):
+            with instrumentation.span("inner"):
+                np.ones(1000)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    spans = _by_name()
+    assert spans["outer"]["peak_rss_mb"] < spans["large"]["peak_rss_mb"] - ALLOCATION_MB / 2
+    assert spans["inner"]["peak_rss_mb"] <= spans["outer"]["peak_rss_mb"]
+
+
+def test_open_span_keeps_its_peak_across_another_threads_reset(recording):
+    def run():
+        with instrumentation.span("other"):
+            pass
+
+    with instrumentation.span("parent"):
+        _allocate()
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    spans = _by_name()
+    assert spans["parent"]["peak_rss_mb"] > spans["other"]["peak_rss_mb"] + ALLOCATION_MB / 2
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from model import MODEL_NAMES, cross_validate_models
+
+
+def _listings(n_rows: int = 200, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Price/m²": rng.uniform(10_000, 60_000, n_rows), "Area": rng.uniform(50, 300, n_rows),
+                       "Bedrooms": rng.integers(1, 5, n_rows).astype(float),
+                       "Bathrooms": rng.integers(1, 4, n_rows).astype(float)})
+    df["Price"] = df["Price/m²"] * df["Area"] * rng.uniform(0.95, 1.05, n_rows)
+    return df
+
+
+def test_cross_validation_scores_every_model_on_every_fold():
+    folds = cross_validate_models(_listings(), "Price", n_splits=3, n_jobs=1)
+    assert len(folds) == 3 * len(MODEL_NAMES)
+    assert sorted(folds.groupby("Model")["Fold"].apply(sorted).tolist()) == [[0, 1, 2]] * len(MODEL_NAMES)
+    assert np.isfinite(folds[["MAE", "RMSE", "R2", "Fit time (s)"]].to_numpy()).all()
+    # The price is nearly a product of two features, so every model should explain most of it
+    assert (folds.groupby("Model")["R2"].mean() > 0.8).all()
@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+from pipeline import load_stage_output, prune_runs, run_pipeline, stage_order
+from sbert_backends import STUB_BACKEND
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "aqarmap_listings.csv")
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # Stages write their side outputs (snapshot, cube, embedding cache) under the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    shutil.copy(DATA, "data/listings.csv")
+    return str(tmp_path / "pipeline")
+
+
+def _run(directory: str, **kwargs) -> dict:
+    params = {"scrape": {"data": "data/listings.csv"}, "nlp": {"backend": STUB_BACKEND}}
+    return run_pipeline(["eda", "nlp"], params, directory=directory, workers=2, **kwargs)
+
+
+def _statuses(run: dict) -> dict:
+    return {name: result["status"] for name, result in run["stages"].items()}
+
+
+def test_stage_order_adds_upstream_stages():
+    assert stage_order(["clustering"]) == ["scrape", "preprocess", "nlp", "clustering"]
+    with pytest.raises(ValueError):
+        stage_order(["report"])
+
+
+def test_second_run_reuses_every_artifact(workspace):
+    first = _run(workspace)
+    assert _statuses(first) == {"scrape": "done", "preprocess": "done", "eda": "done", "nlp": "done"}
+
+    second = _run(workspace)
+    assert _statuses(second) == {"scrape": "done", "preprocess": "cached", "eda": "cached", "nlp": "cached"}
+    for stage in first["stages"]:
+        assert second["stages"][stage]["artifact"] == first["stages"][stage]["artifact"]
+    assert len(load_stage_output(second, "nlp")) == len(load_stage_output(second, "preprocess"))
+
+
+def test_reruns_follow_content_not_timestamps(workspace):
+    first = _run(workspace)
+
+    # Same bytes, newer file: the scrape output keeps its address, so nothing downstream reruns
+    os.utime("data/listings.csv", (1e9, 1e9))
+    assert _statuses(_run(workspace))["preprocess"] == "cached"
+
+    # A forced stage that reproduces its output leaves its dependents' inputs unchanged
+    forced = _run(workspace, force=["preprocess"])
+    assert forced["stages"]["preprocess"]["status"] == "done"
+    assert forced["stages"]["preprocess"]["artifact"] == first["stages"]["preprocess"]["artifact"]
+    assert forced["stages"]["nlp"]["status"] == "cached"
+
+    with open("data/listings.csv", encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    with open("data/listings.csv", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines[:-20]) + "\n")
+    shrunk = _run(workspace)
+    assert _statuses(shrunk) == {"scrape": "done", "preprocess": "done", "eda": "done", "nlp": "done"}
+    assert len(load_stage_output(shrunk, "preprocess")) < len(load_stage_output(first, "preprocess"))
+
+
+def test_a_failed_stage_skips_only_its_dependents(workspace):
+    run = run_pipeline(["eda", "nlp"], {"scrape": {"data": "data/missing.csv"}}, directory=workspace, workers=2)
+    assert _statuses(run) == {"scrape": "failed", "preprocess": "skipped", "eda": "skipped", "nlp": "skipped"}
+    assert "FileNotFoundError" in run["stages"]["scrape"]["error"]
+
+
+def test_pruning_drops_artifacts_of_old_runs_only(workspace):
+    first = _run(workspace)
+    with open("data/listings.csv", "a", encoding="utf-8") as f:
+        f.write("Studio for sale,\"1,000,000EGP\",\"-20,000EGP/m\",Greater Cairo / Maadi,50m²,1,1,N/A,N/A\n")
+    second = _run(workspace)
+
+    prune_runs(workspace, keep=1)
+    artifacts = set(os.listdir(os.path.join(workspace, "artifacts")))
+    assert {result["artifact"] + ".pkl" for result in second["stages"].values()} == artifacts
+    assert first["stages"]["nlp"]["artifact"] + ".pkl" not in artifacts
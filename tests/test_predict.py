@@ -0,0 +1,56 @@
+import json
+import threading
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from model import FEATURES, feature_engineering
+from predict import make_server
+from registry import save_models
+
+
+def _register(registry_dir: str, seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Price/m²": rng.uniform(10_000, 60_000, 50), "Area": rng.uniform(50, 300, 50),
+                       "Bedrooms": rng.integers(1, 5, 50).astype(float),
+                       "Bathrooms": rng.integers(1, 4, 50).astype(float)})
+    df["Price"] = df["Price/m²"] * df["Area"]
+    X = feature_engineering(df)[FEATURES]
+    model = RandomForestRegressor(n_estimators=5, random_state=seed).fit(X, df["Price"])
+    return save_models([(model, {"Model": "Random Forest"})], df, "Price", FEATURES,
+                       fill_values=X.mean().to_dict(), registry_dir=registry_dir)
+
+
+@pytest.fixture
+def server(tmp_path):
+    registry_dir = str(tmp_path / "models")
+    server = make_server(port=0, registry_dir=registry_dir)
+    server.first_version = _register(registry_dir, seed=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _predict(server, listing: dict) -> dict:
+    request = urllib.request.Request(server.url + "/predict", data=json.dumps(listing).encode("utf-8"))
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def test_server_follows_newly_registered_versions(server):
+    listing = {"Price/m²": 40000, "Area": 150, "Bedrooms": 3, "Bathrooms": 2}
+    assert _predict(server, listing)["version"] == server.first_version
+
+    second_version = _register(server.registry_dir, seed=2)
+    assert second_version != server.first_version
+    body = _predict(server, listing)
+    assert body["version"] == second_version
+    assert set(body["predictions"]) == {"Random Forest"}
+    with urllib.request.urlopen(server.url + "/health") as response:
+        assert json.load(response)["version"] == second_version
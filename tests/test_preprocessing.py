@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import legacy_preprocess
+from preprocessing import _digits_to_number, _first_number, _map_unique, preprocess
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "aqarmap_listings.csv")
+
+
+def _raw_listings() -> pd.DataFrame:
+    # The awkward shapes the scraper actually produces, each repeated so the unique-value path is exercised
+    rows = [
+        ["Apartment for sale", "8,000,000\n    EGP", "-35,555EGP/m", "Greater Cairo  /  Mivida", "225m²", "3", "3"],
+        ["Villa for sale", "12,500,000EGP", "-41,666EGP/m", "Greater Cairo / Palm Hills", "300mÂ²", "5", "4"],
+        ["Studio for sale", "N/A", "N/A", "Maadi", "N/A", "N/A", "1"],
+        ["Duplex for sale", "EGP", "", "Greater Cairo / Sarai", "Â² 180", "", "N/A"],
+        ["Apartment for sale", "8,000,000\n    EGP", "-35,555EGP/m", "Greater Cairo  /  Mivida", "225m²", "3", "3"],
+    ]
+    columns = ["Title", "Price", "Price/m²", "Location", "Area", "Bedrooms", "Bathrooms"]
+    df = pd.DataFrame(rows * 3, columns=columns)
+    df["Image URL"] = "N/A"
+    df["Listing URL"] = [f"https://aqarmap.com.eg/en/listing/{i}/" for i in range(len(df))]
+    return df
+
+
+@pytest.mark.parametrize("source", ["saved", "edge_cases"])
+def test_vectorized_preprocess_matches_legacy_path(source, tmp_path):
+    if source == "saved":
+        path = DATA
+    else:
+        path = str(tmp_path / "listings.csv")
+        _raw_listings().to_csv(path, index=False)
+    pd.testing.assert_frame_equal(legacy_preprocess(path), preprocess(path, dedup=False), check_dtype=False)
+
+
+def test_digits_to_number_keeps_magnitudes_and_drops_digitless_text():
+    raw = pd.Series(["-35,555EGP/m", "8,000,000\n    EGP", "EGP", ""], dtype="string[pyarrow]")
+    parsed = _digits_to_number(raw).to_numpy(dtype="float64", na_value=np.nan)
+    np.testing.assert_array_equal(parsed, [35_555.0, 8_000_000.0, np.nan, np.nan])
+
+
+def test_map_unique_broadcasts_parsed_values_and_keeps_the_index():
+    raw = pd.Series(["225m²", np.nan, "130 m²", "225m²", "none"], index=[10, 11, 12, 13, 14], name="Area")
+    parsed = _map_unique(raw, _first_number)
+    assert parsed.name == "Area" and parsed.index.tolist() == [10, 11, 12, 13, 14]
+    np.testing.assert_array_equal(parsed.to_numpy(), [225.0, np.nan, 130.0, 225.0, np.nan])
+
+
+def test_map_unique_parses_each_distinct_value_once():
+    seen = []
+
+    def parse(uniques):
+        seen.append(len(uniques))
+        return _digits_to_number(uniques)
+
+    _map_unique(pd.Series(["1,000EGP", "2,000EGP"] * 500 + [np.nan]), parse)
+    assert seen == [2]
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from scraper import (DEFAULT_PARSER, PARSERS, SeenIndex, crawl_incremental, crawl_pages, parse_listings_page,
+                     scrape_to_sink, upsert_listings)
+from storage import CrawlCheckpoint, open_sink
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _page(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_reference_parse_of_saved_page():
+    listings = parse_listings_page(_page("listings_page.html"), "soup")
+    assert [listing["Title"] for listing in listings] == ["Apartment for sale inNew Cairo", "Studio for sale in Maadi"]
+    assert listings[0] == {
+        "Title": "Apartment for sale inNew Cairo",
+        "Price": "3,250,000EGP",
+        "Price/m²": "25,000 EGP/m2",
+        "Location": "New Cairo, Fifth Settlement",
+        "Area": "130 m²",
+        "Bedrooms": "3",
+        "Bathrooms": "2",
+        "Image URL": "https://img.aqarmap.com.eg/listing/4812001.jpg",
+        "Listing URL": "https://aqarmap.com.eg/en/listing/4812001-apartment-for-sale-in-new-cairo",
+    }
+    assert listings[1]["Listing URL"] == "N/A"
+
+
+@pytest.mark.parametrize("parser", list(PARSERS))
+def test_parsers_agree_on_saved_page(parser):
+    html = _page("listings_page.html")
+    assert parse_listings_page(html, parser) == parse_listings_page(html, "soup")
+
+
+def test_default_parser_matches_reference_on_malformed_markup():
+    # Unclosed tags build different trees in html.parser and lxml; the default must follow bs4
+    html = _page("listings_page_malformed.html")
+    assert parse_listings_page(html, DEFAULT_PARSER) == parse_listings_page(html, "soup")
+
+
+# --- Crawling against a local stand-in for Aqarmap ---
+
+@pytest.fixture
+def aqarmap_stub():
+    """
+    Local HTTP server answering '/?page=N' with the saved page; pages in `server.missing`
+    return 404 and pages in `server.slow` take a second. Requested pages land in `server.requested`.
+    """
+    page_html = _page("listings_page.html").encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = int(parse_qs(urlparse(self.path).query)["page"][0])
+            self.server.requested.append(page)
+            if page in self.server.slow:
+                time.sleep(1.0)
+            if page in self.server.missing:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page_html)))
+            self.end_headers()
+            self.wfile.write(page_html)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requested, server.missing, server.slow = [], set(), set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/?page="
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_crawl_pages_fetches_every_page(aqarmap_stub):
+    results = dict(crawl_pages(range(1, 6), max_workers=3, rate_limit=0, base_url=aqarmap_stub.base_url))
+    assert sorted(results) == [1, 2, 3, 4, 5]
+    expected = parse_listings_page(_page("listings_page.html"), "soup")
+    assert all(listings == expected for listings in results.values())
+    assert sorted(aqarmap_stub.requested) == [1, 2, 3, 4, 5]
+
+
+def test_crawl_pages_stops_early_without_fetching_the_rest(aqarmap_stub):
+    aqarmap_stub.slow = set(range(2, 21))
+    start = time.perf_counter()
+    crawl = crawl_pages(range(1, 21), max_workers=2, rate_limit=0, base_url=aqarmap_stub.base_url)
+    page, _ = next(crawl)
+    crawl.close()
+    # Closing waits for the pages in flight, not for the 18 still queued
+    assert page == 1
+    assert time.perf_counter() - start < 5
+    assert len(aqarmap_stub.requested) < 20
+
+
+def test_failed_pages_keep_the_previous_csv_and_stay_pending(aqarmap_stub, tmp_path):
+    csv_path = str(tmp_path / "listings.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("previous crawl\n")
+    checkpoint = CrawlCheckpoint(str(tmp_path / "checkpoint.json"))
+    index_path = str(tmp_path / "seen.json")
+    crawl = {"max_workers": 2, "rate_limit": 0, "base_url": aqarmap_stub.base_url}
+
+    aqarmap_stub.missing = {3}
+    scrape_to_sink(range(1, 5), open_sink(csv_path, checkpoint), checkpoint=checkpoint,
+                   index=SeenIndex(index_path), **crawl)
+    assert checkpoint.pending(range(1, 5)) == [3]
+    with open(csv_path, encoding="utf-8") as f:
+        assert f.read() == "previous crawl\n"
+    # Nothing was published, so nothing may count as known to an incremental crawl
+    assert SeenIndex(index_path).listings == {}
+
+    # The resumed crawl only fetches the failed page, then publishes every page's listings
+    aqarmap_stub.missing, aqarmap_stub.requested = set(), []
+    written = scrape_to_sink(range(1, 5), open_sink(csv_path, checkpoint), checkpoint=checkpoint,
+                             index=SeenIndex(index_path), **crawl)
+    assert aqarmap_stub.requested == [3]
+    assert written == 2
+    assert checkpoint.pending(range(1, 5)) == []
+    assert len(pd.read_csv(csv_path)) == 8
+    published = pd.read_csv(csv_path, dtype=str, keep_default_na=False).to_dict("records")
+    assert SeenIndex(index_path).listings == SeenIndex.fingerprints(published)
+
+
+def test_checkpoint_without_partial_output_restarts_the_crawl(aqarmap_stub, tmp_path):
+    csv_path = str(tmp_path / "listings.csv")
+    checkpoint = CrawlCheckpoint(str(tmp_path / "checkpoint.json"))
+    crawl = {"max_workers": 2, "rate_limit": 0, "base_url": aqarmap_stub.base_url}
+    scrape_to_sink(range(1, 4), open_sink(csv_path), **crawl)
+
+    # A checkpoint survived but its partial file did not: resuming would skip pages 1-2
+    checkpoint.mark_done([1, 2])
+    sink = open_sink(csv_path, checkpoint)
+    assert not checkpoint.in_progress
+    scrape_to_sink(range(1, 4), sink, checkpoint=checkpoint, **crawl)
+    assert len(pd.read_csv(csv_path)) == 6
+
+
+@pytest.mark.parametrize("ext", [".jsonl", ".parquet"])
+def test_sinks_clean_like_the_csv(aqarmap_stub, tmp_path, ext):
+    from preprocessing import clean_columns, load_data
+
+    crawl = {"max_workers": 2, "rate_limit": 0, "base_url": aqarmap_stub.base_url}
+    cleaned = []
+    for path in (str(tmp_path / "listings.csv"), str(tmp_path / f"listings{ext}")):
+        scrape_to_sink(range(1, 3), open_sink(path), chunk_size=2, **crawl)
+        cleaned.append(clean_columns(load_data(path)))
+    pd.testing.assert_frame_equal(cleaned[1], cleaned[0], check_dtype=False)
+
+
+def test_incremental_crawl_leaves_saving_the_index_to_the_caller(aqarmap_stub, tmp_path):
+    index_path, csv_path = str(tmp_path / "seen.json"), str(tmp_path / "listings.csv")
+    crawl = {"max_pages": 2, "max_workers": 2, "rate_limit": 0, "base_url": aqarmap_stub.base_url}
+
+    fresh = crawl_incremental(SeenIndex(index_path), **crawl)
+    assert fresh
+    # The upsert never happened, so a rerun must see the same listings as new
+    assert not os.path.exists(index_path)
+    index = SeenIndex(index_path)
+    assert crawl_incremental(index, **crawl) == fresh
+
+    upsert_listings(csv_path, fresh)
+    index.save()
+    keyed = [listing for listing in fresh if listing["Listing URL"] != "N/A"]
+    assert all(SeenIndex(index_path).classify(listing) == "known" for listing in keyed)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from feature_store import FeatureStore
+from similar_listings import (VectorIndex, build_similar_index, listing_keys, listing_vectors, open_similar_index,
+                              similar_listings)
+
+
+def _store(n_rows: int = 40, seed: int = 0) -> FeatureStore:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "Title": [f"Apartment {i}" for i in range(n_rows)],
+        "Location": rng.choice(["Maadi", "New Cairo", "Zamalek"], n_rows),
+        "Price/m²": rng.uniform(10_000, 60_000, n_rows),
+        "Area": rng.uniform(50, 300, n_rows),
+        "Bedrooms": rng.integers(1, 5, n_rows).astype(float),
+        "Listing URL": [f"https://aqarmap.com.eg/en/listing/{i}" for i in range(n_rows)],
+    })
+    # Preprocessing fills missing URLs with the most common one
+    frame.loc[[5, 6, 7], "Listing URL"] = frame.loc[4, "Listing URL"]
+    store = FeatureStore(frame)
+    for group in ["title_emb", "loc_emb"]:
+        store.add_group(group, rng.normal(size=(n_rows, 8)).astype(np.float32), [f"{group}_{j}" for j in range(8)])
+    return store
+
+
+def test_rows_sharing_a_filled_url_are_indexed_separately():
+    store = _store()
+    index = build_similar_index(store, directory=None)
+    assert len(index) == len(store)
+    exact = similar_listings(index, store, row=4, k=len(store), exact=True)
+    # Every other listing is found, including the three that share row 4's URL
+    assert len(exact) == len(store) - 1
+    assert (exact["Listing URL"] == store.frame.loc[4, "Listing URL"]).sum() == 3
+
+
+def test_update_reembeds_changed_listings_and_survives_reload(tmp_path):
+    directory = str(tmp_path / "index")
+    store = _store()
+    open_similar_index(store, directory)
+
+    store.frame.loc[10, "Area"] *= 3
+    store.frame.loc[5, "Title"] = "Edited title"
+    index = open_similar_index(store, directory)
+    reloaded = VectorIndex.load(directory)
+    keys = listing_keys(store.frame)
+    # One live row per listing, each holding the vector of the listing's current content
+    assert sorted(reloaded.rows) == sorted(keys)
+    current = listing_vectors(store.groups["title_emb"].matrix, store.groups["loc_emb"].matrix, store.frame,
+                              reloaded.extra["scaler"])
+    stored = np.asarray(reloaded.vectors)[[reloaded.rows[key] for key in keys]]
+    np.testing.assert_allclose(stored, current, atol=1e-6)
+    assert reloaded.fingerprints == index.fingerprints
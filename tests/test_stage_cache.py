@@ -0,0 +1,83 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from stage_cache import StageCache, cached_stage, stage_key
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({"Location": ["Maadi", "Mivida", "Sarai"], "Price": [1.5e6, 3e6, 2.2e6]})
+
+
+def test_stage_key_follows_content_not_identity(tmp_path):
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    first.write_text("Price\n1\n")
+    second.write_text("Price\n1\n")
+    assert stage_key("preprocess", str(first)) == stage_key("preprocess", str(second))
+    assert stage_key("eda", _frame()) == stage_key("eda", _frame().copy())
+    assert stage_key("nlp", _frame(), k=3, dtype="float16") == stage_key("nlp", _frame(), dtype="float16", k=3)
+
+    second.write_text("Price\n2\n")
+    assert stage_key("preprocess", str(first)) != stage_key("preprocess", str(second))
+    changed = _frame()
+    changed.loc[1, "Price"] = 3.1e6
+    assert stage_key("eda", _frame()) != stage_key("eda", changed)
+    assert stage_key("nlp", _frame(), k=3) != stage_key("nlp", _frame(), k=4)
+    assert stage_key("nlp", _frame()) != stage_key("eda", _frame())
+
+
+def test_cached_stage_reuses_results_across_calls_and_restarts(tmp_path):
+    calls = []
+
+    def total(df, column):
+        calls.append(column)
+        return df[column].sum()
+
+    cached = cached_stage("total", cache=StageCache(str(tmp_path)))(total)
+    assert cached(_frame(), "Price") == cached(_frame(), "Price") == 6.7e6
+    assert calls == ["Price"]
+
+    restarted = cached_stage("total", cache=StageCache(str(tmp_path)))(total)
+    assert restarted(_frame(), "Price") == 6.7e6
+    assert calls == ["Price"]
+
+
+def test_a_stage_result_is_keyed_by_the_stage_that_produced_it(tmp_path):
+    cache = StageCache(str(tmp_path))
+    upstream = cached_stage("double", cache=cache)(lambda df: df.assign(Price=df["Price"] * 2))
+    downstream = cached_stage("count", cache=cache)(len)
+
+    result = upstream(_frame())
+    key = stage_key("count", result)
+    assert key == stage_key("count", upstream(_frame()))
+    assert key != stage_key("count", result.copy())
+    assert downstream(result) == 3
+
+
+def test_memory_tier_drops_the_least_recently_used_entry(tmp_path):
+    cache = StageCache(str(tmp_path), max_memory_items=2, max_disk_bytes=0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert [cache.get(key)[0] for key in "abc"] == [True, False, True]
+
+
+def test_disk_tier_stays_within_its_byte_budget(tmp_path):
+    cache = StageCache(str(tmp_path), max_memory_items=1, max_disk_bytes=30_000)
+    for step, key in enumerate("abc"):
+        cache.put(key, np.zeros(1_500))
+        path = os.path.join(str(tmp_path), key + ".pkl")
+        os.utime(path, (step, step))
+    assert sorted(os.listdir(str(tmp_path))) == ["b.pkl", "c.pkl"]
+    assert cache.get("a") == (False, None)
+
+
+def test_unpicklable_results_stay_in_memory(tmp_path):
+    cache = StageCache(str(tmp_path))
+    lock = threading.Lock()
+    cache.put("lock", lock)
+    assert cache.get("lock") == (True, lock)
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import storage
+from preprocessing import preprocess
+from storage import CLEAN_SCHEMA, load_clean_listings, load_listings, save_listings, snapshot_columns
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "aqarmap_listings.csv")
+
+
+@pytest.fixture(scope="module")
+def clean():
+    return preprocess(DATA)
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_snapshot_round_trip_keeps_the_typed_schema(clean, tmp_path, extension):
+    path = save_listings(clean, str(tmp_path / f"listings{extension}"))
+    assert snapshot_columns(path) == CLEAN_SCHEMA.names
+    loaded = load_listings(path)
+    pd.testing.assert_frame_equal(loaded, clean[CLEAN_SCHEMA.names], check_dtype=False)
+    assert loaded["Price"].dtype == "float64" and loaded["Duplicate Group"].dtype == "int64"
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_snapshot_loads_only_the_requested_columns_and_rows(clean, tmp_path, extension):
+    path = save_listings(clean, str(tmp_path / f"listings{extension}"))
+    location = clean["Location"].mode().iloc[0]
+    loaded = load_listings(path, columns=["Location", "Price"],
+                           filters=[("Location", "=", location), ("Price", "<", 10e6)])
+    expected = clean.loc[(clean["Location"] == location) & (clean["Price"] < 10e6), ["Location", "Price"]]
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(loaded, expected.reset_index(drop=True))
+
+
+def test_snapshot_without_dedup_drops_the_group_column(tmp_path):
+    path = save_listings(preprocess(DATA, dedup=False), str(tmp_path / "listings.parquet"))
+    assert snapshot_columns(path) == [name for name in CLEAN_SCHEMA.names if name != "Duplicate Group"]
+
+
+def test_clean_listings_are_rebuilt_only_when_stale(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "listings.csv")
+    snapshot_path = str(tmp_path / "listings.parquet")
+    shutil.copy(DATA, csv_path)
+    builds = []
+
+    def counting_preprocess(filepath, dedup=True):
+        builds.append(dedup)
+        return preprocess(filepath, dedup)
+
+    monkeypatch.setattr(storage, "preprocess", counting_preprocess)
+
+    first = load_clean_listings(csv_path, snapshot_path)
+    assert len(builds) == 1
+    pd.testing.assert_frame_equal(load_clean_listings(csv_path, snapshot_path), first)
+    assert len(builds) == 1
+
+    # A re-scraped CSV is newer than the snapshot
+    later = os.path.getmtime(snapshot_path) + 10
+    os.utime(csv_path, (later, later))
+    load_clean_listings(csv_path, snapshot_path)
+    assert len(builds) == 2
+
+    # A snapshot written before 'Duplicate Group' existed lacks a schema column
+    save_listings(first.drop(columns="Duplicate Group"), snapshot_path)
+    os.utime(csv_path, (0, 0))
+    loaded = load_clean_listings(csv_path, snapshot_path)
+    assert len(builds) == 3 and "Duplicate Group" in loaded.columns
@@ -0,0 +1,328 @@
+# tuning.py
+
+"""
+Successive-halving hyperparameter search for the three price regressors.
+
+Usage:
+    python tuning.py --models XGBoost CatBoost --configs 27 --time-budget 600
+
+The best parameters are saved next to the trial logs; train with them through
+run_models(..., tuned=True), the dashboard's Models tab or `python pipeline.py --tuned-models`.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from joblib import cpu_count
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from model import MODEL_NAMES, core_budgets, prepare_training_data
+from stage_cache import frame_hash
+
+TRIALS_DIR = ".cache/tuning"
+
+# Best parameters per data hash: '<trials_dir>/best_<data key>.json'
+BEST_PREFIX = "best_"
+
+# Per-model search spaces: (low, high, "log" | "int" | "float") ranges or lists of choices.
+# The budget parameter (trees / boosting rounds) is allocated by successive halving, not sampled.
+SEARCH_SPACES = {
+    "Random Forest": {
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": (1, 10, "int"),
+        "max_features": [1.0, 0.7, 0.5, "sqrt"],
+    },
+    "XGBoost": {
+        "learning_rate": (0.01, 0.3, "log"),
+        "max_depth": (3, 10, "int"),
+        "subsample": (0.5, 1.0, "float"),
+        "colsample_bytree": (0.5, 1.0, "float"),
+        "min_child_weight": (1.0, 10.0, "log"),
+        "reg_lambda": (0.1, 10.0, "log"),
+    },
+    "CatBoost": {
+        "learning_rate": (0.01, 0.3, "log"),
+        "depth": (4, 10, "int"),
+        "l2_leaf_reg": (1.0, 10.0, "log"),
+        "bagging_temperature": (0.0, 1.0, "float"),
+    },
+}
+
+BUDGETS = {
+    "Random Forest": (25, 400),
+    "XGBoost": (50, 1000),
+    "CatBoost": (50, 1000),
+}
+
+# Worker-process dataset cache, filled once per worker by _init_worker
+_DATA = {}
+
+
+def sample_configs(space: dict, n: int, seed: int = 42) -> list:
+    """
+    Draw `n` configurations; a fixed seed reproduces the same list, which is what lets a search resume.
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n):
+        config = {}
+        for name, spec in space.items():
+            if isinstance(spec, list):
+                config[name] = spec[rng.integers(len(spec))]
+            else:
+                low, high, kind = spec
+                if kind == "int":
+                    config[name] = int(rng.integers(low, high + 1))
+                elif kind == "log":
+                    config[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+                else:
+                    config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+
+def _init_worker(X_fit, y_fit, X_val, y_val, n_threads):
+    _DATA.clear()
+    _DATA.update(X_fit=X_fit, y_fit=y_fit, X_val=X_val, y_val=y_val, n_threads=n_threads)
+
+
+def _dataset(kind: str):
+    """
+    Build each library's native dataset once per worker and reuse it for every trial.
+    """
+    if kind not in _DATA:
+        if kind == "dmatrix":
+            import xgboost as xgb
+
+            _DATA[kind] = (xgb.DMatrix(_DATA["X_fit"], label=_DATA["y_fit"], nthread=_DATA["n_threads"]),
+                           xgb.DMatrix(_DATA["X_val"], nthread=_DATA["n_threads"]))
+        elif kind == "pool":
+            from catboost import Pool
+
+            _DATA[kind] = (Pool(_DATA["X_fit"], label=_DATA["y_fit"]), Pool(_DATA["X_val"]))
+    return _DATA[kind]
+
+
+def _run_trial(name: str, params: dict, budget: int) -> tuple:
+    """
+    Train one configuration at one budget and return (validation MAE, seconds).
+    """
+    n_threads = _DATA["n_threads"]
+    start = time.perf_counter()
+    if name == "XGBoost":
+        import xgboost as xgb
+
+        dtrain, dval = _dataset("dmatrix")
+        booster = xgb.train({**params, "nthread": n_threads, "seed": 42, "objective": "reg:squarederror"},
+                            dtrain, num_boost_round=budget)
+        predictions = booster.predict(dval)
+    elif name == "CatBoost":
+        from catboost import CatBoostRegressor
+
+        pool_train, pool_val = _dataset("pool")
+        model = CatBoostRegressor(**params, iterations=budget, thread_count=n_threads, random_state=42, verbose=0,
+                                  allow_writing_files=False)
+        model.fit(pool_train)
+        predictions = model.predict(pool_val)
+    else:
+        from sklearn.ensemble import RandomForestRegressor
+
+        model = RandomForestRegressor(**params, n_estimators=budget, n_jobs=n_threads, random_state=42)
+        model.fit(_DATA["X_fit"], _DATA["y_fit"])
+        predictions = model.predict(_DATA["X_val"])
+    return float(mean_absolute_error(_DATA["y_val"], predictions)), time.perf_counter() - start
+
+
+class TrialLog:
+    """
+    Append-only JSONL record of finished trials, keyed by (config index, budget).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        trial = json.loads(line)
+                        self.trials[(trial["config"], trial["budget"])] = trial
+
+    def get(self, config: int, budget: int):
+        return self.trials.get((config, budget))
+
+    def add(self, trial: dict):
+        self.trials[(trial["config"], trial["budget"])] = trial
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trial) + "\n")
+
+
+def successive_halving(name: str, executor, log: TrialLog, n_configs: int = 27, eta: int = 3,
+                       min_budget: int = None, max_budget: int = None, deadline: float = None,
+                       seed: int = 42) -> dict:
+    """
+    Start every configuration on a small budget, keep the best 1/eta, and multiply the
+    budget by eta until one configuration (or the max budget) is left.
+    Returns the lowest-MAE (configuration, budget) pair seen on any rung.
+    """
+    default_min, default_max = BUDGETS[name]
+    budget = min_budget or default_min
+    max_budget = max_budget or default_max
+    configs = sample_configs(SEARCH_SPACES[name], n_configs, seed)
+    survivors = list(range(n_configs))
+    best = None
+
+    while survivors:
+        scores = {}
+        pending = {}
+        for config in survivors:
+            done = log.get(config, budget)
+            if done is not None:
+                scores[config] = done["mae"]
+            elif deadline is None or time.monotonic() < deadline:
+                pending[executor.submit(_run_trial, name, configs[config], budget)] = config
+
+        for future in as_completed(pending):
+            config = pending[future]
+            mae, seconds = future.result()
+            log.add({"model": name, "config": config, "budget": budget, "params": configs[config],
+                     "mae": mae, "seconds": seconds})
+            scores[config] = mae
+
+        if not scores:
+            break
+        ranked = sorted(scores, key=scores.get)
+        leader = ranked[0]
+        if best is None or scores[leader] < best["mae"]:
+            best = {"params": configs[leader], "budget": budget, "mae": scores[leader], "trials": len(log.trials)}
+        print(f"[TUNE] {name}: budget {budget}, {len(scores)} configs, best MAE {scores[leader]:,.0f}")
+
+        if budget >= max_budget or len(ranked) <= 1 or (deadline is not None and time.monotonic() >= deadline):
+            break
+        survivors = ranked[:max(1, len(ranked) // eta)]
+        budget = min(max_budget, budget * eta)
+
+    return best
+
+
+def data_key(X, y) -> str:
+    return frame_hash(X.assign(_target=y))[:12]
+
+
+def tune_models(df, target: str, models: list = None, n_configs: int = 27, eta: int = 3,
+                n_jobs: int = None, time_budget: float = None, trials_dir: str = TRIALS_DIR,
+                val_size: float = 0.2) -> dict:
+    """
+    Tune each model with successive halving over a process pool.
+    Workers receive the training data once and reuse prebuilt DMatrix / Pool objects
+    across trials. Finished trials are logged per model and data hash, so rerunning
+    an interrupted search picks up where it stopped, and the best parameters are saved
+    for load_tuned_params. `time_budget` is wall-clock seconds after which no new trials
+    start. Returns {model: best result}.
+    """
+    models = models or MODEL_NAMES
+    X, y = prepare_training_data(df, target)
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=val_size, random_state=42)
+    key = data_key(X, y)
+
+    n_jobs = n_jobs or cpu_count()
+    n_threads = core_budgets(n_jobs)[-1]
+    deadline = time.monotonic() + time_budget if time_budget else None
+
+    best = {}
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(X_fit, y_fit, X_val, y_val, n_threads)) as executor:
+        for name in models:
+            log = TrialLog(os.path.join(trials_dir, f"{name.lower().replace(' ', '_')}_{key}.jsonl"))
+            best[name] = successive_halving(name, executor, log, n_configs=n_configs, eta=eta, deadline=deadline)
+    save_tuned_params(best, key, trials_dir)
+    return best
+
+
+def tuned_params(best: dict) -> dict:
+    """
+    Convert tune_models output into the `params` mapping accepted by train_models.
+    """
+    params = {}
+    for name, result in best.items():
+        if not result:
+            continue
+        params[name] = dict(result["params"])
+        if name == "Random Forest":
+            params[name]["n_estimators"] = result["budget"]
+    return params
+
+
+def save_tuned_params(best: dict, key: str, trials_dir: str = TRIALS_DIR) -> str:
+    """
+    Store the train_models params of a search, merged over earlier searches on the same data.
+    """
+    path = os.path.join(trials_dir, f"{BEST_PREFIX}{key}.json")
+    params = _read_params(path)
+    params.update(tuned_params(best))
+    os.makedirs(trials_dir, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    os.replace(path + ".tmp", path)
+    print(f"[TUNE] Saved tuned parameters for {', '.join(params)} to {path}.")
+    return path
+
+
+def latest_tuned(trials_dir: str = TRIALS_DIR):
+    """
+    Path of the most recently saved tuned parameters, or None if nothing was tuned.
+    """
+    paths = glob.glob(os.path.join(trials_dir, f"{BEST_PREFIX}*.json"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def load_tuned_params(df, target: str, trials_dir: str = TRIALS_DIR) -> dict:
+    """
+    The train_models params tuned on this data, else those of the latest search; {} if none.
+    """
+    X, y = prepare_training_data(df, target)
+    path = os.path.join(trials_dir, f"{BEST_PREFIX}{data_key(X, y)}.json")
+    if not os.path.exists(path):
+        path = latest_tuned(trials_dir)
+        if path is None:
+            print("[TUNE] No tuned parameters found; training with the defaults.")
+            return {}
+        print(f"[TUNE] No search on this data yet; using the latest tuned parameters ({path}).")
+    return _read_params(path)
+
+
+def _read_params(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    from preprocessing import preprocess
+
+    parser = argparse.ArgumentParser(description="Successive-halving search for the price models")
+    parser.add_argument("--data", default="data/aqarmap_listings.csv")
+    parser.add_argument("--target", default="Price")
+    parser.add_argument("--models", nargs="*", default=None, choices=MODEL_NAMES)
+    parser.add_argument("--configs", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--time-budget", type=float, default=None, help="Stop launching trials after N wall-clock seconds")
+    args = parser.parse_args()
+
+    best = tune_models(preprocess(args.data), args.target, args.models, args.configs, args.eta,
+                       args.jobs, args.time_budget)
+    print(json.dumps(best, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()